@@ -8,9 +8,10 @@ from core import EnsimeWindowCommand, EnsimeTextCommand
 from env import getEnvironment
 from launcher import EnsimeLauncher
 from client import EnsimeClient
+from registry import servers
 from util import Util
-from outgoing import (TypeCheckFilesReq,
-                      SymbolAtPointReq,
+from buffers import contents_hash
+from outgoing import (SymbolAtPointReq,
                       ImportSuggestionsReq,
                       OrganiseImports,
                       RenameRefactorDesc,
@@ -32,9 +33,11 @@ class EnsimeStartup(EnsimeWindowCommand):
             self.env.error_message("Got an error : {t}\n{val}"
                                    .format(t=typ, val=value))
         else:
-            launcher = EnsimeLauncher(self.env.config)
+            launcher = EnsimeLauncher(self.env.config, self.env.settings)
             self.env.client = EnsimeClient(self.env, launcher)
             self.env.client.setup()
+            # show the notes snapshot of the last session right away
+            self.env.editor.redraw_all_highlights()
 
 
 class EnsimeShutdown(EnsimeWindowCommand):
@@ -55,6 +58,26 @@ class EnsimeShowErrors(EnsimeWindowCommand):
     def run(self):
         self.env.editor.show_errors = True
         self.env.editor.redraw_all_highlights()
+        if not self.env.editor.watching_viewport:
+            self.env.editor.watch_viewport()
+
+
+class EnsimeShowPerformanceStats(EnsimeWindowCommand):
+    def is_enabled(self):
+        return bool(self.env and self.env.is_running())
+
+    def run(self):
+        panel = self.window.create_output_panel("ensime_stats")
+        panel.run_command("append", {"characters": self.env.client.performance_report()})
+        self.window.run_command("show_panel", {"panel": "output.ensime_stats"})
+        self.env.client.dump_stats()
+
+
+class EnsimeShowServers(EnsimeWindowCommand):
+    def run(self):
+        panel = self.window.create_output_panel("ensime_servers")
+        panel.run_command("append", {"characters": servers.report()})
+        self.window.run_command("show_panel", {"panel": "output.ensime_servers"})
 
 
 class EnsimeEventListener(sublime_plugin.EventListener):
@@ -64,7 +87,7 @@ class EnsimeEventListener(sublime_plugin.EventListener):
             return
         env = getEnvironment(view.window())
         if env and env.is_connected() and env.client.analyzer_ready:
-            TypeCheckFilesReq([view.file_name()]).run_in(env, async=True)
+            env.client.typechecks.request([file])
 
     def on_post_save(self, view):
         file = view.file_name()
@@ -72,7 +95,15 @@ class EnsimeEventListener(sublime_plugin.EventListener):
             return
         env = getEnvironment(view.window())
         if env and env.is_connected() and env.client.analyzer_ready:
-            TypeCheckFilesReq([view.file_name()]).run_in(env, async=True)
+            env.client.typechecks.request([file])
+
+    def on_close(self, view):
+        file = view.file_name()
+        if not (file and (Util.is_scala(file) or Util.is_java(file))):
+            return
+        env = getEnvironment(view.window())
+        if env and env.is_running():
+            env.client.buffers.forget(file)
 
     def on_query_completions(self, view, prefix, locations):
         file = view.file_name()
@@ -92,12 +123,21 @@ class EnsimeEventListener(sublime_plugin.EventListener):
                 env.logger.info("Search for more suggestions either completed or was cancelled.")
                 return env.editor.suggestions
 
+            # completions of the identifier being typed are narrowed locally
+            anchor = locations[0] - len(prefix)
+            cache_key = (file, anchor, contents_hash(view.substr(sublime.Region(0, anchor))))
+            cached = env.editor.completion_cache.lookup(cache_key, prefix)
+            if cached is not None:
+                return (cached,
+                        sublime.INHIBIT_WORD_COMPLETIONS | sublime.INHIBIT_EXPLICIT_COMPLETIONS)
+
             contents = (view.substr(sublime.Region(0, view.size())) if view.is_dirty()
                         else None)
             response = CompletionsReq(locations[0],
                                       view.file_name(),
                                       contents,
-                                      max_results=5).run_in(env, async=False)
+                                      max_results=5,
+                                      cache_key=cache_key).run_in(env, async=False)
 
             if response is None:
                 return ([],
@@ -105,7 +145,8 @@ class EnsimeEventListener(sublime_plugin.EventListener):
                 env.editor.ignore_prefix = prefix
             else:
                 if len(env.editor.suggestions) > 1:
-                    CompletionsReq(locations[0], view.file_name(), contents).run_in(env, async=True)
+                    CompletionsReq(locations[0], view.file_name(), contents,
+                                   cache_key=cache_key).run_in(env, async=True)
                     view.show_popup("Please wait while we query for more suggestions.",
                                     sublime.HIDE_ON_MOUSE_MOVE | sublime.COOPERATE_WITH_AUTO_COMPLETE)
                 return (env.editor.suggestions,
@@ -0,0 +1,94 @@
+# coding: utf-8
+
+import hashlib
+import os
+
+from util import Util
+
+
+def contents_hash(contents):
+    """Digest of a buffer's contents."""
+    if contents is None:
+        return None
+    return hashlib.md5(contents.encode("utf-8")).hexdigest()
+
+
+class BufferTracker(object):
+    """Hands unsaved buffer contents to the server through files.
+
+    Instead of embedding a dirty buffer in every request (``contents``), its
+    contents are written once per version to a file in `buffers_dir` and the
+    request only refers to it (``contentsIn``). A buffer is rewritten only when
+    its content hash changes, so repeated requests on an unchanged buffer cost
+    neither disk writes nor wire bytes.
+
+    Args:
+        buffers_dir (str): Where to keep the buffer files, under ``cache-dir``.
+        inline (bool): Embed contents in requests like before instead.
+    """
+
+    def __init__(self, buffers_dir, inline=False):
+        self.buffers_dir = buffers_dir
+        self.inline = inline
+        self._versions = {}
+        # counters
+        self.bytes_sent = 0
+        self.bytes_saved = 0
+        self.writes = 0
+        self.writes_skipped = 0
+
+    def file_info(self, file, contents, digest=None):
+        """Message fragment for ENSIME ``fileInfo`` field, from current file.
+
+        Args:
+            digest (str): `contents_hash` of ``contents``, if already known.
+        """
+        file_info = {"file": file}
+        if contents is None:
+            return file_info
+        size = len(contents.encode("utf-8"))
+        if self.inline:
+            self.bytes_sent += size
+            file_info["contents"] = contents
+            return file_info
+
+        path = self._store(file, contents, digest or contents_hash(contents))
+        self.bytes_sent += len(path)
+        self.bytes_saved += size - len(path)
+        file_info["contentsIn"] = path
+        return file_info
+
+    def forget(self, file):
+        """Drop the buffer file of ``file``, e.g. once the buffer is closed."""
+        known = self._versions.pop(file, None)
+        if known is not None:
+            try:
+                os.remove(known[1])
+            except OSError:
+                pass
+
+    def stats(self):
+        return {"buffers": len(self._versions),
+                "bytes_sent": self.bytes_sent,
+                "bytes_saved": self.bytes_saved,
+                "writes": self.writes,
+                "writes_skipped": self.writes_skipped}
+
+    def _store(self, file, contents, digest):
+        known = self._versions.get(file)
+        if known is not None and known[0] == digest:
+            self.writes_skipped += 1
+            return known[1]
+
+        Util.mkdir_p(self.buffers_dir)
+        name = "{}-{}".format(hashlib.md5(file.encode("utf-8")).hexdigest()[:12],
+                              os.path.basename(file))
+        path = os.path.join(self.buffers_dir, name)
+        # the server may still be reading the previous version
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8", newline="") as f:
+            f.write(contents)
+        os.replace(tmp_path, path)
+        self._versions[file] = (digest, path)
+        self.writes += 1
+        return path
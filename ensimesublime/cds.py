@@ -0,0 +1,110 @@
+# coding: utf-8
+
+import glob
+import hashlib
+import json
+import os
+import re
+
+# dynamic archives, written at exit with -XX:ArchiveClassesAtExit
+MIN_JAVA = 13
+# startup times kept per mode
+HISTORY = 10
+
+# modes of a launch
+OFF = "off"
+DUMP = "dump"
+USE = "use"
+
+
+def java_major_version(java_home):
+    """The major version of the JDK in `java_home`, read from its ``release``
+    file rather than by running it, or None."""
+    try:
+        with open(os.path.join(java_home, "release")) as f:
+            release = f.read()
+    except (IOError, OSError):
+        return None
+    match = re.search(r'^JAVA_VERSION="(\d+)(?:\.(\d+))?', release, re.MULTILINE)
+    if not match:
+        return None
+    major = int(match.group(1))
+    # 1.8.0_202
+    return int(match.group(2) or 0) if major == 1 else major
+
+
+def archive_path(cache_dir, classpath, java_home, version):
+    """The archive for a classpath and a JDK, named after a hash of them.
+
+    The size and modification time of the classpath entries are part of the
+    hash, as the JVM ignores archives made from other versions of the jars.
+    """
+    digest = hashlib.sha1()
+    digest.update("{}\0{}\0".format(os.path.realpath(java_home), version).encode("utf-8"))
+    for entry in classpath:
+        try:
+            stat = os.stat(entry)
+            signature = "{}\0{}\0{}\0".format(entry, stat.st_size, int(stat.st_mtime))
+        except OSError:
+            signature = "{}\0\0\0".format(entry)
+        digest.update(signature.encode("utf-8"))
+    return os.path.join(cache_dir, "cds-{}.jsa".format(digest.hexdigest()[:16]))
+
+
+def cds_flags(cache_dir, classpath, java_home, java_flags=()):
+    """The flags to share the classes of the server between its runs.
+
+    The first run for a classpath writes an archive when the server exits,
+    later runs map it. Archives of other classpaths are removed.
+
+    Returns:
+        tuple: The flags, the mode of the launch (`OFF`, `DUMP` or `USE`) and
+        a description for the logs.
+    """
+    if any(flag.startswith(("-Xshare", "-XX:SharedArchiveFile", "-XX:ArchiveClassesAtExit"))
+           for flag in java_flags):
+        return [], OFF, "Class data sharing left to java-flags"
+    version = java_major_version(java_home)
+    if version is None or version < MIN_JAVA:
+        return [], OFF, "Class data sharing needs Java {} or later, found {}".format(
+            MIN_JAVA, version or "an unknown version")
+    archive = archive_path(cache_dir, classpath, java_home, version)
+    if os.path.exists(archive):
+        return (["-XX:SharedArchiveFile={}".format(archive)], USE,
+                "Sharing classes from {}".format(archive))
+    for stale in glob.glob(os.path.join(cache_dir, "cds-*.jsa")):
+        try:
+            os.remove(stale)
+        except OSError:
+            pass
+    return (["-XX:ArchiveClassesAtExit={}".format(archive)], DUMP,
+            "Writing the classes to share to {} when the server exits".format(archive))
+
+
+def record_startup(cache_dir, mode, seconds):
+    """Keep how long the server took to start in ``startup-times.json``.
+
+    Returns:
+        str: A comparison of the startup times with and without sharing.
+    """
+    path = os.path.join(cache_dir, "startup-times.json")
+    try:
+        with open(path) as f:
+            times = json.load(f)
+    except (IOError, OSError, ValueError):
+        times = {}
+    # the dumping happens at exit, the startup is the same as without sharing
+    key = USE if mode == USE else OFF
+    times[key] = (times.get(key, []) + [round(seconds, 3)])[-HISTORY:]
+    try:
+        with open(path, "w") as f:
+            json.dump(times, f, sort_keys=True)
+    except (IOError, OSError):
+        pass
+
+    def median(values):
+        return sorted(values)[len(values) // 2]
+    summary = ", ".join("{} {:.1f}s over {} starts".format(
+        "with class data sharing" if key == USE else "without", median(times[key]), len(times[key]))
+        for key in (USE, OFF) if times.get(key))
+    return "Server started in {:.1f}s (median {})".format(seconds, summary)
@@ -1,9 +1,10 @@
 # coding: utf-8
 import sublime
 
+import os
+import socket
 import time
-import json
-from threading import Thread
+from threading import Thread, Event, Timer
 
 import websocket
 # from functools import partial as bind
@@ -11,9 +12,22 @@ import websocket
 from protocol import ProtocolHandler
 from util import catch
 from errors import LaunchError
-from outgoing import ConnectionInfoRequest
+from outgoing import ConnectionInfoRequest, TypeCheckFilesReq, DEFAULT_TIMEOUT
 from config import gconfig
 from debugger import DebugHandler
+from pending import PendingResponses
+from transport import SHARED_ENGINE, shared_loop
+from scheduler import RequestScheduler, QueryTracker, PRIORITIES
+from buffers import BufferTracker
+from codec import JsonCodec, describe_error
+from typecheck import TypecheckDispatcher
+from lifecycle import ExpiringTable, DEFAULT_LIFETIME
+from metrics import LatencyStats, DECODE, HANDLER
+from recorder import SessionRecorder
+from readiness import wait_until_ready
+from cds import record_startup
+from registry import servers, canonical_dotensime
+from launcher import AttachedProcess, remove_server_files
 
 
 class EnsimeClient(ProtocolHandler, DebugHandler):
@@ -27,11 +41,14 @@ class EnsimeClient(ProtocolHandler, DebugHandler):
 
     Communication with the server is done over a websocket (`self.ws`). Messages
     are sent to the server in the calling thread, while messages are received on
-    a separate background thread and enqueued in `self.queue` upon receipt.
+    a separate background thread: either one owned by the client or, with the
+    ``shared`` transport engine, the `SharedLoop` thread common to all clients.
 
     Each call to the server contains a `callId` field with an integer ID,
     generated from `self.call_id`. Responses echo back the `callId` field so
-    that appropriate handlers can be invoked.
+    that appropriate handlers can be invoked. Synchronous calls are registered
+    in `self.responses` before being sent, and the receiving thread wakes the
+    waiting caller as soon as the matching response arrives.
 
     Responses also contain a `typehint` field in their `payload` field, which
     contains the type of the response. This is used to key into `self.handlers`,
@@ -45,89 +62,194 @@ class EnsimeClient(ProtocolHandler, DebugHandler):
         self.env.logger.debug('__init__: in')
 
         self.ws = None
+        # set while `self.ws` is available to the receiving thread
+        self.ws_ready = Event()
         self.ensime = None
         self.ensime_server = None
-
+        # the server is shared by the clients of a project, see `registry`
+        self.project_key = None
+
+        # (de)serialization of messages, see `codec.JsonCodec`
+        self.codec = JsonCodec()
+        # Per-call state lives until the call is answered, or expires after
+        # `call_lifetime` seconds if it never is.
+        lifetime = self.env.settings.get("call_lifetime", DEFAULT_LIFETIME)
         self.call_id = 1
-        self.call_options = {}
+        self.call_options = ExpiringTable(lifetime)
         self.refactor_id = 1
-        self.refactorings = {}
+        self.refactorings = ExpiringTable(lifetime)
         self.connection_timeout = self.env.settings.get("timeout_connection", 20)
 
-        # Map for messages received from the ensime server.
-        self.responses = {}
+        # Synchronous calls waiting for their response, keyed by callId.
+        self.responses = PendingResponses(lifetime)
+        # Round-trip latencies per typehint, see `performance_report`.
+        self.latency = LatencyStats(lifetime)
+        self.stats_timer = None
+        # Outgoing requests, sent by priority class as slots free up.
+        self.scheduler = RequestScheduler(self.send, self.env.settings.get("max_in_flight"),
+                                          on_send=self.latency.sent)
+        # At-point queries in flight, to skip duplicates and stale replies.
+        self.queries = QueryTracker(lifetime)
+        # Unsaved buffer contents passed to the server.
+        self.buffers = BufferTracker(os.path.join(self.env.cache_dir, "buffers"),
+                                     inline=self.env.settings.get("buffer_transfer") == "inline")
+        # Files to typecheck, batched and sent one typecheck at a time.
+        self.typechecks = TypecheckDispatcher(
+            lambda files: TypeCheckFilesReq(files).run_in(self.env, async=True),
+            delay=self.env.settings.get("typecheck_delay", 0.3))
+        # Wire-level log of the session, for replaying it outside the editor.
+        self.recorder = None
+        if self.env.settings.get("record_session", False):
+            self.recorder = SessionRecorder(os.path.join(self.env.cache_dir, "session.log"))
         # By default, don't connect to server more than once
         self.number_try_connection = 1
 
         self.debug_thread_id = None
 
         # status
-        self.running = True  # queue poll is running
+        self.running = True  # receiving thread is running
         self.connected = False  # connected to ensime server through websocket
         self.analyzer_ready = False
         self.indexer_ready = False
 
-        thread = Thread(name='queue-poller', target=self.queue_poll)
-        thread.daemon = True
-        thread.start()
+        self.loop = None
+        if self.env.settings.get("transport_engine") == SHARED_ENGINE:
+            self.loop = shared_loop()
+        else:
+            thread = Thread(name='queue-poller', target=self.queue_poll)
+            thread.daemon = True
+            thread.start()
+
+    def queue_poll(self):
+        """Dispatch messages from the websocket as they arrive.
 
-    def queue_poll(self, sleep_t=0.5):
-        """Put new messages in the map as they arrive.
-        Since putting a value in a map is an atomic operation,
-        existence of a certain key and retrieval can be done
-        from a separate thread by the client.
-        Value of sleep is low to improve responsiveness.
+        Blocks in ``recv`` while connected and parks on `self.ws_ready` while
+        there is no connection, so an idle client uses no CPU. `teardown`
+        closes the websocket and releases the event to end the loop.
         """
         while self.running:
-            if self.ws is not None:
-                def log_and_close(msg):
-                    if self.connected:
-                        self.env.logger.error('Websocket exception', exc_info=True)
-                        self.env.logger.warning("Forcing shutdown. Check server log to see what happened.")
-                        # Stop everything.
-                        self.shutdown_server()
-                        self._display_ws_warning()
-
-                with catch(websocket.WebSocketException, log_and_close):
-                    result = self.ws.recv()
-                    if result:
-                        try:
-                            _json = json.loads(result)
-                        except json.JSONDecodeError as e:
-                            self.env.logger.error(e.msg)
-                        else:
-                            # Watch if it has a callId
-                            call_id = _json.get("callId")
-
-                            def handle_now():
-                                if _json["payload"]:
-                                    self.handle_incoming_response(call_id, _json["payload"])
-
-                            def handle_later():
-                                self.responses[call_id] = _json
-
-                            if call_id is None:
-                                handle_now()
-                            else:
-                                call_opt = self.call_options.get(call_id)
-                                if call_opt and call_opt['async']:
-                                    handle_now()
-                                else:
-                                    handle_later()
-                    else:
-                        time.sleep(sleep_t)
+            self.ws_ready.wait()
+            ws = self.ws
+            if ws is None:
+                self.ws_ready.clear()
+                continue
+            self.receive(ws)
+
+    def receive(self, ws):
+        """Receive and dispatch a single message from `ws`."""
+        def log_and_close(msg):
+            self._detach_ws()
+            if self.connected:
+                self.env.logger.error('Websocket exception: %s', msg)
+                self.env.logger.warning("Forcing shutdown. Check server log to see what happened.")
+                # Stop everything.
+                self.shutdown_server()
+                self._display_ws_warning()
+
+        with catch((websocket.WebSocketException, socket.error), log_and_close):
+            result = ws.recv()
+            if result:
+                self.dispatch(result)
+            elif not ws.connected:
+                # close frame received, wait for a new connection
+                self._detach_ws()
+
+    def dispatch(self, result):
+        """Handle a message received from the websocket.
+
+        Only the envelope of responses is peeked at first: the payload of
+        responses that are superseded, late or have no handler is never
+        decoded, and the payload of synchronous responses is decoded by the
+        waiting caller. Events are decoded in full.
+        """
+        # the whole frame has been read off the socket by now
+        received = self.latency.now()
+        if self.recorder:
+            self.recorder.incoming(result)
+        try:
+            frame = self.codec.decode(result)
+        except ValueError as e:
+            self.env.logger.error('Malformed message: %s', describe_error(e, result))
+            return
+
+        # Watch if it has a callId
+        call_id = frame.call_id
+        if call_id is not None:
+            self.scheduler.complete(call_id)
+            self.latency.received(call_id, received)
+            if self.queries.finish(call_id):
+                self.env.logger.debug('dropping superseded response for call %s', call_id)
+                self.forget_call(call_id)
+                return
+            call_opt = self.call_options.get(call_id)
+            if not (call_opt and call_opt['async']):
+                if not self.responses.resolve(call_id, frame):
+                    self.env.logger.warning('dropping late response for call %s', call_id)
+                    self.forget_call(call_id)
+                return
+
+        if frame.typehint is not None and frame.typehint not in self.handlers:
+            self.env.logger.warning('Response has not been handled: %s', frame)
+            self.forget_call(call_id)
+            return
+        self._handle(call_id, frame)
+
+    def _handle(self, call_id, frame):
+        """Run the handler of `frame`, then forget the options of its call.
+
+        Returns the payload of `frame`, or None if it's malformed."""
+        typehint = self.latency.typehint(call_id) or frame.typehint
+        try:
+            start = self.latency.now()
+            payload = self._payload(frame)
+            decoded = self.latency.now()
+            self.latency.record(typehint, DECODE, decoded - start)
+            if payload:
+                self.handle_incoming_response(call_id, payload)
+                self.latency.record(typehint, HANDLER, self.latency.now() - decoded)
+            return payload
+        finally:
+            self.forget_call(call_id)
+
+    def forget_call(self, call_id):
+        """The call is over, drop its state."""
+        self.call_options.pop(call_id)
+        self.latency.finished(call_id)
+
+    def _payload(self, frame):
+        """Decode the payload of `frame`, or None if it's malformed."""
+        try:
+            return frame.payload
+        except ValueError as e:
+            self.env.logger.error('Malformed message: %s', describe_error(e, frame.raw))
+            return None
+
+    def _attach_ws(self, ws):
+        """Use `ws` for communication and wake up the receiving thread."""
+        self.ws = ws
+        if self.loop is not None:
+            self.loop.register(ws, self.receive)
+        self.ws_ready.set()
+
+    def _detach_ws(self):
+        """Forget the current websocket, parking the receiving thread."""
+        ws, self.ws = self.ws, None
+        self.ws_ready.clear()
+        # no completion event for a typecheck sent over it
+        self.typechecks.disconnected()
+        if self.loop is not None and ws is not None:
+            self.loop.unregister(ws)
 
     def connect_when_ready(self, timeout, fallback):
-        """Given a maximum timeout, waits for the http port to be written.
-        Tries to connect to the websocket if it's written.
+        """Given a maximum timeout, waits for the server to listen on the http
+        port, see `readiness.wait_until_ready`. Tries to connect to the websocket
+        as soon as it does.
         If it fails cleans up by calling fallback. Ideally, should stop ensime
         process if connection wasn't established.
         """
         if not self.ws:
-            while not self.ensime.is_ready() and (timeout > 0):
-                time.sleep(1)
-                timeout -= 1
-            if self.ensime.is_ready():
+            if wait_until_ready(self.ensime, timeout) is not None:
+                self._record_startup()
                 self.connected = self.connect_ensime_server()
 
             if not self.connected:
@@ -136,22 +258,86 @@ class EnsimeClient(ProtocolHandler, DebugHandler):
         else:
             self.env.logger.info("Already connected.")
 
+    def _record_startup(self):
+        """Log how long a server launched by the plugin took to start."""
+        process = self.ensime
+        if process.cds_mode is None or process.startup_time is not None:
+            return
+        process.startup_time = time.time() - process.started_at
+        self.env.logger.info(record_startup(self.env.cache_dir, process.cds_mode, process.startup_time))
+
+    def connect_attached(self, timeout, fallback):
+        """Handshake with the server found running by `setup`, launching a
+        new one if it doesn't answer within `timeout` seconds."""
+        self.connected = self.connect_ensime_server(attaching=True, timeout=timeout)
+        if self.connected:
+            self.env.logger.info("Attached to the running server on port %s", self.ensime.http_port())
+            return
+        if not self.running:
+            return
+        # whatever listens there, it's not ours to stop: it could be another
+        # program that took the port, or the pid, of a dead server
+        self.env.logger.warning("The running server didn't answer, launching a new one")
+        servers.discard(self.project_key, self.ensime, stop=False)
+        remove_server_files(self.ensime.cache_dir)
+        self.ensime, _ = servers.acquire(self.project_key, self, self._label(), self._launch)
+        self.ensime_server = None
+        self.number_try_connection = 1
+        if self.ensime:
+            self.connect_when_ready(timeout, fallback)
+        else:
+            fallback()
+
+    def _launch(self):
+        """Launch a server with `self.launcher`, unless the setting
+        ``connect_to_external_server`` says servers are started by others."""
+        if self.env.settings.get("connect_to_external_server", False):
+            self.env.logger.error("No running server to connect to in %s", self.env.cache_dir)
+            return None
+        self.env.logger.info("----Initialising server----")
+        try:
+            process = self.launcher.launch()
+        except LaunchError as err:
+            self.env.logger.error(err)
+            return None
+        for note in process.launch_notes:
+            self.env.logger.info(note)
+        return process
+
+    def _attach_or_launch(self):
+        process = self.launcher.attach()
+        if process is not None:
+            self.env.logger.info("----Attaching to the running server (pid %s)----", process.pid)
+            return process
+        return self._launch()
+
+    def _label(self):
+        """Describes the client to the user, by its window."""
+        window = self.env.window
+        return "window {} ({})".format(window.id(), ", ".join(window.folders()) or "no folder")
+
     def setup(self):
-        """Setup the client. Starts the enisme process using launcher
-        and connects to it through websocket"""
-        def initialize_ensime():
-            if not self.ensime:
-                self.env.logger.info("----Initialising server----")
-                try:
-                    self.ensime = self.launcher.launch()
-                except LaunchError as err:
-                    self.env.logger.error(err)
-            return bool(self.ensime)
+        """Setup the client. Uses the server of the project if another window
+        did start it, else attaches to the server already running for the
+        project if there's one, e.g. left by a previous session, else starts
+        the ensime process using launcher. Connects to it through websocket"""
+        attached = False
+        if not self.ensime:
+            self.project_key = canonical_dotensime(self.launcher.config)
+            self.ensime, shared = servers.acquire(self.project_key, self, self._label(),
+                                                  self._attach_or_launch)
+            # a server that was just launched, or by another window, might not be ready yet
+            attached = not shared and isinstance(self.ensime, AttachedProcess)
+            if shared:
+                self.env.logger.info("----Sharing the server of %s with other windows----",
+                                     self.project_key)
 
         # True if ensime is up, otherwise False
-        self.running = initialize_ensime()
+        self.running = bool(self.ensime)
         if self.running:
-            connect_when_ready_thread = Thread(target=self.connect_when_ready,
+            self._schedule_stats_dump()
+            connect = self.connect_attached if attached else self.connect_when_ready
+            connect_when_ready_thread = Thread(target=connect,
                                                args=(self.connection_timeout, self.teardown))
             connect_when_ready_thread.daemon = True
             connect_when_ready_thread.start()
@@ -173,33 +359,69 @@ class EnsimeClient(ProtocolHandler, DebugHandler):
 
         self.env.logger.debug('send: in')
         if self.ws is not None:
+            if self.recorder:
+                self.recorder.outgoing(msg)
             with catch(websocket.WebSocketException, reconnect):
                 self.env.logger.debug('send: sending JSON on WebSocket')
                 self.ws.send(msg + "\n")
 
     def get_response(self, call_id, timeout):
         """Gets a response with the specified call_id.
-        Waits for the response to appear in the `responses` map for time specified by timeout.
+        Blocks until the response is delivered by the receiving thread or the timeout expires.
         Returns the payload or None based on wether a response for that call_id was found."""
-        start, now = time.time(), time.time()
-        while (call_id not in self.responses) and (now - start) < timeout:
-                time.sleep(0.5)
-                now = time.time()
-        if call_id not in self.responses:
-            print(self.responses)
+        result = self.responses.wait(call_id, timeout)
+        if result is None:
             self.env.logger.warning('no reply from server for %ss', timeout)
+            self.forget_call(call_id)
             return None
-        result = self.responses[call_id]
-        self.env.logger.debug('result received\n%s', result)
-        if result["payload"]:
-            self.handle_incoming_response(call_id, result["payload"])
-        del self.responses[call_id]
-        return result["payload"]
-
-    def connect_ensime_server(self):
+        self.env.logger.debug('result received: %s', result)
+        return self._handle(call_id, result)
+
+    def table_sizes(self):
+        """Number of entries kept per call, to watch memory over long sessions."""
+        return {"call_options": len(self.call_options),
+                "refactorings": len(self.refactorings),
+                "responses": len(self.responses),
+                "queries": len(self.queries),
+                "in_flight": sum(self.scheduler.in_flight(priority) for priority in PRIORITIES)}
+
+    def performance_stats(self):
+        """Counters of the client, besides latencies."""
+        return {"tables": self.table_sizes(),
+                "buffers": self.buffers.stats(),
+                "typechecks": self.typechecks.stats()}
+
+    def performance_report(self):
+        """Latencies and counters as text, for the Show Performance Stats command."""
+        lines = ["Latencies (ms)", "", self.latency.report(), ""]
+        for name, stats in sorted(self.performance_stats().items()):
+            lines.append("{}: {}".format(name.capitalize(), ", ".join(
+                "{} {}".format(key, value) for key, value in sorted(stats.items()))))
+        return "\n".join(lines)
+
+    def dump_stats(self):
+        """Write the performance stats to ``perf-stats.json`` in the cache dir."""
+        path = os.path.join(self.env.cache_dir, "perf-stats.json")
+        if not self.latency.dump(path, self.performance_stats()):
+            self.env.logger.warning("Couldn't write performance stats to %s", path)
+
+    def _schedule_stats_dump(self):
+        interval = self.env.settings.get("stats_dump_interval", 300)
+        if not interval or not self.running:
+            return
+
+        def dump_and_reschedule():
+            self.dump_stats()
+            self._schedule_stats_dump()
+        self.stats_timer = Timer(interval, dump_and_reschedule)
+        self.stats_timer.daemon = True
+        self.stats_timer.start()
+
+    def connect_ensime_server(self, attaching=False, timeout=DEFAULT_TIMEOUT):
         """Start initial connection with the server.
-        Return True if the connection info is received
-        else returns False"""
+        Return True if the connection info is received within `timeout`
+        seconds else returns False. When `attaching` to a server found
+        running, failures leave the server and the client as they are."""
         self.env.logger.debug('connect_ensime_server: in')
 
         def disable_completely(e):
@@ -209,20 +431,44 @@ class EnsimeClient(ProtocolHandler, DebugHandler):
             self.env.logger.info("Server was shutdown.")
             self._display_ws_warning()
 
+        def not_ensime(e):
+            self.env.logger.info('the running server is not reachable: %s', e)
+
         if self.running and self.number_try_connection:
             if not self.ensime_server:
                 port = self.ensime.http_port()
                 uri = "websocket"
                 self.ensime_server = gconfig['ensime_server'].format(port, uri)
-            with catch(websocket.WebSocketException, disable_completely):
-                # Use the default timeout (no timeout).
+            if attaching:
+                errors, on_error = (websocket.WebSocketException, socket.error), not_ensime
+            else:
+                errors, on_error = websocket.WebSocketException, disable_completely
+            with catch(errors, on_error):
+                # Use the default timeout (no timeout) once connected.
                 options = {"subprotocols": ["jerky"]}
                 options['enable_multithread'] = True
+                # text frames are decoded as UTF-8 anyway, validating them
+                # byte by byte first costs more than handling the message
+                options['skip_utf8_validation'] = True
+                if attaching:
+                    # whatever listens might never answer the upgrade
+                    options['timeout'] = timeout
                 self.env.logger.info("About to connect to %s with options %s",
                                      self.ensime_server, options)
-                self.ws = websocket.create_connection(self.ensime_server, **options)
+                ws = websocket.create_connection(self.ensime_server, **options)
+                ws.settimeout(None)
+                self._attach_ws(ws)
             self.number_try_connection -= 1
-            got_response = ConnectionInfoRequest().run_in(self.env)  # confirm response
+            if self.ws is None:
+                return False
+            handshake = ConnectionInfoRequest()
+            handshake.timeout = timeout
+            got_response = handshake.run_in(self.env)  # confirm response
+            if got_response is None and attaching:
+                ws = self.ws
+                self._detach_ws()
+                with catch((websocket.WebSocketException, socket.error)):
+                    ws.close()
             return bool(got_response is not None)
         else:
             # If it hits this, number_try_connection is 0
@@ -236,8 +482,16 @@ class EnsimeClient(ProtocolHandler, DebugHandler):
         self.env.logger.debug('shutdown_server: in')
         self.connected = False
         if self.ensime:
-            self.ensime.stop()
-            self.env.logger.info('Server shutdown.')
+            idle_timeout = self.env.settings.get("server_idle_timeout", 0)
+            if self.project_key is None:
+                self.ensime.stop()
+                self.env.logger.info('Server shutdown.')
+            elif servers.release(self.project_key, self, idle_timeout):
+                self.env.logger.info('Server left running for the other windows using it.')
+            elif idle_timeout > 0:
+                self.env.logger.info('Server shutdown in %ss unless used again.', idle_timeout)
+            else:
+                self.env.logger.info('Server shutdown.')
         self.env.editor.uncolorize_all()
 
     def teardown(self):
@@ -245,4 +499,22 @@ class EnsimeClient(ProtocolHandler, DebugHandler):
         This stops the loop receiving responses from the websocket."""
         self.env.logger.debug('teardown: in')
         self.running = False
+        # closing the websocket below is not a connection failure
+        self.connected = False
+        ws = self.ws
+        self._detach_ws()
+        if ws is not None:
+            with catch((websocket.WebSocketException, socket.error)):
+                ws.close()
+        # release the receiving thread so it sees `running` is off
+        self.ws_ready.set()
+        self.scheduler.clear()
+        self.typechecks.cancel()
+        if self.stats_timer is not None:
+            self.stats_timer.cancel()
+        self.dump_stats()
+        self.call_options.clear()
+        self.refactorings.clear()
+        if self.recorder:
+            self.recorder.close()
         self.shutdown_server()
@@ -0,0 +1,84 @@
+# coding: utf-8
+
+import json
+import re
+
+# Envelope of a response, whose callId and typehint can be read without
+# decoding the whole message. Anchored at the start of a valid JSON text, it
+# matches the envelope rather than some nested object.
+_HEAD = re.compile(r'\{\s*"callId"\s*:\s*(\d+)\s*,\s*"payload"\s*:\s*\{\s*"typehint"\s*:\s*"(\w+)"')
+
+
+class Frame(object):
+    """A message received from the server, decoded on first use.
+
+    ``call_id`` and ``typehint`` of responses are peeked from the raw text,
+    so replies nobody waits for anymore, e.g. to superseded calls, can be
+    dropped without decoding their payload.
+    """
+
+    __slots__ = ('raw', 'call_id', 'typehint', '_message')
+
+    def __init__(self, raw, call_id, typehint, message=None):
+        self.raw = raw
+        self.call_id = call_id
+        self.typehint = typehint
+        self._message = message
+
+    @property
+    def message(self):
+        """The decoded message.
+
+        Raises:
+            ValueError: If the message isn't valid JSON.
+        """
+        if self._message is None:
+            self._message = json.loads(self.raw)
+        return self._message
+
+    @property
+    def payload(self):
+        return self.message.get("payload")
+
+    def is_decoded(self):
+        return self._message is not None
+
+    def __len__(self):
+        return len(self.raw)
+
+    def __repr__(self):
+        return "Frame(callId={}, typehint={}, {} chars)".format(
+            self.call_id, self.typehint, len(self.raw))
+
+
+class JsonCodec(object):
+    """Encodes requests and decodes messages of the jerky protocol, the
+    payload of responses only when it's used."""
+
+    def encode(self, message):
+        return json.dumps(message)
+
+    def decode(self, raw):
+        """Wrap ``raw`` into a `Frame`, peeking at the envelope of responses.
+
+        Events, which are all handled, and responses whose layout can't be
+        peeked are decoded right away.
+
+        Raises:
+            ValueError: If the message had to be decoded and isn't valid JSON.
+        """
+        head = _HEAD.match(raw)
+        if head:
+            return Frame(raw, int(head.group(1)), head.group(2))
+
+        message = json.loads(raw)
+        payload = message.get("payload") or {}
+        return Frame(raw, message.get("callId"), payload.get("typehint"), message)
+
+
+def describe_error(error, raw, context=40):
+    """Details of a decoding ``error`` of ``raw`` for the logs."""
+    pos = getattr(error, "pos", None)
+    if pos is None:
+        return "{} ({} chars)".format(error, len(raw))
+    return "{} ({} chars), near {!r}".format(error, len(raw), raw[max(pos - context, 0):pos + context])
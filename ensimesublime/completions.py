@@ -0,0 +1,60 @@
+# coding: utf-8
+
+
+def is_subsequence(needle, haystack):
+    """Whether the characters of ``needle`` appear in order in ``haystack``."""
+    chars = iter(haystack)
+    return all(c in chars for c in needle)
+
+
+class CompletionCache(object):
+    """Completions for the identifier being typed, narrowed locally.
+
+    Completions are requested at an anchor: the offset where the identifier
+    starts, e.g. right after ``foo.``. While the user keeps typing the same
+    identifier, the anchor and the text before it don't change, so the
+    completions received for a shorter prefix can be filtered here instead of
+    asking the server again.
+
+    Entries are keyed by ``(file, anchor, digest of the text before anchor)``.
+    Only complete results, i.e. not truncated by ``maxResults``, are served.
+    """
+
+    def __init__(self):
+        self._key = None
+        self._prefix = None
+        self._completions = []
+
+    def store(self, key, prefix, completions, complete):
+        """Remember ``completions``, a list of ``(name, suggestion)`` pairs,
+        received for ``prefix`` at ``key``."""
+        if not complete:
+            # can't narrow a truncated list, but it's still better than
+            # keeping results of another anchor around
+            self.clear()
+            return
+        self._key = key
+        self._prefix = prefix or ""
+        self._completions = list(completions)
+
+    def lookup(self, key, prefix):
+        """Suggestions for ``prefix`` at ``key``, or None to ask the server.
+
+        Names starting with ``prefix`` come first, followed by the ones that
+        contain its characters in order.
+        """
+        if key != self._key or not prefix.startswith(self._prefix):
+            return None
+        lowered = prefix.lower()
+        starting, fuzzy = [], []
+        for name, suggestion in self._completions:
+            if name.startswith(prefix):
+                starting.append(suggestion)
+            elif is_subsequence(lowered, name.lower()):
+                fuzzy.append(suggestion)
+        return starting + fuzzy
+
+    def clear(self):
+        self._key = None
+        self._prefix = None
+        self._completions = []
@@ -1,11 +1,14 @@
 # coding: utf-8
 
 import collections
+import json
 import os
+import re
 
 import sexpdata
 
-from util import Util
+import sexpconfig
+from util import Util, catch
 
 LOG_FORMAT = '%(levelname)-8s <%(asctime)s> (%(filename)s:%(lineno)d) - %(message)s'
 CONSOLE_LOG_FORMAT = '| Ensime | %(levelname)-8s <%(asctime)s> - %(message)s'
@@ -55,6 +58,94 @@ feedback = {
 #                 .format(project=self.project, config=self.config))
 
 
+# bump when `ProjectConfig.parse` gives different results
+CACHE_FORMAT = 1
+CACHE_FILE = "dotensime.json"
+_CACHE_DIR = re.compile(r':cache-dir\s+"((?:[^"\\]|\\.)*)"')
+_SYMBOL = "__sexp_symbol__"
+
+# canonical path -> (signature, parsed config), for all windows
+_parsed = {}
+
+
+def _signature(path):
+    stat = os.stat(path)
+    return [stat.st_mtime_ns, stat.st_size]
+
+
+def _cache_file(text):
+    """The serialized config in the ``:cache-dir`` of ``.ensime`` `text`,
+    found without parsing it, or None."""
+    match = _CACHE_DIR.search(text)
+    if not match:
+        return None
+    cache_dir = re.sub(r'\\(.)', r'\1', match.group(1))
+    return os.path.join(cache_dir, CACHE_FILE)
+
+
+def _encode(value):
+    if isinstance(value, sexpdata.Symbol):
+        return {_SYMBOL: value.value()}
+    raise TypeError("{!r} is not serializable".format(value))
+
+
+def _decode(obj):
+    return sexpdata.Symbol(obj[_SYMBOL]) if _SYMBOL in obj else obj
+
+
+def _read_cache(cache_file, path, signature):
+    try:
+        with open(cache_file, encoding="utf-8") as f:
+            cached = json.load(f, object_hook=_decode)
+        if (cached["format"] == CACHE_FORMAT and cached["path"] == path and
+                cached["signature"] == signature):
+            return cached["config"]
+    except (IOError, OSError, ValueError, KeyError, TypeError):
+        pass
+    return None
+
+
+def _write_cache(cache_file, path, signature, data):
+    try:
+        serialized = json.dumps({"format": CACHE_FORMAT, "path": path,
+                                 "signature": signature, "config": data}, default=_encode)
+    except TypeError:
+        return
+    partial = "{}.{}.tmp".format(cache_file, os.getpid())
+    try:
+        os.makedirs(os.path.dirname(cache_file), exist_ok=True)
+        with open(partial, "w", encoding="utf-8") as f:
+            f.write(serialized)
+        # readers never see half a file
+        os.replace(partial, cache_file)
+    except (IOError, OSError):
+        with catch((IOError, OSError)):
+            os.remove(partial)
+
+
+def load_config(path):
+    """The parsed ``.ensime`` at `path`, see `ProjectConfig.parse`.
+
+    Parsing is skipped while the file keeps its modification time and size:
+    the config is kept in memory, and serialized to the ``:cache-dir`` of the
+    project for the next sessions. The result is shared, don't change it.
+    """
+    path = os.path.realpath(path)
+    signature = _signature(path)
+    known = _parsed.get(path)
+    if known is not None and known[0] == signature:
+        return known[1]
+    text = Util.read_file(path)
+    cache_file = _cache_file(text)
+    data = cache_file and _read_cache(cache_file, path, signature)
+    if data is None:
+        data = ProjectConfig.parse_string(text)
+        if cache_file:
+            _write_cache(cache_file, path, signature, data)
+    _parsed[path] = (signature, data)
+    return data
+
+
 class ProjectConfig(collections.Mapping):
     """A dict-like immutable representation of an ENSIME project configuration.
 
@@ -64,7 +155,7 @@ class ProjectConfig(collections.Mapping):
 
     def __init__(self, filepath):
         self._filepath = os.path.realpath(filepath)
-        self.__data = self.parse(filepath)
+        self.__data = load_config(filepath)
 
     # Provide the Mapping protocol requirements
 
@@ -98,6 +189,20 @@ class ProjectConfig(collections.Mapping):
         Returns:
             dict: Configuration values with string keys.
         """
+        return ProjectConfig.parse_string(Util.read_file(path))
+
+    @staticmethod
+    def parse_string(text):
+        """Like `parse`, for the contents of an ``.ensime`` file."""
+        try:
+            return sexpconfig.loads(text)
+        except sexpconfig.Unsupported:
+            # broken or unusual files, with the errors of sexpdata
+            return ProjectConfig.parse_sexpdata(text)
+
+    @staticmethod
+    def parse_sexpdata(text):
+        """Like `parse_string`, with the generic parser of `sexpdata`."""
 
         def paired(iterable):
             """s -> (s0, s1), (s2, s3), (s4, s5), ..."""
@@ -127,5 +232,5 @@ class ProjectConfig(collections.Mapping):
 
             return newdict
 
-        conf = sexpdata.loads(Util.read_file(path))
+        conf = sexpdata.loads(text)
         return sexp2dict(conf)
@@ -2,6 +2,7 @@ import sublime
 
 import html
 
+from completions import CompletionCache
 
 # view names
 ENSIME_NOTES_VIEW = "Ensime notes"
@@ -16,6 +17,40 @@ ENSIME_BREAKPOINT_REGION = "ensime-breakpoint"
 ENSIME_DEBUGFOCUS_REGION = "ensime-debugfocus"
 ENSIME_STACKFOCUS_REGION = "ensime-stackfocus"
 
+# inline notes
+PHANTOM_STYLESHEET = '''
+    <style>
+        .warn{
+            background-color: color(var(--background) blend(yellow 40%));
+        }
+        div.error, div.warn {
+            padding: 0.4rem 0 0.4rem 0.7rem;
+            margin: 0.2rem 0;
+            border-radius: 2px;
+        }
+        div.error span.message, div.warn span.message {
+            padding-right: 0.5rem;
+            font-size: 0.7rem;
+        }
+        div.error a, div.warn a {
+            text-decoration: inherit;
+            padding: 0.35rem 0.7rem 0.45rem 0.8rem;
+            position: relative;
+            bottom: 0.05rem;
+            border-radius: 0 2px 2px 0;
+            font-weight: bold;
+        }
+        html.dark div.error a, html.dark div.warn a {
+            background-color: #00000018;
+        }
+        html.light div.error a, html.light div.warn a {
+            background-color: #ffffff18;
+        }
+    </style>
+'''
+# milliseconds between checks for scrolling while phantoms are shown
+VIEWPORT_POLL_INTERVAL = 250
+
 # status bar error format
 STATUS_BAR_ERROR = " [Line {line}] {severity} : {msg}"
 STATUSGROUP = "ensime_notes"
@@ -27,8 +62,17 @@ class Editor(object):
         self.settings = settings
         self.notes_storage = notes_storage
         self.phantom_sets_by_buffer = {}
+        # per view id, the offsets around which phantoms were materialized
+        self.phantom_ranges = {}
+        # phantom markup per (class, message)
+        self.phantom_html = {}
+        self.watching_viewport = False
+        # per view id, the notes generation and the regions last drawn
+        self.drawn_generations = {}
+        self.drawn_regions = {}
         self.show_errors = False
         self.suggestions = []
+        self.completion_cache = CompletionCache()
         self.ignore_prefix = None
         self.current_prefix = None
 
@@ -43,6 +87,8 @@ class Editor(object):
             view = self.w.active_view()
         view.erase_regions(ENSIME_ERROR_OUTLINE_REGION)
         view.erase_regions(ENSIME_WARNING_OUTLINE_REGION)
+        self.drawn_generations.pop(view.id(), None)
+        self.drawn_regions.pop(view.id(), None)
 
     def uncolorize_all(self):
         for view in self.w.views():
@@ -54,68 +100,72 @@ class Editor(object):
         if(self.show_errors):
             self.update_phantoms()
 
+    def redraw_changed_highlights(self):
+        """Redraw only the views whose notes changed since last drawn."""
+        changed = [view for view in self.w.views()
+                   if (self.notes_storage.generation(view.file_name()) !=
+                       self.drawn_generations.get(view.id()))]
+        for view in changed:
+            self.redraw_highlights(view)
+        if self.show_errors and changed:
+            self.update_phantoms(changed)
+
     def redraw_highlights(self, view=None):
         if view is None:
             view = self.w.active_view()
-        view.erase_regions(ENSIME_ERROR_OUTLINE_REGION)
-        view.erase_regions(ENSIME_WARNING_OUTLINE_REGION)
+        self.drawn_generations[view.id()] = self.notes_storage.generation(view.file_name())
 
         relevant_notes = self.notes_storage.for_file(view.file_name())
 
+        def full_lines(severity):
+            # a single region per line, however many notes it has
+            lines = {}
+            for note in relevant_notes:
+                if note.severity == severity and note.line not in lines:
+                    lines[note.line] = view.full_line(note.start)
+            return list(lines.values())
+
+        warnings = full_lines("NoteWarn")
+        errors = full_lines("NoteError")
+        # notes restored from the last session are drawn apart until replaced
+        stale = self.notes_storage.is_stale(view.file_name())
+        regions = (stale,
+                   sorted((r.a, r.b) for r in warnings),
+                   sorted((r.a, r.b) for r in errors))
+        if self.drawn_regions.get(view.id()) == regions:
+            return
+        self.drawn_regions[view.id()] = regions
+
+        view.erase_regions(ENSIME_ERROR_OUTLINE_REGION)
+        view.erase_regions(ENSIME_WARNING_OUTLINE_REGION)
         # stippled underline the warnings
-        warnings = [view.full_line(note.start) for note in relevant_notes if note.severity == "NoteWarn"]
         if self.settings.get("warning_highlight"):
             view.add_regions(
                 ENSIME_WARNING_OUTLINE_REGION,
-                warnings + view.get_regions(ENSIME_WARNING_OUTLINE_REGION),
-                self.settings.get("warning_scope"),
+                warnings,
+                self.settings.get("stale_scope" if stale else "warning_scope"),
                 self.settings.get("warning_icon"),
                 sublime.DRAW_NO_FILL)
         # Outline entire errored line
-        errors = [view.full_line(note.start) for note in relevant_notes if note.severity == "NoteError"]
         if self.settings.get("error_highlight"):
             view.add_regions(
                 ENSIME_ERROR_OUTLINE_REGION,
-                errors + view.get_regions(ENSIME_ERROR_OUTLINE_REGION),
-                self.settings.get("error_scope"),
+                errors,
+                self.settings.get("stale_scope" if stale else "error_scope"),
                 self.settings.get("error_icon"),
                 sublime.DRAW_NO_FILL)
 
-    def update_phantoms(self):
-        stylesheet = '''
-            <style>
-                .warn{
-                    background-color: color(var(--background) blend(yellow 40%));
-                }
-                div.error, div.warn {
-                    padding: 0.4rem 0 0.4rem 0.7rem;
-                    margin: 0.2rem 0;
-                    border-radius: 2px;
-                }
-                div.error span.message, div.warn span.message {
-                    padding-right: 0.5rem;
-                    font-size: 0.7rem;
-                }
-                div.error a, div.warn a {
-                    text-decoration: inherit;
-                    padding: 0.35rem 0.7rem 0.45rem 0.8rem;
-                    position: relative;
-                    bottom: 0.05rem;
-                    border-radius: 0 2px 2px 0;
-                    font-weight: bold;
-                }
-                html.dark div.error a, html.dark div.warn a {
-                    background-color: #00000018;
-                }
-                html.light div.error a, html.light div.warn a {
-                    background-color: #ffffff18;
-                }
-            </style>
-        '''
-        for file in self.notes_storage.per_file_cache.keys():
-            view = self.w.find_open_file(str(file))
-            # view is None if no such file is open
-            if view:
+    def update_phantoms(self, views=None):
+        """Show notes inline as phantoms, in ``views`` or every open view.
+
+        Only the notes around the visible region of each view get a phantom,
+        `watch_viewport` follows scrolling. `sublime.PhantomSet.update` keeps
+        the phantoms that didn't change.
+        """
+        if views is None:
+            views = self.w.views()
+        for view in views:
+            if view.file_name():
                 buffer_id = view.buffer_id()
                 if buffer_id not in self.phantom_sets_by_buffer:
                     phantom_set = sublime.PhantomSet(view, "exec")
@@ -123,26 +173,50 @@ class Editor(object):
                 else:
                     phantom_set = self.phantom_sets_by_buffer[buffer_id]
 
-                phantoms = []
-
-                errs = self.notes_storage.for_file(view.file_name())
+                # materialize a screenful above and below what's visible
+                visible = view.visible_region()
+                margin = max(visible.size(), 1)
+                begin, end = max(visible.begin() - margin, 0), visible.end() + margin
+                self.phantom_ranges[view.id()] = (begin, end)
 
+                phantoms = []
+                errs = self.notes_storage.in_region(view.file_name(), begin, end)
                 for note in errs:
                     if note.severity == "NoteInfo":
                         continue
-                    clss = "error" if note.severity == "NoteError" else "warn"
                     phantoms.append(sublime.Phantom(
                         sublime.Region(note.start, note.end),
-                        ('<body id=inline-error>' + stylesheet +
-                            '<div class=' + clss + '>' +
-                            '<span class="message">' + html.escape(note.message, quote=False) + '</span>' +
-                            '<a href=hide>' + chr(0x00D7) + '</a></div>' +
-                            '</body>'),
+                        self._phantom_html(note),
                         sublime.LAYOUT_BLOCK,
                         on_navigate=self.on_phantom_navigate))
 
                 phantom_set.update(phantoms)
 
+    def _phantom_html(self, note):
+        clss = "error" if note.severity == "NoteError" else "warn"
+        key = (clss, note.message)
+        if key not in self.phantom_html:
+            self.phantom_html[key] = (
+                '<body id=inline-error>' + PHANTOM_STYLESHEET +
+                '<div class=' + clss + '>' +
+                '<span class="message">' + html.escape(note.message, quote=False) + '</span>' +
+                '<a href=hide>' + chr(0x00D7) + '</a></div>' +
+                '</body>')
+        return self.phantom_html[key]
+
+    def watch_viewport(self):
+        """While phantoms are shown, update them as the active view scrolls."""
+        self.watching_viewport = self.show_errors
+        if not self.show_errors:
+            return
+        view = self.w.active_view()
+        if view is not None and view.id() in self.phantom_ranges:
+            visible = view.visible_region()
+            begin, end = self.phantom_ranges[view.id()]
+            if visible.begin() < begin or visible.end() > end:
+                self.update_phantoms([view])
+        sublime.set_timeout(self.watch_viewport, VIEWPORT_POLL_INTERVAL)
+
     def hide_phantoms(self):
         for file in self.notes_storage.per_file_cache.keys():
             view = self.w.find_open_file(str(file))
@@ -150,6 +224,8 @@ class Editor(object):
                 view.erase_phantoms("exec")
         self.show_errors = False
         self.phantom_sets_by_buffer = {}
+        self.phantom_ranges = {}
+        self.phantom_html = {}
 
     def on_phantom_navigate(self, url):
         self.hide_phantoms()
@@ -179,17 +255,16 @@ class Editor(object):
 
     # WIP
     def redraw_status_if_on_error(self, view, point):
-        errors = self.notes_storage.for_file(view.file_name())
+        errors = self.notes_storage.at_point(view.file_name(), point)
         severity = None
         msg = None
         for err in errors:
-            if (point >= err.start and point <= err.end):
-                if err.severity == "NoteError":
-                    severity = "ERROR"
-                elif err.severity == "NoteWarn":
-                    severity = "WARNING"
-                else:
-                    severity = "INFO"
+            if err.severity == "NoteError":
+                severity = "ERROR"
+            elif err.severity == "NoteWarn":
+                severity = "WARNING"
+            else:
+                severity = "INFO"
             msg = err.message
         if msg is not None:
             pass
@@ -3,15 +3,14 @@ import sublime
 import os
 import threading
 import logging
-from logging import FileHandler
 from functools import partial as bind
-import datetime
 
 import dotensime
 from util import Util
 from notes import NotesStorage
 from editor import Editor
 from config import LOG_FORMAT, CONSOLE_LOG_FORMAT
+from logs import LogPipeline, DEFAULT_MAX_BYTES, DEFAULT_BACKUPS
 
 env_lock = threading.RLock()
 # dictionary from window to it's EnsimeEnvironment
@@ -69,6 +68,7 @@ class _EnsimeEnvironment(object):
     def __init__(self, window):
         self.window = window
         self.logger = None
+        self.log_pipeline = None
         self.valid = False
         self.notes_storage = None
         self.editor = None
@@ -78,27 +78,16 @@ class _EnsimeEnvironment(object):
 
     def create_logger(self, debug, log_file):
         logger = logging.getLogger("ensime-{}".format(self.window))
-        file_log_formatter = logging.Formatter(LOG_FORMAT)
-        console_log_formatter = logging.Formatter(CONSOLE_LOG_FORMAT)
-
-        logger.handlers.clear()
-        with open(log_file, "w") as f:
-            now = datetime.datetime.now()
-            tm = now.strftime("%Y-%m-%d %H:%M:%S.%f")
-            f.write("{}: {} - {}\n".format(tm, "Initializing project", self.project_root))
-        file_handler = FileHandler(log_file)
-        file_handler.setFormatter(file_log_formatter)
-        logger.addHandler(file_handler)
-
-        console_handler = logging.StreamHandler()
-        console_handler.setFormatter(console_log_formatter)
-        logger.addHandler(console_handler)
+        self.log_pipeline = LogPipeline(logger, log_file, LOG_FORMAT, CONSOLE_LOG_FORMAT,
+                                        max_bytes=self.settings.get("log_max_bytes", DEFAULT_MAX_BYTES),
+                                        backups=self.settings.get("log_backups", DEFAULT_BACKUPS))
 
         if debug:
             logger.setLevel(logging.DEBUG)
         else:
             logger.setLevel(logging.INFO)
 
+        logger.info("Initializing project - %s", self.project_root)
         logger.info("Logger initialised.")
         return logger
 
@@ -135,6 +124,8 @@ class _EnsimeEnvironment(object):
         # ensure the cache_dir exists otherwise log initialisation will fail
         Util.mkdir_p(self.cache_dir)
         self.log_file = os.path.join(self.cache_dir, "ensime.log")
+        # highlights from the last session until the analyzer catches up
+        self.notes_storage.load_snapshot(os.path.join(self.cache_dir, "notes.json"))
         if self.logger is None:
             self.logger = self.create_logger(debug, self.log_file)
 
@@ -159,7 +150,8 @@ class _EnsimeEnvironment(object):
         self.notes_storage = None
         self.editor = None
         self.client = None
-        self.logger.handlers.clear()
+        self.log_pipeline.stop()
+        self.log_pipeline = None
         self.logger = None
         # reverting changings to user preferences
         s = sublime.load_settings("Preferences.sublime-settings")
@@ -6,11 +6,65 @@ import signal
 import socket
 import subprocess
 import datetime
+import time
 from abc import ABCMeta, abstractmethod
 from fnmatch import fnmatch
 
 from util import catch, Util
 from errors import LaunchError, InvalidJavaPathError
+from sizing import jvm_flags
+from cds import cds_flags, OFF
+
+# files written in the cache dir for a running server: its pid by the editor
+# that launched it, its ports by the server itself
+SERVER_FILES = ("server.pid", "http", "port")
+SERVER_MAIN = "org.ensime.server.Server"
+
+
+def remove_server_files(cache_dir):
+    for name in SERVER_FILES:
+        with catch(Exception):
+            os.remove(os.path.join(cache_dir, name))
+
+
+def pid_alive(pid):
+    """Whether a process with this pid exists."""
+    if os.name == "nt":
+        # os.kill would terminate it, the port probe and handshake will tell
+        return True
+    try:
+        os.kill(pid, 0)
+    except OSError as e:
+        # it exists but belongs to someone else
+        return e.errno == errno.EPERM
+    return True
+
+
+def is_ensime_server(pid):
+    """Whether the process with this pid runs the ENSIME server, by its
+    command line: None where that can't be told, e.g. without ``/proc``."""
+    try:
+        with open("/proc/{}/cmdline".format(pid), "rb") as f:
+            cmdline = f.read()
+    except (IOError, OSError) as e:
+        if e.errno == errno.ENOENT and os.path.isdir("/proc"):
+            # no such process
+            return False
+        return None
+    return SERVER_MAIN.encode("ascii") in cmdline
+
+
+def port_open(port, timeout=1.0):
+    """Whether something listens on ``port`` of the loopback interface."""
+    s = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    s.settimeout(timeout)
+    try:
+        s.connect(("127.0.0.1", port))
+        return True
+    except (socket.error, OverflowError):
+        return False
+    finally:
+        s.close()
 
 
 class EnsimeProcess(object):
@@ -18,6 +72,12 @@ class EnsimeProcess(object):
     def __init__(self, cache_dir, process, cleanup):
         self.cache_dir = cache_dir
         self.process = process
+        # how it was launched, for the logs
+        self.launch_notes = []
+        self.started_at = time.time()
+        # seconds until it accepted connections, see `cds.record_startup`
+        self.startup_time = None
+        self.cds_mode = None
         self.__stopped_manually = False
         self.__cleanup = cleanup
 
@@ -40,33 +100,92 @@ class EnsimeProcess(object):
             return False
         try:
             port = self.http_port()
-            s = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-            s.connect(("127.0.0.1", port))
-            s.close()
-            return True
-        except:
+        except (IOError, OSError, ValueError):
             return False
+        return port_open(port)
 
     def http_port(self):
         return int(Util.read_file(os.path.join(self.cache_dir, "http")))
 
 
+class AttachedProcess(EnsimeProcess):
+    """A server that was already running: launched by a previous session of
+    the editor, whose pid is known, or started outside of it.
+
+    Only a server launched by the editor is stopped along with the client,
+    and only while its pid is known to run the ENSIME server: pids are
+    reused, the one recorded may now belong to anything. Where that can't be
+    told the server is left running, and attached to again next time.
+    """
+
+    def __init__(self, cache_dir, pid=None):
+        super(AttachedProcess, self).__init__(cache_dir, None, lambda: remove_server_files(cache_dir))
+        self.pid = pid
+        self.stopped = False
+
+    def stop(self):
+        if self.pid is None or self.stopped:
+            return
+        verified = is_ensime_server(self.pid)
+        if verified:
+            with catch(OSError):
+                os.kill(self.pid, signal.SIGTERM)
+        # unless known to be gone, the server keeps its files for the next
+        # `EnsimeLauncher.attach` to find it rather than start another one
+        if verified is not None:
+            remove_server_files(self.cache_dir)
+        self.stopped = True
+
+    def aborted(self):
+        return not (self.stopped or self.is_running())
+
+    def is_running(self):
+        return not self.stopped and (self.pid is None or pid_alive(self.pid))
+
+
 class EnsimeLauncher(object):
     """Launches ENSIME processes"""
 
-    def __init__(self, config):
+    def __init__(self, config, settings=None):
         self.config = config
-        assembly = AssemblyJar(config, config['root-dir'])
+        assembly = AssemblyJar(config, config['root-dir'], settings)
 
         # Do we need to check if "ensime-server-jars" is defined in .ensime
         if assembly.isinstalled():
             self.strategy = assembly
         else:
-            self.strategy = DotEnsimeLauncher(config)
+            self.strategy = DotEnsimeLauncher(config, settings)
 
     def launch(self):
         return self.strategy.launch()
 
+    def attach(self):
+        """Find a server already running for the project.
+
+        It must have written its port to the cache dir and listen on it, and
+        if its pid was recorded that process must still exist and, where that
+        can be told, run the ENSIME server. Leftovers of a dead server are
+        removed. Whether it is really an ENSIME server is up
+        to the client's ``ConnectionInfoReq`` handshake.
+
+        Returns:
+            AttachedProcess: The server found, or None.
+        """
+        cache_dir = self.config['cache-dir']
+        try:
+            port = int(Util.read_file(os.path.join(cache_dir, "http")))
+        except (IOError, OSError, ValueError):
+            return None
+        pid = None
+        with catch((IOError, OSError, ValueError)):
+            pid = int(Util.read_file(os.path.join(cache_dir, "server.pid")))
+        if pid is not None and (not pid_alive(pid) or is_ensime_server(pid) is False):
+            remove_server_files(cache_dir)
+            return None
+        if not port_open(port):
+            return None
+        return AttachedProcess(cache_dir, pid)
+
 
 class LaunchStrategy:
     """A strategy for how to install and launch the ENSIME server.
@@ -78,11 +197,13 @@ class LaunchStrategy:
 
     Args:
         config (ProjectConfig): Configuration for the server instance's project.
+        settings (dict): The plugin settings, e.g. ``jvm_sizing``.
     """
     __metaclass__ = ABCMeta
 
-    def __init__(self, config):
+    def __init__(self, config, settings=None):
         self.config = config
+        self.settings = settings if settings is not None else {}
 
     @abstractmethod
     def isinstalled(self):
@@ -115,7 +236,7 @@ class LaunchStrategy:
             EnsimeProcess: A process handle for the launched server.
         """
         cache_dir = self.config['cache-dir']
-        java_flags = self.config['java-flags']
+        java_flags, sizing = jvm_flags(self.config, self.settings.get("jvm_sizing"))
 
         Util.mkdir_p(cache_dir)
         log_path = os.path.join(cache_dir, "server.log")
@@ -123,7 +244,8 @@ class LaunchStrategy:
             now = datetime.datetime.now()
             tm = now.strftime("%Y-%m-%d %H:%M:%S.%f")
             f.write("{}: {}\n".format(tm, "Initializing ensime process"))
-        log = open(log_path, "w")        
+            f.write("{}: {}\n".format(tm, sizing))
+        log = open(log_path, "a")
         null = open(os.devnull, "r")
         java = os.path.join(self.config['java-home'], 'bin', 'java' if os.name != 'nt' else 'java.exe')
 
@@ -132,9 +254,15 @@ class LaunchStrategy:
         elif not os.access(java, os.X_OK):
             raise InvalidJavaPathError(errno.EACCES, 'Permission denied', java)
 
+        notes = [sizing]
+        sharing, cds_mode = [], OFF
+        if self.settings.get("class_data_sharing", False):
+            sharing, cds_mode, note = cds_flags(cache_dir, classpath, self.config['java-home'], java_flags)
+            notes.append(note)
+
         args = (
             [java, "-cp", (':' if os.name != 'nt' else ';').join(classpath)] +
-            [a for a in java_flags if a] +
+            java_flags + sharing +
             ["-Densime.config={}".format(os.path.join(self.config['root-dir'], '.ensime')),
              "org.ensime.server.Server"])
         process = None
@@ -168,7 +296,10 @@ class LaunchStrategy:
                 with catch(Exception):
                     os.remove(path)
 
-        return EnsimeProcess(cache_dir, process, on_stop)
+        ensime = EnsimeProcess(cache_dir, process, on_stop)
+        ensime.launch_notes.extend(notes)
+        ensime.cds_mode = cds_mode
+        return ensime
 
 
 class AssemblyJar(LaunchStrategy):
@@ -179,8 +310,8 @@ class AssemblyJar(LaunchStrategy):
     http://ensime.github.io/contributing/#manual-qa-testing
     """
 
-    def __init__(self, config, base_dir):
-        super(AssemblyJar, self).__init__(config)
+    def __init__(self, config, base_dir, settings=None):
+        super(AssemblyJar, self).__init__(config, settings)
         self.base_dir = os.path.realpath(base_dir)
         self.jar_path = None
         self.toolsjar = os.path.join(config['java-home'], 'lib', 'tools.jar')
@@ -207,8 +338,8 @@ class AssemblyJar(LaunchStrategy):
 class DotEnsimeLauncher(LaunchStrategy):
     """Launches a pre-installed ENSIME via jar paths in ``.ensime``."""
 
-    def __init__(self, config):
-        super(DotEnsimeLauncher, self).__init__(config)
+    def __init__(self, config, settings=None):
+        super(DotEnsimeLauncher, self).__init__(config, settings)
         server_jars = self.config['ensime-server-jars']
         compiler_jars = self.config['scala-compiler-jars']
 
@@ -0,0 +1,112 @@
+# coding: utf-8
+
+import threading
+import time
+from collections import OrderedDict
+
+# How long per-call state is kept by default: well beyond the longest request
+# timeout, so it only ever drops state of calls that will never be answered.
+DEFAULT_LIFETIME = 600
+# Upper bound on entries, whatever their age.
+DEFAULT_MAX_SIZE = 10000
+
+
+class ExpiringTable(object):
+    """Per-call state, kept until it's removed or expires.
+
+    Every entry expires ``lifetime`` seconds after it was added. As the
+    lifetime is the same for all entries, insertion order is also expiry
+    order: expired entries are purged from the front as new ones are added,
+    at a constant amortized cost. When the table holds `max_size` entries,
+    adding one evicts the oldest.
+
+    Args:
+        lifetime (float): Seconds before an entry expires.
+        max_size (int): Most entries kept.
+        clock (callable): Current time in seconds, for tests.
+    """
+
+    def __init__(self, lifetime=DEFAULT_LIFETIME, max_size=DEFAULT_MAX_SIZE, clock=time.time):
+        self.lifetime = lifetime
+        self.max_size = max_size
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        # counters
+        self.added = 0
+        self.removed = 0
+        self.expired = 0
+        self.evicted = 0
+
+    def __setitem__(self, key, value):
+        with self._lock:
+            now = self._clock()
+            self._purge(now)
+            if self._entries.pop(key, None) is not None:
+                self.removed += 1
+            while len(self._entries) >= self.max_size:
+                self._entries.popitem(last=False)
+                self.evicted += 1
+            self._entries[key] = (now + self.lifetime, value)
+            self.added += 1
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] <= self._clock():
+                return default
+            return entry[1]
+
+    def __getitem__(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] <= self._clock():
+                raise KeyError(key)
+            return entry[1]
+
+    def pop(self, key, default=None):
+        """Remove ``key``, the call is over."""
+        with self._lock:
+            entry = self._entries.pop(key, None)
+            if entry is None:
+                return default
+            if entry[0] <= self._clock():
+                self.expired += 1
+                return default
+            self.removed += 1
+            return entry[1]
+
+    def __contains__(self, key):
+        return self.get(key, self) is not self
+
+    def purge(self):
+        """Drop expired entries now, rather than when adding one."""
+        with self._lock:
+            self._purge(self._clock())
+
+    def _purge(self, now):
+        entries = self._entries
+        while entries:
+            key = next(iter(entries))
+            if entries[key][0] > now:
+                break
+            del entries[key]
+            self.expired += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        with self._lock:
+            self._purge(self._clock())
+            return len(self._entries)
+
+    def stats(self):
+        with self._lock:
+            self._purge(self._clock())
+            return {"size": len(self._entries),
+                    "added": self.added,
+                    "removed": self.removed,
+                    "expired": self.expired,
+                    "evicted": self.evicted}
@@ -0,0 +1,102 @@
+# coding: utf-8
+
+import json
+import logging
+import os
+import queue
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+
+from util import Pretty
+
+# fields holding whole buffers, only their size is logged
+REDACTED_FIELDS = frozenset(["contents"])
+# longer strings are cut, e.g. note messages or docs
+MAX_STRING = 200
+DEFAULT_MAX_BYTES = 5 * 1024 * 1024
+DEFAULT_BACKUPS = 3
+
+
+def redact(data, max_string=MAX_STRING):
+    """A copy of ``data`` fit for the log: the values of `REDACTED_FIELDS`
+    are replaced by their length and other long strings are truncated."""
+    if isinstance(data, dict):
+        return dict((key, "<{} chars>".format(len(value))
+                     if key in REDACTED_FIELDS and isinstance(value, str)
+                     else redact(value, max_string))
+                    for key, value in data.items())
+    if isinstance(data, (list, tuple)):
+        return [redact(value, max_string) for value in data]
+    if isinstance(data, str) and len(data) > max_string:
+        return "{}...<{} more chars>".format(data[:max_string], len(data) - max_string)
+    return data
+
+
+class Redacted(object):
+    """Wrapper logging a message to or from the server on a single line.
+
+    Like `util.Pretty` nothing happens unless the record is emitted, and then
+    on the thread of `LogPipeline`: the message must not change once logged.
+    """
+    def __init__(self, data):
+        self._data = data
+
+    def __str__(self):
+        return json.dumps(redact(self._data), sort_keys=True, default=repr)
+
+
+# arguments formatted when the record is written rather than when it's logged
+_DEFERRED = (Redacted, Pretty, str, bytes, int, float, bool, type(None))
+
+
+class DeferredQueueHandler(QueueHandler):
+    """Puts records on a queue without formatting them, when their arguments
+    are immutable or wrappers such as `Redacted`. Other records are formatted
+    right away, as they might change before being written."""
+
+    def prepare(self, record):
+        args = record.args if isinstance(record.args, tuple) else (record.args,)
+        if record.exc_info or not all(isinstance(arg, _DEFERRED) for arg in args):
+            return super(DeferredQueueHandler, self).prepare(record)
+        return record
+
+
+class LogPipeline(object):
+    """Writes the records of a logger from a background thread.
+
+    The logger only queues records, see `DeferredQueueHandler`; formatting
+    and writing them to a `RotatingFileHandler` and the console happen on the
+    thread of a `logging.handlers.QueueListener`. The log of the previous
+    session is rotated to ``log_file.1`` at start.
+
+    Args:
+        logger (logging.Logger): Its handlers are replaced.
+        log_file (str): Rotated once over ``max_bytes``, keeping ``backups``.
+    """
+    def __init__(self, logger, log_file, file_format, console_format,
+                 max_bytes=DEFAULT_MAX_BYTES, backups=DEFAULT_BACKUPS):
+        self.logger = logger
+        file_handler = RotatingFileHandler(log_file, maxBytes=max_bytes, backupCount=backups,
+                                           delay=True)
+        if backups and os.path.exists(log_file) and os.path.getsize(log_file):
+            file_handler.doRollover()
+        file_handler.setFormatter(logging.Formatter(file_format))
+        console_handler = logging.StreamHandler()
+        console_handler.setFormatter(logging.Formatter(console_format))
+        self.handlers = [file_handler, console_handler]
+
+        records = queue.Queue()
+        self.listener = QueueListener(records, *self.handlers)
+        logger.handlers.clear()
+        logger.addHandler(DeferredQueueHandler(records))
+        # handlers up the hierarchy would format records on the caller's thread
+        logger.propagate = False
+        self.listener.start()
+
+    def stop(self):
+        """Write the records still queued and close the files."""
+        self.logger.handlers.clear()
+        if self.listener is not None:
+            self.listener.stop()
+            self.listener = None
+            for handler in self.handlers:
+                handler.close()
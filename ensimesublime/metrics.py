@@ -0,0 +1,187 @@
+# coding: utf-8
+
+import json
+import os
+import threading
+import time
+
+from lifecycle import ExpiringTable, DEFAULT_LIFETIME
+
+# Buckets per power of two are ``2 ** (SUB_BUCKET_BITS - 1)``, which bounds
+# the relative error of recorded values to about 3%.
+SUB_BUCKET_BITS = 6
+_HALF = 1 << (SUB_BUCKET_BITS - 1)
+
+# Phases of a call, in order.
+SEND = "send"
+RECEIVED = "received"
+DECODE = "decode"
+HANDLER = "handler"
+PHASES = (SEND, RECEIVED, DECODE, HANDLER)
+
+
+def _bucket(value):
+    """Index of the bucket of ``value``, a non-negative int."""
+    magnitude = value.bit_length() - SUB_BUCKET_BITS
+    if magnitude <= 0:
+        return value
+    return (magnitude << (SUB_BUCKET_BITS - 1)) + (value >> magnitude)
+
+
+def _lowest(index):
+    """Smallest value falling into bucket ``index``."""
+    if index < 2 * _HALF:
+        return index
+    magnitude = (index >> (SUB_BUCKET_BITS - 1)) - 1
+    return (index - (magnitude << (SUB_BUCKET_BITS - 1))) << magnitude
+
+
+def _highest(index):
+    return _lowest(index + 1) - 1
+
+
+class Histogram(object):
+    """Latencies in microseconds, bucketed log-linearly as HDR histograms do.
+
+    Values are counted in buckets whose width grows with their magnitude, so
+    recording is constant time and memory only grows with the range of
+    values, while percentiles stay within a few percent of the exact ones.
+    """
+
+    def __init__(self):
+        self.counts = {}
+        self.count = 0
+        self.total = 0
+        self.min = None
+        self.max = 0
+
+    def record(self, seconds):
+        value = max(int(seconds * 1000000), 0)
+        index = _bucket(value)
+        self.counts[index] = self.counts.get(index, 0) + 1
+        self.count += 1
+        self.total += value
+        if self.min is None or value < self.min:
+            self.min = value
+        if value > self.max:
+            self.max = value
+
+    def percentile(self, p):
+        """Upper bound of the ``p``-th percentile, in microseconds."""
+        if not self.count:
+            return 0
+        rank = max(p / 100.0 * self.count, 1)
+        seen = 0
+        for index in sorted(self.counts):
+            seen += self.counts[index]
+            if seen >= rank:
+                return min(_highest(index), self.max)
+        return self.max
+
+    def mean(self):
+        return self.total / self.count if self.count else 0
+
+    def to_dict(self):
+        """Summary in milliseconds, along with the buckets by lowest value."""
+        return {"count": self.count,
+                "min": (self.min or 0) / 1000.0,
+                "mean": self.mean() / 1000.0,
+                "p50": self.percentile(50) / 1000.0,
+                "p90": self.percentile(90) / 1000.0,
+                "p99": self.percentile(99) / 1000.0,
+                "max": self.max / 1000.0,
+                "buckets": dict((str(_lowest(index)), count)
+                                for index, count in sorted(self.counts.items()))}
+
+
+class LatencyStats(object):
+    """Latency histograms of calls to the server, per typehint and phase.
+
+    The phases of a call are:
+
+    - ``send``: from the request being issued to its message being handed to
+      the socket, including the time it was held back by the scheduler,
+    - ``received``: from then to the whole response having been read off the
+      socket, so the server's time and the transfer of the response,
+    - ``decode``: decoding the payload of the response,
+    - ``handler``: running the handler of the response.
+
+    Calls are recorded under the typehint of their request. Events, which
+    don't answer a request, are recorded under their own typehint for the
+    last two phases.
+    """
+
+    def __init__(self, lifetime=DEFAULT_LIFETIME, clock=time.time):
+        self.now = clock
+        # call_id -> [request typehint, issued at, sent at]
+        self._calls = ExpiringTable(lifetime, clock=clock)
+        self._lock = threading.Lock()
+        self._histograms = {}
+
+    def issued(self, call_id, typehint):
+        self._calls[call_id] = [typehint, self.now(), None]
+
+    def sent(self, call_id):
+        call = self._calls.get(call_id)
+        if call is not None:
+            call[2] = self.now()
+            self.record(call[0], SEND, call[2] - call[1])
+
+    def received(self, call_id, at):
+        """The response to ``call_id`` was read in full at ``at``."""
+        call = self._calls.get(call_id)
+        if call is not None and call[2] is not None:
+            self.record(call[0], RECEIVED, at - call[2])
+
+    def typehint(self, call_id):
+        """Typehint of the request of ``call_id``, if it's still tracked."""
+        call = self._calls.get(call_id)
+        return call[0] if call is not None else None
+
+    def finished(self, call_id):
+        self._calls.pop(call_id)
+
+    def record(self, typehint, phase, seconds):
+        typehint = typehint or "unknown"
+        with self._lock:
+            histogram = self._histograms.get((typehint, phase))
+            if histogram is None:
+                histogram = self._histograms[(typehint, phase)] = Histogram()
+            histogram.record(seconds)
+
+    def snapshot(self):
+        """Summaries of the histograms, by typehint then phase."""
+        with self._lock:
+            snapshot = {}
+            for (typehint, phase), histogram in self._histograms.items():
+                snapshot.setdefault(typehint, {})[phase] = histogram.to_dict()
+            return snapshot
+
+    def report(self):
+        """The histograms as a text table, in milliseconds."""
+        lines = ["{:<32} {:<10} {:>7} {:>9} {:>9} {:>9} {:>9}".format(
+            "typehint", "phase", "count", "p50", "p90", "p99", "max")]
+        snapshot = self.snapshot()
+        for typehint in sorted(snapshot):
+            for phase in PHASES:
+                stats = snapshot[typehint].get(phase)
+                if stats is None:
+                    continue
+                lines.append("{:<32} {:<10} {:>7} {:>9.2f} {:>9.2f} {:>9.2f} {:>9.2f}".format(
+                    typehint, phase, stats["count"], stats["p50"], stats["p90"],
+                    stats["p99"], stats["max"]))
+        return "\n".join(lines)
+
+    def dump(self, path, extra=None):
+        """Write the histograms to ``path`` as JSON, along with ``extra``."""
+        stats = dict(extra or {})
+        stats["time"] = time.time()
+        stats["latency"] = self.snapshot()
+        tmp_path = path + ".tmp"
+        try:
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(stats, f, indent=1, sort_keys=True)
+            os.replace(tmp_path, path)
+        except (IOError, OSError):
+            return False
+        return True
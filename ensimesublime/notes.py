@@ -1,7 +1,15 @@
+import json
+import os
+from bisect import bisect_left, bisect_right
+
 from paths import normalize_path
 
+SNAPSHOT_VERSION = 1
+
 
 class Note(object):
+    __slots__ = ('message', 'file_name', 'severity', 'start', 'end', 'line', 'col')
+
     def __init__(self, m):
         self.message = m['msg']
         self.file_name = m['file']
@@ -11,22 +19,205 @@ class Note(object):
         self.line = m['line']
         self.col = m['col']
 
+    def to_row(self):
+        """Compact form for snapshots, see `from_row`."""
+        return [self.message, self.severity, self.start, self.end, self.line, self.col]
+
+    @staticmethod
+    def from_row(file_name, row):
+        message, severity, beg, end, line, col = row
+        return Note({'msg': message, 'file': file_name, 'severity': {'typehint': severity},
+                     'beg': beg, 'end': end, 'line': line, 'col': col})
+
+
+class FileNotes(object):
+    """The notes of a file, indexed by offset and by line.
+
+    Notes are kept sorted by start offset along with the longest note span,
+    so the notes overlapping a region are found by bisecting for the starts
+    within ``[begin - longest span, end]``. A second ordering by line answers
+    line range queries. Indexes are rebuilt lazily on the first query after
+    notes were added.
+    """
+
+    def __init__(self, stale=False):
+        # stale notes come from a snapshot of a previous session
+        self.stale = stale
+        self.notes = []
+        self._sorted = True
+        self._starts = []
+        self._by_line = []
+        self._lines = []
+        self._max_span = 0
+
+    def extend(self, notes):
+        self.notes.extend(notes)
+        self._sorted = False
+
+    def _index(self):
+        if self._sorted:
+            return
+        self.notes.sort(key=lambda note: (note.start, note.end))
+        self._starts = [note.start for note in self.notes]
+        self._max_span = max([note.end - note.start for note in self.notes] or [0])
+        self._by_line = sorted(self.notes, key=lambda note: note.line)
+        self._lines = [note.line for note in self._by_line]
+        self._sorted = True
+
+    def all(self):
+        self._index()
+        return self.notes
+
+    def in_region(self, begin, end):
+        """Notes overlapping ``[begin, end]``, by start offset."""
+        self._index()
+        lo = bisect_left(self._starts, begin - self._max_span)
+        hi = bisect_right(self._starts, end)
+        return [note for note in self.notes[lo:hi] if note.end >= begin]
+
+    def at(self, point):
+        return self.in_region(point, point)
+
+    def in_lines(self, first, last):
+        """Notes on lines ``first`` to ``last`` inclusive, by line."""
+        self._index()
+        lo = bisect_left(self._lines, first)
+        hi = bisect_right(self._lines, last)
+        return self._by_line[lo:hi]
+
+    def __len__(self):
+        return len(self.notes)
+
 
-# Make it smarter
 class NotesStorage(object):
+    """Notes of the project, per file.
+
+    Every change to the notes of a file bumps its generation, so that views
+    are only redrawn when their notes changed. When the server clears all
+    notes before typechecking, existing notes are kept until the typecheck
+    ends: a file whose new notes arrive meanwhile gets them instead of its old
+    ones, and the files that got none are cleared by `end_round`.
+
+    Notes can be saved to a snapshot on disk with `save_snapshot`. Once loaded
+    by `load_snapshot` in a later session, the notes of a file that didn't
+    change meanwhile are restored as stale on first access, until live notes
+    replace them.
+    """
+
     def __init__(self):
         self.normalized_cache = {}
         self.per_file_cache = {}
+        self.generations = {}
+        self._generation = 0
+        # files whose notes are outdated by the current typecheck round
+        self._outdated = set()
+        self.snapshot_path = None
+        self._snapshot = {}
+
+    def _normalize(self, file_name):
+        if file_name not in self.normalized_cache:
+            self.normalized_cache[file_name] = normalize_path(file_name)
+        return self.normalized_cache[file_name]
+
+    def _touch(self, file_name):
+        self._generation += 1
+        self.generations[file_name] = self._generation
+
+    def generation(self, file_name):
+        """Changes whenever the notes of ``file_name`` do."""
+        return self.generations.get(self._normalize(file_name), 0)
 
     def append(self, data):
-        data = list(data)
+        per_file = {}
         for datum in data:
-            if datum.file_name not in self.normalized_cache:
-                self.normalized_cache[datum.file_name] = normalize_path(datum.file_name)
-            file_name = self.normalized_cache[datum.file_name]
-            if file_name not in self.per_file_cache:
-                self.per_file_cache[file_name] = []
-            self.per_file_cache[file_name].append(datum)
+            per_file.setdefault(self._normalize(datum.file_name), []).append(datum)
+        for file_name, notes in per_file.items():
+            self._snapshot.pop(file_name, None)
+            if (file_name not in self.per_file_cache or file_name in self._outdated or
+                    self.per_file_cache[file_name].stale):
+                self._outdated.discard(file_name)
+                self.per_file_cache[file_name] = FileNotes()
+            self.per_file_cache[file_name].extend(notes)
+            self._touch(file_name)
+
+    def begin_round(self):
+        """All current notes are outdated by a typecheck that just started."""
+        self._outdated = set(self.per_file_cache)
+
+    def end_round(self):
+        """The typecheck is over, clear the files that didn't get new notes.
+
+        Returns:
+            set: The files whose notes got cleared.
+        """
+        cleared = set()
+        for file_name in self._outdated:
+            if len(self.per_file_cache.get(file_name, ())):
+                self.per_file_cache[file_name] = FileNotes()
+                self._touch(file_name)
+                cleared.add(file_name)
+        self._outdated = set()
+        # a full round of live notes supersedes the snapshot
+        self._snapshot = {}
+        return cleared
+
+    def load_snapshot(self, path):
+        """Read the snapshot at ``path``, notes are restored lazily."""
+        self.snapshot_path = path
+        try:
+            with open(path, encoding="utf-8") as f:
+                snapshot = json.load(f)
+        except (IOError, OSError, ValueError):
+            return False
+        if snapshot.get("version") != SNAPSHOT_VERSION:
+            return False
+        self._snapshot = snapshot.get("files", {})
+        return True
+
+    def save_snapshot(self, path=None):
+        """Write the current notes to ``path``, by default where they were
+        loaded from, along with the size and mtime of their files."""
+        path = path or self.snapshot_path
+        if path is None:
+            return False
+        files = dict(self._snapshot)
+        for file_name, file_notes in self.per_file_cache.items():
+            files.pop(file_name, None)
+            if not len(file_notes) or file_notes.stale:
+                continue
+            try:
+                stat = os.stat(file_name)
+            except (OSError, TypeError):
+                continue
+            files[file_name] = {"mtime": stat.st_mtime, "size": stat.st_size,
+                                "notes": [note.to_row() for note in file_notes.all()]}
+        tmp_path = path + ".tmp"
+        try:
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump({"version": SNAPSHOT_VERSION, "files": files}, f, separators=(",", ":"))
+            os.replace(tmp_path, path)
+        except (IOError, OSError):
+            return False
+        return True
+
+    def is_stale(self, file_name):
+        """Whether the notes of ``file_name`` come from a snapshot."""
+        return self._file_notes(file_name).stale
+
+    def _restore(self, file_name):
+        """Stale notes of ``file_name`` from the snapshot, if still valid."""
+        entry = self._snapshot.pop(file_name, None)
+        if entry is None:
+            return None
+        try:
+            stat = os.stat(file_name)
+        except OSError:
+            return None
+        if stat.st_mtime != entry["mtime"] or stat.st_size != entry["size"]:
+            return None
+        file_notes = FileNotes(stale=True)
+        file_notes.extend(Note.from_row(file_name, row) for row in entry["notes"])
+        return file_notes
 
     # def filter_files(self, filenames):
     #     dropouts = list(normalize_path(filename) for filename in filenames)
@@ -35,7 +226,10 @@ class NotesStorage(object):
     #             del self.per_file_cache[file_name]
 
     def clear(self):
+        for file_name in self.per_file_cache:
+            self._touch(file_name)
         self.per_file_cache.clear()
+        self._outdated = set()
 
     # requires self.data
     # def filter_notes(self, pred):
@@ -46,10 +240,24 @@ class NotesStorage(object):
     #         if file_name in dropouts:
     #             del self.per_file_cache[file_name]
 
-    def for_file(self, file_name):
-        if file_name not in self.normalized_cache:
-            self.normalized_cache[file_name] = normalize_path(file_name)
-        file_name = self.normalized_cache[file_name]
+    def _file_notes(self, file_name):
+        file_name = self._normalize(file_name)
         if file_name not in self.per_file_cache:
-            self.per_file_cache[file_name] = []
+            self.per_file_cache[file_name] = self._restore(file_name) or FileNotes()
         return self.per_file_cache[file_name]
+
+    def for_file(self, file_name):
+        """All notes of ``file_name``, by start offset."""
+        return self._file_notes(file_name).all()
+
+    def at_point(self, file_name, point):
+        """Notes of ``file_name`` spanning offset ``point``."""
+        return self._file_notes(file_name).at(point)
+
+    def in_region(self, file_name, begin, end):
+        """Notes of ``file_name`` overlapping offsets ``begin`` to ``end``."""
+        return self._file_notes(file_name).in_region(begin, end)
+
+    def in_lines(self, file_name, first, last):
+        """Notes of ``file_name`` on lines ``first`` to ``last``."""
+        return self._file_notes(file_name).in_lines(first, last)
@@ -1,22 +1,45 @@
-import json
-
-from util import Pretty
+from logs import Redacted
+from pending import PendingResponse
+from buffers import contents_hash
+from scheduler import INTERACTIVE, BACKGROUND, BULK
 
 DEFAULT_TIMEOUT = 300
 COMPLETION_TIMEOUT = 5
 
 
 class RpcRequest(object):
+    # scheduling class of the request, see `scheduler.RequestScheduler`
+    priority = BACKGROUND
+
+    def send_request(self, request, client, async, pending=None):
+        """Send a request to the server.
 
-    def send_request(self, request, client, async):
-        """Send a request to the server."""
+        A synchronous request is waited for with `pending`, see
+        `pending.PendingResponses.register`.
+        """
         client.env.logger.debug('send_request: in')
 
+        key = self.query_key() if async else None
+        if key is not None:
+            pending_call = client.queries.coalesce(key)
+            if pending_call is not None:
+                client.env.logger.debug('send_request: same as call %s', pending_call)
+                return pending_call
+            superseded = client.queries.start(client.call_id, key)
+            if superseded is not None and client.scheduler.cancel(superseded):
+                # never sent, no reply will clean up after it
+                client.queries.finish(superseded)
+                client.forget_call(superseded)
+
         message = {'callId': client.call_id, 'req': request}
         client.call_options[client.call_id] = {'async': async}
         client.call_options[client.call_id].update(self.call_options())
-        client.env.logger.info('send_request: %s', Pretty(message))
-        client.send(json.dumps(message))
+        client.latency.issued(client.call_id, request.get('typehint'))
+        if not async:
+            # register before sending so a fast reply can't beat its waiter
+            client.responses.register(client.call_id, pending)
+        client.env.logger.info('send_request: %s', Redacted(message))
+        client.scheduler.submit(client.call_id, self.priority, client.codec.encode(message))
 
         call_id = client.call_id
         client.call_id += 1
@@ -30,14 +53,60 @@ class RpcRequest(object):
             return response
         return None
 
+    def submit(self, env):
+        """Send the request without waiting for the response.
+
+        Returns:
+            PendingResponse: Completed with the `codec.Frame` of the response
+            when it arrives. Its payload is not dispatched to the handlers.
+        """
+        client = env.client
+
+        def forget(done):
+            # what get_response and its handler would drop
+            client.responses.discard(done.call_id)
+            client.forget_call(done.call_id)
+
+        pending = PendingResponse()
+        # before sending, the reply may come back right away
+        pending.add_done_callback(forget)
+        self.send_request(self.json_repr(), client, False, pending)
+        return pending
+
     def json_repr(self):
         raise NotImplementedError
 
     def call_options(self):
         return {}
 
+    def query_key(self):
+        """Identity of the request for `scheduler.QueryTracker`, if only the
+        latest request of its kind matters. Its first element is the slot."""
+        return None
+
+
+class SourceRequest(RpcRequest):
+    """A request about a source file, sent along with its unsaved contents.
+
+    The ``fileInfo`` fragment is built when the request is run, by the
+    client's `buffers.BufferTracker`, which decides how contents are passed.
+    """
+
+    def __init__(self, file, contents):
+        super(SourceRequest, self).__init__()
+        self.file = file
+        self.contents = contents
+        self.digest = contents_hash(contents)
+        self.file_info = {"file": file}
+
+    def run_in(self, env, async=False):
+        self.file_info = env.client.buffers.file_info(self.file, self.contents, self.digest)
+        return super(SourceRequest, self).run_in(env, async)
+
 
 class ConnectionInfoRequest(RpcRequest):
+    priority = INTERACTIVE
+
     def __init__(self):
         super(ConnectionInfoRequest, self).__init__()
 
@@ -46,6 +115,8 @@ class ConnectionInfoRequest(RpcRequest):
 
 
 class TypeCheckFilesReq(RpcRequest):
+    priority = BULK
+
     def __init__(self, filenames):
         super(TypeCheckFilesReq, self).__init__()
         self.filenames = list(filenames)
@@ -74,22 +145,18 @@ class ImportSuggestionsReq(RpcRequest):
         return {'file_name': self.file}
 
 
-class CompletionsReq(RpcRequest):
-    def __init__(self, point, file, contents=None, max_results=100, case_sensitive=True, reLoad=False):
-        super(CompletionsReq, self).__init__()
+class CompletionsReq(SourceRequest):
+    priority = INTERACTIVE
+
+    def __init__(self, point, file, contents=None, max_results=100, case_sensitive=True, reLoad=False,
+                 cache_key=None):
+        super(CompletionsReq, self).__init__(file, contents)
         self.point = point
-        self.file_info = self._file_info(file, contents)
         self.case_sensitive = case_sensitive
         self.max_results = max_results
         self.reLoad = reLoad
         self.timeout = COMPLETION_TIMEOUT
-
-    def _file_info(self, file, contents):
-        """Message fragment for ENSIME ``fileInfo`` field, from current file."""
-        file_info = {"file": file}
-        if contents is not None:
-            file_info.update({"contents": contents})
-        return file_info
+        self.cache_key = cache_key
 
     def json_repr(self):
         return {"point": self.point, "maxResults": self.max_results,
@@ -98,46 +165,43 @@ class CompletionsReq(RpcRequest):
                 "fileInfo": self.file_info,
                 "reload": self.reLoad}
 
+    def call_options(self):
+        return {'cache_key': self.cache_key, 'max_results': self.max_results}
+
+
+class SymbolAtPointReq(SourceRequest):
+    priority = INTERACTIVE
 
-class SymbolAtPointReq(RpcRequest):
     def __init__(self, file, contents, pos):
-        super(SymbolAtPointReq, self).__init__()
-        self.file_info = self._file_info(file, contents)
+        super(SymbolAtPointReq, self).__init__(file, contents)
         self.pos = pos
 
-    def _file_info(self, file, contents):
-        """Message fragment for ENSIME ``fileInfo`` field, from current file."""
-        file_info = {"file": file}
-        if contents is not None:
-            file_info.update({"contents": contents})
-        return file_info
-
     def json_repr(self):
         return {"typehint": "SymbolAtPointReq",
                 "file": self.file_info,
                 "point": self.pos}
 
+    def query_key(self):
+        return ("SymbolAtPointReq", self.file, self.pos, self.digest)
+
+
+class GenericAtPointReq(SourceRequest):
+    priority = INTERACTIVE
 
-class GenericAtPointReq(RpcRequest):
     def __init__(self, file, contents, pos, what):
-        super(GenericAtPointReq, self).__init__()
-        self.file_info = self._file_info(file, contents)
+        super(GenericAtPointReq, self).__init__(file, contents)
         self.pos_tag = "range" if what == "Type" else "point"
         self.pos = pos
         self.what = what
 
-    def _file_info(self, file, contents):
-        """Message fragment for ENSIME ``fileInfo`` field, from current file."""
-        file_info = {"file": file}
-        if contents is not None:
-            file_info.update({"contents": contents})
-        return file_info
-
     def json_repr(self):
         return {"typehint": "{}AtPointReq".format(self.what),
                 "file": self.file_info,
                 "{}".format(self.pos_tag): {"from": self.pos, "to": self.pos}}
 
+    def query_key(self):
+        return ("{}AtPointReq".format(self.what), self.file, self.pos, self.digest)
+
 
 class TypeAtPointReq(GenericAtPointReq):
     def __init__(self, file, contents, pos):
@@ -154,13 +218,16 @@ class DocUriAtPointReq(GenericAtPointReq):
 
 # ########################## Refactor Requests ##########################
 class RefactorRequest(RpcRequest):
+    priority = INTERACTIVE
+
     def __init__(self):
         super(RefactorRequest, self).__init__()
 
     def run_in(self, env, async=False):
         call_id = self.send_refactor_request(self.json_repr(), env.client, async)
         if not async:
-            got_response = env.client.get_response(call_id)
+            timeout = getattr(self, 'timeout', DEFAULT_TIMEOUT)
+            got_response = env.client.get_response(call_id, timeout=timeout)
             return got_response
         return True
 
@@ -248,7 +315,11 @@ class InlineLocalRefactorDesc(RefactorRequest):
 
 
 # ########################## Debug Requests ##########################
-class DebugSetBreakReq(RpcRequest):
+class DebugRequest(RpcRequest):
+    priority = INTERACTIVE
+
+
+class DebugSetBreakReq(DebugRequest):
     def __init__(self, file, line, max_results=10):
         super(DebugSetBreakReq, self).__init__()
         self.file = file
@@ -262,7 +333,7 @@ class DebugSetBreakReq(RpcRequest):
                 "file": self.file}
 
 
-class DebugClearAllBreaksReq(RpcRequest):
+class DebugClearAllBreaksReq(DebugRequest):
     def __init__(self):
         super(DebugClearAllBreaksReq, self).__init__()
 
@@ -270,7 +341,7 @@ class DebugClearAllBreaksReq(RpcRequest):
         return {"typehint": "DebugClearAllBreaksReq"}
 
 
-class DebugAttachReq(RpcRequest):
+class DebugAttachReq(DebugRequest):
     def __init__(self, hostname, port):
         super(DebugAttachReq, self).__init__()
         self.hostname = hostname
@@ -282,7 +353,7 @@ class DebugAttachReq(RpcRequest):
                 "port": self.port}
 
 
-class DebugBacktraceReq(RpcRequest):
+class DebugBacktraceReq(DebugRequest):
     def __init__(self, thread_id, index=0, count=100):
         super(DebugBacktraceReq, self).__init__()
         self.thread_id = thread_id
@@ -295,7 +366,7 @@ class DebugBacktraceReq(RpcRequest):
                 "index": self.index, "count": self.count}
 
 
-class SimpleDebugRequest(RpcRequest):
+class SimpleDebugRequest(DebugRequest):
     def __init__(self, thread_id, what):
         super(SimpleDebugRequest, self).__init__()
         self.thread_id = thread_id
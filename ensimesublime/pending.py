@@ -0,0 +1,130 @@
+# coding: utf-8
+
+import threading
+
+from lifecycle import ExpiringTable, DEFAULT_LIFETIME, DEFAULT_MAX_SIZE
+
+
+class PendingResponse(object):
+    """One-shot slot for the reply to a synchronous call.
+
+    The caller blocks in :meth:`wait` while the receiving thread fills the slot
+    with :meth:`set_result`, which wakes the caller immediately.
+    """
+
+    def __init__(self):
+        self._event = threading.Event()
+        self._lock = threading.Lock()
+        self._result = None
+        self._callbacks = []
+        # set by `PendingResponses.register`
+        self.call_id = None
+
+    def set_result(self, result):
+        with self._lock:
+            self._result = result
+            self._event.set()
+            callbacks, self._callbacks = self._callbacks, []
+        for callback in callbacks:
+            callback(self)
+
+    def add_done_callback(self, callback):
+        """Call ``callback(self)`` once the result is set, on the receiving
+        thread, or right away if it already is."""
+        with self._lock:
+            if not self._event.is_set():
+                self._callbacks.append(callback)
+                return
+        callback(self)
+
+    def done(self):
+        return self._event.is_set()
+
+    def wait(self, timeout=None):
+        """Block until the result arrives. Returns True if it did in time."""
+        return self._event.wait(timeout)
+
+    def result(self):
+        return self._result
+
+
+class PendingResponses(object):
+    """Registry of synchronous calls waiting for a reply, keyed by ``callId``.
+
+    A call must be registered before its request is sent so that a fast reply
+    can never arrive ahead of its waiter. Replies for calls nobody is waiting
+    for (e.g. the caller already timed out) are rejected by :meth:`resolve`
+    rather than kept around; a waiter forgets its call once :meth:`wait`
+    returns. Calls no one waits for, e.g. submitted without ever getting a
+    reply, expire after ``lifetime`` seconds. Calls being waited for don't,
+    whatever the timeout of their waiter.
+    """
+
+    def __init__(self, lifetime=DEFAULT_LIFETIME, max_size=DEFAULT_MAX_SIZE):
+        self._lock = threading.Lock()
+        self._pending = ExpiringTable(lifetime, max_size)
+        # call id -> PendingResponse, of the calls in `wait`
+        self._waiting = {}
+
+    def register(self, call_id, pending=None):
+        """Wait for the reply to ``call_id`` with `pending`, a new
+        `PendingResponse` if None."""
+        pending = PendingResponse() if pending is None else pending
+        pending.call_id = call_id
+        self._pending[call_id] = pending
+        return pending
+
+    def get(self, call_id):
+        with self._lock:
+            pending = self._waiting.get(call_id)
+            return self._pending.get(call_id) if pending is None else pending
+
+    def resolve(self, call_id, result):
+        """Hand ``result`` to the waiter of ``call_id``.
+
+        Returns:
+            bool: False if no one is waiting for that call.
+        """
+        pending = self.get(call_id)
+        if pending is None:
+            return False
+        pending.set_result(result)
+        return True
+
+    def wait(self, call_id, timeout):
+        """Wait up to ``timeout`` seconds for the reply to ``call_id``.
+
+        Returns:
+            The reply, or None if it didn't arrive in time or the call was
+            never registered.
+        """
+        with self._lock:
+            pending = self._pending.pop(call_id)
+            if pending is None:
+                return None
+            self._waiting[call_id] = pending
+        try:
+            pending.wait(timeout)
+        finally:
+            with self._lock:
+                self._waiting.pop(call_id, None)
+        # checked after forgetting the call, the reply may have raced with the timeout
+        return pending.result() if pending.done() else None
+
+    def discard(self, call_id):
+        with self._lock:
+            self._waiting.pop(call_id, None)
+            self._pending.pop(call_id)
+
+    def stats(self):
+        stats = self._pending.stats()
+        with self._lock:
+            stats["waiting"] = len(self._waiting)
+        return stats
+
+    def __contains__(self, call_id):
+        return self.get(call_id) is not None
+
+    def __len__(self):
+        with self._lock:
+            return len(self._pending) + len(self._waiting)
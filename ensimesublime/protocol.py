@@ -7,7 +7,7 @@ from functools import partial as bind
 
 from util import catch, Pretty
 from notes import Note
-from outgoing import AddImportRefactorDesc, TypeCheckFilesReq
+from outgoing import AddImportRefactorDesc
 from patch import fromfile
 from config import feedback, gconfig
 from symbol_format import completion_to_suggest, type_to_show
@@ -91,10 +91,7 @@ consequently the context menu commands may take longer to get enabled. You may c
     def handle_analyzer_ready(self, call_id, payload):
         self.analyzer_ready = True  # used to enable commands that depend on analyzer
         self.env.logger.info("Analyzer is ready.")
-        files = []
-        for view in self.env.window.views():
-            files.append(view.file_name())
-        TypeCheckFilesReq(files).run_in(self.env, async=True)
+        self.typechecks.request([view.file_name() for view in self.env.window.views()])
 
     def handle_scala_notes(self, call_id, payload):
         self.env.notes_storage.append(map(Note, payload['notes']))
@@ -103,11 +100,16 @@ consequently the context menu commands may take longer to get enabled. You may c
         pass
 
     def handle_clear_scala_notes(self, call_id, payload):
-        self.env.notes_storage.clear()
+        # notes are replaced file by file as new ones arrive
+        self.env.notes_storage.begin_round()
 
     def handle_typecheck_complete(self, call_id, payload):
-        self.env.editor.redraw_all_highlights()
-        self.env.logger.info("Handled FullTypecheckCompleteEvent. Redrawing highlights.")
+        self.typechecks.completed()
+        self.env.notes_storage.end_round()
+        self.env.notes_storage.save_snapshot()
+        self.env.editor.redraw_changed_highlights()
+        self.env.logger.info("Handled FullTypecheckCompleteEvent. Redrawing changed highlights. "
+                             "Typecheck stats: %s", self.typechecks.stats())
 
     def handle_debug_vm_error(self, call_id, payload):
         raise NotImplementedError()
@@ -123,9 +125,16 @@ consequently the context menu commands may take longer to get enabled. You may c
             self.env.error_message('No import suggestions found.')
             return
 
+        # the options of the call are gone by the time a choice is made
+        file_name = (self.call_options.get(call_id) or {}).get('file_name')
+        if file_name is None:
+            # expired or cancelled meanwhile
+            self.env.logger.warning('No file for the import suggestions of call %s', call_id)
+            self.env.error_message('Import suggestions arrived too late, please try again.')
+            return
+
         def do_refactor(choice):
             if choice > -1:
-                file_name = self.call_options[call_id].get('file_name')
                 # request is async, file is reverted when patch is received and applied
                 AddImportRefactorDesc(file_name, imports[choice]).run_in(self.env, async=True)
 
@@ -187,7 +196,6 @@ consequently the context menu commands may take longer to get enabled. You may c
         options = self.call_options.get(call_id)
         if options and options.get('browse'):
             sublime.set_timeout(bind(self._browse_doc, self.env, url), 0)
-            del self.call_options[call_id]
         else:
             pass
             # TODO: make this return value of a Vim function synchronously, how?
@@ -205,6 +213,7 @@ consequently the context menu commands may take longer to get enabled. You may c
     def handle_completion_info_list(self, call_id, payload):
         """Handler for a completion response."""
         prefix = payload.get("prefix")
+        options = self.call_options.get(call_id)
         if (self.env.editor.current_prefix and
                 self.env.editor.current_prefix == prefix):
 
@@ -214,6 +223,7 @@ consequently the context menu commands may take longer to get enabled. You may c
                     sublime.active_window().run_command("hide_auto_complete")
                     completions = [c for c in payload["completions"] if "typeInfo" in c]
                     self.env.editor.suggestions = [completion_to_suggest(c) for c in completions]
+                    self._cache_completions(options, payload, completions)
 
                     def hack2():
                         sublime.active_window().active_view().run_command("auto_complete")
@@ -226,8 +236,19 @@ consequently the context menu commands may take longer to get enabled. You may c
             # filter out completions without `typeInfo` field to avoid server bug. See #324
             completions = [c for c in payload["completions"] if "typeInfo" in c]
             self.env.editor.suggestions = [completion_to_suggest(c) for c in completions]
-            self.env.logger.debug('handle_completion_info_list: {}'
-                                  .format(Pretty(self.env.editor.suggestions)))
+            self._cache_completions(options, payload, completions)
+            self.env.logger.debug('handle_completion_info_list: %s', Pretty(self.env.editor.suggestions))
+
+    def _cache_completions(self, options, payload, completions):
+        """Keep the suggestions just received for narrowing them while typing.
+
+        ``options`` are those of the call, read when the response arrived."""
+        if options and options.get('cache_key'):
+            self.env.editor.completion_cache.store(
+                options['cache_key'],
+                payload.get("prefix"),
+                zip([c["name"] for c in completions], self.env.editor.suggestions),
+                complete=len(payload["completions"]) < options['max_results'])
 
     def apply_refactor(self, call_id, payload):
         supported_refactorings = ["AddImport", "OrganizeImports", "Rename", "InlineLocal"]
@@ -239,9 +260,10 @@ consequently the context menu commands may take longer to get enabled. You may c
                                     .format(diff_file))
             return
         result = patch_set.apply(0, "/")
+        file = self.refactorings.pop(payload['procedureId'])
         if result:
-            file = self.refactorings[payload['procedureId']]
-            sublime.set_timeout(bind(self.env.editor.reload_file, file), 0)
+            if file is not None:
+                sublime.set_timeout(bind(self.env.editor.reload_file, file), 0)
             self.env.logger.info("Refactoring succeeded, patch file: {}"
                                  .format(diff_file))
             self.env.status_message("Refactoring succeeded")
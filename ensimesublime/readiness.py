@@ -0,0 +1,184 @@
+# coding: utf-8
+
+import ctypes
+import ctypes.util
+import os
+import re
+import select
+import struct
+import time
+
+from launcher import port_open
+
+# logged by the server as it starts listening
+STARTED_MARKER = re.compile(r"ENSIME HTTP on|[Ss]erver started")
+# delays between checks while nothing is watching the cache dir
+FIRST_DELAY = 0.01
+MAX_DELAY = 0.5
+
+# the files telling the server's ports, see `launcher.SERVER_FILES`
+PORT_FILES = (b"http", b"port")
+
+# inotify(7)
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+# struct inotify_event, followed by `len` bytes of name
+EVENT_HEADER = struct.Struct("iIII")
+
+
+class Backoff(object):
+    """Sleeps twice as long at each call, from `first` up to `maximum`."""
+
+    def __init__(self, first=FIRST_DELAY, maximum=MAX_DELAY):
+        self.delay = first
+        self.maximum = maximum
+
+    def next(self):
+        delay = self.delay
+        self.delay = min(self.delay * 2, self.maximum)
+        return delay
+
+    def wait(self, timeout):
+        time.sleep(max(0, min(self.next(), timeout)))
+
+
+def event_names(data):
+    """The names of the files in the inotify events read as `data`."""
+    names, offset = [], 0
+    while offset + EVENT_HEADER.size <= len(data):
+        _, _, _, length = EVENT_HEADER.unpack_from(data, offset)
+        offset += EVENT_HEADER.size
+        names.append(data[offset:offset + length].rstrip(b"\0"))
+        offset += length
+    return names
+
+
+class InotifyWatcher(object):
+    """Wakes up as soon as a port file of `directory` is written or moved in.
+
+    The logs written all along the start of the server don't wake it up.
+
+    Raises:
+        OSError: If inotify isn't available, e.g. not on Linux.
+    """
+
+    def __init__(self, directory):
+        libc_name = ctypes.util.find_library("c")
+        if os.name != "posix" or not libc_name:
+            raise OSError("inotify is not available")
+        libc = ctypes.CDLL(libc_name, use_errno=True)
+        if not hasattr(libc, "inotify_init1"):
+            raise OSError("inotify is not available")
+        self.fd = libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        mask = IN_CREATE | IN_CLOSE_WRITE | IN_MOVED_TO
+        if libc.inotify_add_watch(self.fd, directory.encode("utf-8"), mask) < 0:
+            errno = ctypes.get_errno()
+            os.close(self.fd)
+            raise OSError(errno, "inotify_add_watch failed", directory)
+        # changes may go unnoticed in the meantime, e.g. a port file written
+        # before the server listens: look again now and then
+        self.backoff = Backoff()
+
+    def wait(self, timeout):
+        """Block until a port file changes, or for at most `timeout` seconds."""
+        deadline = time.time() + max(0, min(self.backoff.next(), timeout))
+        while True:
+            readable, _, _ = select.select([self.fd], [], [], max(0, deadline - time.time()))
+            if not readable:
+                return
+            if any(name in PORT_FILES for name in event_names(os.read(self.fd, 64 * 1024))):
+                return
+
+    def close(self):
+        if self.fd is not None:
+            os.close(self.fd)
+            self.fd = None
+
+
+class PollingWatcher(object):
+    """Stand-in for `InotifyWatcher` checking with an exponential backoff."""
+
+    def __init__(self, directory):
+        self.backoff = Backoff()
+
+    def wait(self, timeout):
+        self.backoff.wait(timeout)
+
+    def close(self):
+        pass
+
+
+def watcher_for(directory):
+    """An `InotifyWatcher` where available, else a `PollingWatcher`."""
+    try:
+        return InotifyWatcher(directory)
+    except (OSError, AttributeError):
+        return PollingWatcher(directory)
+
+
+class LogTail(object):
+    """Reads what was appended to a log since the last call."""
+
+    def __init__(self, path):
+        self.path = path
+        self._offset = 0
+        self._partial = ""
+
+    def lines(self):
+        try:
+            with open(self.path, "rb") as f:
+                f.seek(self._offset)
+                data = f.read()
+        except (IOError, OSError):
+            return []
+        if not data:
+            return []
+        self._offset += len(data)
+        text = self._partial + data.decode("utf-8", "replace")
+        lines = text.split("\n")
+        self._partial = lines.pop()
+        return lines
+
+
+def wait_until_ready(process, timeout, watcher=None):
+    """Wait for the server of `process` to accept connections.
+
+    Rather than every second, the port is probed whenever a file of the cache
+    dir changes, e.g. the port file (``http``) is written, with an
+    exponential backoff in between. Once the server logs `STARTED_MARKER` to
+    ``server.log`` it's about to listen, so the backoff starts over.
+
+    Args:
+        process (launcher.EnsimeProcess): The server starting.
+        timeout (float): Seconds to wait at most.
+
+    Returns:
+        int: The port the server listens on, or None if it didn't come up in
+        time or stopped.
+    """
+    deadline = time.time() + timeout
+    watcher = watcher or watcher_for(process.cache_dir)
+    log = LogTail(os.path.join(process.cache_dir, "server.log"))
+    try:
+        while process.is_running():
+            try:
+                port = process.http_port()
+            except (IOError, OSError, ValueError):
+                port = None
+            if port is not None and port_open(port):
+                return port
+            if any(STARTED_MARKER.search(line) for line in log.lines()):
+                watcher.backoff = Backoff()
+            remaining = deadline - time.time()
+            if remaining <= 0:
+                break
+            watcher.wait(remaining)
+        return None
+    finally:
+        watcher.close()
+
@@ -0,0 +1,68 @@
+# coding: utf-8
+
+import threading
+import time
+
+FORMAT_VERSION = 1
+# directions of messages
+OUTGOING = ">"
+INCOMING = "<"
+
+
+class SessionRecorder(object):
+    """Appends the messages exchanged with the server to a log file.
+
+    Each line is ``<seconds> <direction> <message>``: the monotonic time
+    since the recorder started, `OUTGOING` or `INCOMING`, and the message on
+    a single line. Every session starts with a header line beginning with
+    ``#``. See `read_session` for reading them back.
+
+    Args:
+        path (str): The log file, created if needed and only ever appended to.
+    """
+
+    def __init__(self, path, clock=time.monotonic):
+        self.path = path
+        self._clock = clock
+        self._start = clock()
+        self._lock = threading.Lock()
+        self._file = open(path, "a", encoding="utf-8")
+        self._file.write("# ensime-session {} {}\n".format(
+            FORMAT_VERSION, time.strftime("%Y-%m-%dT%H:%M:%S")))
+
+    def outgoing(self, message):
+        self._write(OUTGOING, message)
+
+    def incoming(self, message):
+        self._write(INCOMING, message)
+
+    def _write(self, direction, message):
+        # JSON allows no line breaks but between tokens, where they're blanks
+        line = "{:.6f} {} {}\n".format(self._clock() - self._start, direction,
+                                       message.strip().replace("\n", " ").replace("\r", " "))
+        with self._lock:
+            if self._file is not None:
+                self._file.write(line)
+
+    def close(self):
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+
+def read_session(path):
+    """Messages recorded by `SessionRecorder` in ``path``.
+
+    Yields:
+        tuple: ``(session, seconds, direction, message)``, where ``session``
+        counts the sessions of the log from 0.
+    """
+    session = -1
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            if line.startswith("#"):
+                session += 1
+                continue
+            seconds, direction, message = line.rstrip("\n").split(" ", 2)
+            yield max(session, 0), float(seconds), direction, message
@@ -0,0 +1,190 @@
+# coding: utf-8
+
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from util import catch
+
+
+def canonical_dotensime(config):
+    """The canonical path of the ``.ensime`` of a project configuration."""
+    filepath = getattr(config, "filepath", None)
+    if filepath is None:
+        filepath = os.path.join(config["root-dir"], ".ensime")
+    return os.path.normcase(os.path.realpath(filepath))
+
+
+class ServerEntry(object):
+    """A server and the clients using it, keyed by an arbitrary object to a
+    label shown to the user, e.g. the window of the client."""
+
+    def __init__(self, key, process):
+        self.key = key
+        self.process = process
+        self.users = OrderedDict()
+        self.started = time.time()
+        self.idle_since = None
+        self.idle_timer = None
+
+
+class ServerRegistry(object):
+    """The ENSIME servers of the projects, shared by the clients of all windows.
+
+    A server is started for a project by its first client, see `acquire`, and
+    reference counted from then on. Once the last client `release`s it, it's
+    stopped after an idle period, unless a new client acquires it meanwhile.
+    """
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._entries = {}
+        # key -> threading.Event set once the server being started is, or isn't
+        self._starting = {}
+
+    def acquire(self, key, user, label, start):
+        """Use the server of the project `key`, calling `start` to get one
+        if none is running.
+
+        `start` is called without holding the registry, so that other
+        projects can be used meanwhile. Clients of the same project wait for
+        it, and call their own `start` if it failed.
+
+        Args:
+            user: Anything identifying the client, e.g. itself.
+            label (str): Describes the client in `report`.
+            start (callable): Returns a new `launcher.EnsimeProcess`, or None.
+
+        Returns:
+            tuple: The `launcher.EnsimeProcess`, or None if `start` failed, and
+            whether other clients were using it already.
+        """
+        while True:
+            with self._lock:
+                entry = self._entries.get(key)
+                if entry is not None and not entry.process.is_running():
+                    self._remove(entry)
+                    entry = None
+                if entry is not None:
+                    return self._use(entry, user, label), True
+                starting = self._starting.get(key)
+                if starting is None:
+                    starting = self._starting[key] = threading.Event()
+                    break
+            # started by another client, see how that went
+            starting.wait()
+
+        # outside the lock, launching a server takes a while
+        process = None
+        try:
+            process = start()
+        finally:
+            with self._lock:
+                del self._starting[key]
+                if process is not None:
+                    entry = self._entries[key] = ServerEntry(key, process)
+                    self._use(entry, user, label)
+            starting.set()
+        return process, False
+
+    def _use(self, entry, user, label):
+        if entry.idle_timer is not None:
+            entry.idle_timer.cancel()
+            entry.idle_timer = None
+        entry.idle_since = None
+        entry.users[user] = label
+        return entry.process
+
+    def release(self, key, user, idle_timeout=0):
+        """Stop using the server of `key`. Once unused, it's stopped after
+        `idle_timeout` seconds, right away if 0.
+
+        Returns:
+            int: The number of clients still using the server.
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or user not in entry.users:
+                return 0
+            del entry.users[user]
+            if entry.users:
+                return len(entry.users)
+            entry.idle_since = time.time()
+            if idle_timeout > 0:
+                entry.idle_timer = threading.Timer(idle_timeout, self._stop_if_idle, args=(entry,))
+                entry.idle_timer.daemon = True
+                entry.idle_timer.start()
+            else:
+                self._stop(entry)
+            return 0
+
+    def discard(self, key, process, stop=True):
+        """Stop `process`, the server of `key`, whoever uses it, e.g. after it
+        stopped answering. With `stop` False it's only forgotten, for a
+        process that might not be the server after all."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry.process is process:
+                self._remove(entry)
+        if stop:
+            with catch(Exception):
+                process.stop()
+
+    def _stop_if_idle(self, entry):
+        with self._lock:
+            if self._entries.get(entry.key) is entry and not entry.users:
+                self._stop(entry)
+
+    def _stop(self, entry):
+        self._remove(entry)
+        with catch(Exception):
+            entry.process.stop()
+
+    def _remove(self, entry):
+        if entry.idle_timer is not None:
+            entry.idle_timer.cancel()
+            entry.idle_timer = None
+        if self._entries.get(entry.key) is entry:
+            del self._entries[entry.key]
+
+    def servers(self):
+        """The servers, as dicts of the project ``key``, the ``pid`` and the
+        ``port`` of the server, its ``users`` labels and ``idle`` seconds."""
+        now = time.time()
+        with self._lock:
+            entries = sorted(self._entries.values(), key=lambda entry: entry.key)
+            result = []
+            for entry in entries:
+                port = None
+                with catch((IOError, OSError, ValueError)):
+                    port = entry.process.http_port()
+                process = getattr(entry.process, "process", None)
+                result.append({
+                    "key": entry.key,
+                    "pid": getattr(entry.process, "pid", None) or getattr(process, "pid", None),
+                    "port": port,
+                    "users": list(entry.users.values()),
+                    "uptime": now - entry.started,
+                    "idle": None if entry.idle_since is None else now - entry.idle_since,
+                })
+            return result
+
+    def report(self):
+        """A plain text table of `servers`, for the user."""
+        servers = self.servers()
+        if not servers:
+            return "No ENSIME server running."
+        lines = []
+        for server in servers:
+            lines.append("{}\n    pid {}, port {}, up {:.0f}s".format(
+                server["key"], server["pid"] or "unknown", server["port"], server["uptime"]))
+            if server["users"]:
+                lines.extend("    used by {}".format(user) for user in server["users"])
+            else:
+                lines.append("    idle for {:.0f}s".format(server["idle"]))
+        return "\n".join(lines)
+
+
+# servers of all the projects, for all windows
+servers = ServerRegistry()
@@ -0,0 +1,192 @@
+# coding: utf-8
+
+import threading
+import time
+from collections import deque, OrderedDict
+
+from lifecycle import ExpiringTable, DEFAULT_LIFETIME, DEFAULT_MAX_SIZE
+
+# Priority classes of outgoing requests, most urgent first.
+INTERACTIVE = "interactive"
+BACKGROUND = "background"
+BULK = "bulk"
+PRIORITIES = (INTERACTIVE, BACKGROUND, BULK)
+
+DEFAULT_MAX_IN_FLIGHT = {INTERACTIVE: 8, BACKGROUND: 4, BULK: 1}
+# In-flight requests without a reply for that long stop holding their slot.
+STALE_AFTER = 30
+
+
+class RequestScheduler(object):
+    """Orders outgoing requests by priority class.
+
+    Each class may only have a bounded number of requests in flight, that is
+    sent but not yet answered. Requests beyond that wait in a per-class queue,
+    and whenever a slot frees up the most urgent queued request goes first, so
+    a burst of bulk work never sits in front of interactive requests.
+
+    Args:
+        send (callable): Sends a serialized message to the server.
+        max_in_flight (dict): Overrides of `DEFAULT_MAX_IN_FLIGHT`.
+        on_send (callable): Called with the ``callId`` of each request right
+            before it's sent, as its reply may be handled before `send`
+            returns.
+    """
+
+    def __init__(self, send, max_in_flight=None, on_send=None):
+        self._send = send
+        self._on_send = on_send
+        self._limits = dict(DEFAULT_MAX_IN_FLIGHT)
+        self._limits.update(max_in_flight or {})
+        self._queues = dict((priority, deque()) for priority in PRIORITIES)
+        # in sending order, so the stale ones are first
+        self._in_flight = OrderedDict()
+        self._counts = dict((priority, 0) for priority in PRIORITIES)
+        self._lock = threading.Lock()
+
+    def submit(self, call_id, priority, message):
+        """Queue ``message`` for sending and send what the limits allow."""
+        if priority not in self._queues:
+            priority = BACKGROUND
+        with self._lock:
+            self._queues[priority].append((call_id, message))
+            ready = self._pump()
+        self._send_all(ready)
+
+    def complete(self, call_id):
+        """Mark ``call_id`` as answered, freeing its slot."""
+        with self._lock:
+            sent = self._in_flight.pop(call_id, None)
+            if sent is None:
+                return
+            self._counts[sent[0]] -= 1
+            ready = self._pump()
+        self._send_all(ready)
+
+    def cancel(self, call_id):
+        """Drop ``call_id`` if it hasn't been sent yet.
+
+        Returns:
+            bool: True if the request was still queued.
+        """
+        with self._lock:
+            for queue in self._queues.values():
+                for entry in queue:
+                    if entry[0] == call_id:
+                        queue.remove(entry)
+                        return True
+        return False
+
+    def in_flight(self, priority):
+        with self._lock:
+            return self._counts[priority]
+
+    def queued(self, priority):
+        with self._lock:
+            return len(self._queues[priority])
+
+    def clear(self):
+        """Forget queued and in-flight requests, e.g. after a disconnection."""
+        with self._lock:
+            for queue in self._queues.values():
+                queue.clear()
+            self._in_flight.clear()
+            self._counts = dict((priority, 0) for priority in PRIORITIES)
+
+    def _expire(self, now):
+        while self._in_flight:
+            call_id = next(iter(self._in_flight))
+            priority, sent = self._in_flight[call_id]
+            if now - sent <= STALE_AFTER:
+                break
+            del self._in_flight[call_id]
+            self._counts[priority] -= 1
+
+    def _send_all(self, ready):
+        # outside the lock: sending may block, or even reconnect and wait
+        # for the reply of a new request
+        for call_id, message in ready:
+            if self._on_send is not None:
+                self._on_send(call_id)
+            self._send(message)
+
+    def _pump(self):
+        """Take the requests that may be sent now, most urgent first."""
+        ready = []
+        now = time.time()
+        self._expire(now)
+        for priority in PRIORITIES:
+            queue = self._queues[priority]
+            while queue and self._counts[priority] < self._limits[priority]:
+                call_id, message = queue.popleft()
+                self._in_flight[call_id] = (priority, now)
+                self._counts[priority] += 1
+                ready.append((call_id, message))
+        return ready
+
+
+class QueryTracker(object):
+    """Collapses identical queries in flight and spots superseded ones.
+
+    Queries are identified by a key whose first element names their slot
+    (e.g. the typehint): only the latest query of a slot is relevant, so
+    starting a new one supersedes the previous one, whose reply should then be
+    dropped. A query identical to the latest one of its slot, while that one
+    is still unanswered, can reuse its ``callId`` instead of being sent.
+
+    Queries whose reply never comes expire after ``lifetime`` seconds, like
+    the other per-call state of the client.
+    """
+
+    def __init__(self, lifetime=DEFAULT_LIFETIME, max_size=DEFAULT_MAX_SIZE, clock=time.time):
+        self._lock = threading.Lock()
+        self._by_key = ExpiringTable(lifetime, max_size, clock)
+        self._keys = ExpiringTable(lifetime, max_size, clock)
+        # one per slot, expired calls are dropped as they're superseded
+        self._latest = {}
+        self._superseded = ExpiringTable(lifetime, max_size, clock)
+
+    def coalesce(self, key):
+        """The ``callId`` of the unanswered query identical to ``key``, if any."""
+        with self._lock:
+            return self._by_key.get(key)
+
+    def start(self, call_id, key):
+        """Track a new query.
+
+        Returns:
+            The ``callId`` of the query it supersedes, or None.
+        """
+        slot = key[0]
+        with self._lock:
+            previous = self._latest.get(slot)
+            previous_key = None if previous is None else self._keys.get(previous)
+            if previous_key is None:
+                # answered or expired
+                previous = None
+            else:
+                self._superseded[previous] = True
+                if self._by_key.get(previous_key) == previous:
+                    self._by_key.pop(previous_key)
+            self._latest[slot] = call_id
+            self._by_key[key] = call_id
+            self._keys[call_id] = key
+        return previous
+
+    def finish(self, call_id):
+        """Stop tracking ``call_id``, answered or never sent.
+
+        Returns:
+            bool: True if the query was superseded and its reply is stale.
+        """
+        with self._lock:
+            key = self._keys.pop(call_id)
+            if key is not None and self._by_key.get(key) == call_id:
+                self._by_key.pop(key)
+            if key is not None and self._latest.get(key[0]) == call_id:
+                del self._latest[key[0]]
+            return self._superseded.pop(call_id, False)
+
+    def __len__(self):
+        with self._lock:
+            return len(self._keys)
@@ -0,0 +1,155 @@
+# coding: utf-8
+
+import re
+
+import sexpdata
+
+_WHITESPACE = " \t\n\r\x0b\x0c"
+_TOKENS = re.compile(r"""[{ws}]*(?:
+      (\((?:[{ws}]*"[^"\\]*")+[{ws}]*\))            # list of plain strings
+    | (\()                                          # open
+    | (\))                                          # close
+    | ("[^"\\]*(?:\\.[^"\\]*)*")                    # string, with its quotes
+    | ([^{ws}()\[\]"'\\;][^{ws}()\[\]"'\\]*)        # atom
+    | (;[^\n]*)                                     # comment
+    | ([^{ws}])                                     # anything else
+)""".format(ws=_WHITESPACE), re.VERBOSE | re.DOTALL)
+_PLAIN_STRING = re.compile(r'"([^"]*)"')
+_ESCAPE = re.compile(r"\\.", re.DOTALL)
+
+# what the list being read becomes, see `loads`
+_DOCUMENT = 0
+_DICT = 1
+_PENDING = 2
+_DICTS = 3
+_RAW = 4
+
+_NO_KEY = object()
+
+
+class Unsupported(ValueError):
+    """The text is not an ``.ensime`` this parser reads, e.g. it's broken or
+    has quotes or square brackets. `sexpdata` tells what's wrong with it."""
+
+
+def _unescape(match):
+    return sexpdata.String.unquote(match.group())
+
+
+def _atom(token):
+    """Like `sexpdata.Parser.atom`."""
+    if token == "nil":
+        return []
+    if token == "t":
+        return True
+    try:
+        return int(token)
+    except ValueError:
+        try:
+            return float(token)
+        except ValueError:
+            return sexpdata.Symbol(token)
+
+
+def _key(value):
+    value = value.value() if isinstance(value, sexpdata.Symbol) else value
+    return str(value).lstrip(":")
+
+
+def loads(text):
+    """Parse the contents of an ``.ensime`` file to a dict, the same as
+    `config.ProjectConfig.parse_string` but in a single pass.
+
+    The tokens come from one regular expression and the nested lists are
+    kept on a stack rather than parsed recursively. Each list is built into
+    what the config holds for it as soon as its first element is read: a
+    dict if a keyword, a list of dicts if a list, else a list of values.
+    Lists of strings without escapes, e.g. classpaths, are a single token.
+
+    Raises:
+        Unsupported: If `text` needs `sexpdata`.
+    """
+    stack = []
+    kind, container, key = _DOCUMENT, None, _NO_KEY
+    result = None
+    for strings, opening, closing, string, atom, comment, other in _TOKENS.findall(text):
+        if strings:
+            # most of the file: source roots and classpaths
+            if kind == _DICT and key is not _NO_KEY:
+                container[key] = _PLAIN_STRING.findall(strings)
+                key = _NO_KEY
+            elif kind == _RAW:
+                container.append(_PLAIN_STRING.findall(strings))
+            else:
+                raise Unsupported("unexpected list of strings")
+
+        elif string or atom:
+            if string:
+                value = string[1:-1]
+                if "\\" in value:
+                    value = _ESCAPE.sub(_unescape, value)
+            elif atom[0] == ":":
+                if kind == _DICT and key is _NO_KEY:
+                    key = atom.lstrip(":")
+                    continue
+                value = sexpdata.Symbol(atom)
+            else:
+                value = _atom(atom)
+
+            if kind == _DICT:
+                if key is _NO_KEY:
+                    key = _key(value)
+                else:
+                    container[key] = value
+                    key = _NO_KEY
+            elif kind == _RAW:
+                container.append(value)
+            elif kind == _PENDING:
+                if isinstance(value, sexpdata.Symbol):
+                    kind, container, key = _DICT, {}, _key(value)
+                elif isinstance(value, list):
+                    raise Unsupported("nil first in a list")
+                else:
+                    kind, container = _RAW, [value]
+            else:
+                raise Unsupported("unexpected {!r}".format(string or atom))
+
+        elif opening:
+            if kind == _DICT:
+                if key is _NO_KEY:
+                    raise Unsupported("list as a key")
+                child = _PENDING, None
+            elif kind == _RAW:
+                child = _RAW, []
+            elif kind == _DICTS:
+                child = _DICT, {}
+            elif kind == _PENDING:
+                kind, container = _DICTS, []
+                child = _DICT, {}
+            elif result is None:
+                child = _DICT, {}
+            else:
+                raise Unsupported("more than one expression")
+            stack.append((kind, container, key))
+            kind, container = child
+            key = _NO_KEY
+
+        elif closing:
+            if not stack:
+                raise Unsupported("unexpected closing bracket")
+            value = [] if kind == _PENDING else container
+            kind, container, key = stack.pop()
+            if kind == _DICT:
+                container[key] = value
+                key = _NO_KEY
+            elif kind == _RAW or kind == _DICTS:
+                container.append(value)
+            else:
+                result = value
+
+        elif not comment:
+            raise Unsupported("unexpected {!r}".format(other))
+
+    if stack or result is None:
+        raise Unsupported("missing closing bracket")
+    return result
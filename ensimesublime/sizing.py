@@ -0,0 +1,104 @@
+# coding: utf-8
+
+import os
+import re
+from collections import namedtuple
+
+# Heap, stack and garbage collector of the server by project size. The first
+# tier whose limits the project fits in applies, a tier without limits fits
+# every project. Overridden by the ``jvm_sizing`` setting.
+DEFAULT_TIERS = [
+    {"max_source_roots": 20, "max_jars": 150, "max_jar_mb": 200,
+     "flags": ["-Xmx1g", "-Xss2m", "-XX:+UseParallelGC"]},
+    {"max_source_roots": 200, "max_jars": 600, "max_jar_mb": 1000,
+     "flags": ["-Xmx3g", "-Xss4m", "-XX:+UseG1GC"]},
+    {"flags": ["-Xmx6g", "-Xss8m", "-XX:+UseG1GC", "-XX:+UseStringDeduplication"]},
+]
+
+ProjectSize = namedtuple("ProjectSize", "modules source_roots jars jar_bytes")
+
+_LIMITS = (("max_source_roots", "source_roots", 1),
+           ("max_jars", "jars", 1),
+           ("max_jar_mb", "jar_bytes", 1024 * 1024))
+_COLLECTOR = re.compile(r"^-XX:\+Use\w*GC$")
+_XX = re.compile(r"^-XX:[+-]?(\w+)")
+
+
+def measure(config):
+    """Estimate the size of a project from its ``.ensime`` configuration.
+
+    Both the ``:projects`` of recent ``.ensime`` files and the
+    ``:subprojects`` of older ones are counted.
+
+    Returns:
+        ProjectSize: The number of modules, of source roots, of jars on the
+        classpaths of the modules and of the compiler, and their total size.
+    """
+    modules = config.get("projects") or config.get("subprojects") or []
+    roots = set()
+    jars = set(config.get("scala-compiler-jars") or [])
+    for module in modules:
+        roots.update(module.get("sources") or module.get("source-roots") or [])
+        for key in ("library-jars", "compile-deps", "runtime-deps", "test-deps"):
+            jars.update(path for path in module.get(key) or [] if path.endswith(".jar"))
+    jar_bytes = 0
+    for jar in jars:
+        try:
+            jar_bytes += os.path.getsize(jar)
+        except OSError:
+            pass
+    return ProjectSize(len(modules), len(roots), len(jars), jar_bytes)
+
+
+def choose_tier(size, tiers):
+    """The first of `tiers` that `size` fits in, or None."""
+    for tier in tiers:
+        if all(getattr(size, field) <= tier[limit] * unit
+               for limit, field, unit in _LIMITS if tier.get(limit) is not None):
+            return tier
+    return None
+
+
+def _flag_key(flag):
+    """What a flag sets, flags with the same key override one another."""
+    if _COLLECTOR.match(flag):
+        return "collector"
+    xx = _XX.match(flag)
+    if xx:
+        return xx.group(1)
+    for prefix in ("-Xmx", "-Xms", "-Xss", "-Xmn"):
+        if flag.startswith(prefix):
+            return prefix
+    return flag
+
+
+def merge_flags(policy, user):
+    """The `policy` flags that `user` flags don't set, followed by the user's."""
+    user = [flag for flag in user if flag]
+    taken = set(_flag_key(flag) for flag in user)
+    return [flag for flag in policy if _flag_key(flag) not in taken] + user
+
+
+def jvm_flags(config, tiers=None):
+    """The flags to run the server of `config` with.
+
+    Args:
+        tiers (list of dict): See `DEFAULT_TIERS`, no sizing if empty.
+
+    Returns:
+        tuple: The flags, and a description of the decision for the logs.
+    """
+    user = config.get("java-flags") or []
+    tiers = DEFAULT_TIERS if tiers is None else tiers
+    if not tiers:
+        return merge_flags([], user), "JVM sizing disabled, java-flags {}".format(user)
+    size = measure(config)
+    tier = choose_tier(size, tiers)
+    policy = tier["flags"] if tier else []
+    flags = merge_flags(policy, user)
+    overridden = [flag for flag in policy if flag not in flags]
+    description = ("JVM sizing for {} modules, {} source roots, {} jars ({:.0f}MB): {}{}".format(
+        size.modules, size.source_roots, size.jars, size.jar_bytes / 1024.0 / 1024,
+        " ".join(policy) or "no tier",
+        " ({} overridden by java-flags)".format(" ".join(overridden)) if overridden else ""))
+    return flags, description
@@ -0,0 +1,114 @@
+# coding: utf-8
+
+import select
+import socket
+import threading
+import traceback
+
+# Engines for receiving messages from ENSIME servers, see `transport_engine`
+# in Ensime.sublime-settings.
+THREADS_ENGINE = "threads"
+SHARED_ENGINE = "shared"
+
+
+def _socketpair():
+    """Connected pair of sockets, on platforms lacking ``socket.socketpair``."""
+    if hasattr(socket, "socketpair"):
+        return socket.socketpair()
+    listener = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    try:
+        listener.bind(("127.0.0.1", 0))
+        listener.listen(1)
+        writer = socket.create_connection(listener.getsockname())
+        reader, _ = listener.accept()
+    finally:
+        listener.close()
+    return reader, writer
+
+
+class SharedLoop(object):
+    """A single thread receiving messages for every registered websocket.
+
+    Sockets are multiplexed with ``select``; when one becomes readable its
+    callback is invoked with the websocket on the loop thread, and is expected
+    to read one message and handle its own errors. The thread is started on
+    first registration and sleeps in ``select`` while nothing is readable.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._readers = {}
+        self._thread = None
+        self._wakeup_r, self._wakeup_w = _socketpair()
+        self._wakeup_r.setblocking(False)
+
+    def register(self, ws, callback):
+        with self._lock:
+            self._readers[ws] = callback
+            if self._thread is None:
+                self._thread = threading.Thread(name='ensime-shared-loop', target=self._run)
+                self._thread.daemon = True
+                self._thread.start()
+        self._wakeup()
+
+    def unregister(self, ws):
+        with self._lock:
+            self._readers.pop(ws, None)
+        self._wakeup()
+
+    def __len__(self):
+        with self._lock:
+            return len(self._readers)
+
+    def _wakeup(self):
+        """Interrupt ``select`` so that it picks up the new set of sockets."""
+        try:
+            self._wakeup_w.send(b"\0")
+        except socket.error:
+            pass
+
+    def _drain_wakeups(self):
+        try:
+            while self._wakeup_r.recv(4096):
+                pass
+        except socket.error:
+            pass
+
+    def _run(self):
+        while True:
+            with self._lock:
+                readers = dict((ws.sock, (ws, callback))
+                               for ws, callback in self._readers.items()
+                               if ws.sock is not None)
+            try:
+                readable, _, _ = select.select([self._wakeup_r] + list(readers), [], [])
+            except (select.error, socket.error, ValueError):
+                # a socket got closed under us, let its owner find out on recv
+                readable = [sock for sock in readers if sock.fileno() < 0]
+
+            for sock in readable:
+                if sock is self._wakeup_r:
+                    self._drain_wakeups()
+                elif sock in readers:
+                    ws, callback = readers[sock]
+                    with self._lock:
+                        # unregistered since `readers` was taken
+                        if self._readers.get(ws) is not callback:
+                            continue
+                    try:
+                        callback(ws)
+                    except Exception:
+                        traceback.print_exc()
+
+
+_shared_loop = None
+_shared_loop_lock = threading.Lock()
+
+
+def shared_loop():
+    """The process wide `SharedLoop`, created on first use."""
+    global _shared_loop
+    with _shared_loop_lock:
+        if _shared_loop is None:
+            _shared_loop = SharedLoop()
+        return _shared_loop
@@ -0,0 +1,129 @@
+# coding: utf-8
+
+import threading
+import time
+from collections import OrderedDict
+
+from util import Util
+
+# A typecheck without completion event for that long no longer blocks others.
+STALE_AFTER = 120
+
+
+class TypecheckDispatcher(object):
+    """Batches the files to typecheck for a project.
+
+    Files requested within `delay` seconds of each other are sent together
+    in a single request, without duplicates, and files that aren't Scala or
+    Java are dropped. Only one typecheck is in flight at a time: files
+    requested meanwhile are batched until the server reports the typecheck
+    complete, or until it goes stale.
+
+    Args:
+        send (callable): Sends a typecheck request for a list of files.
+        delay (float): How long to wait for more files before sending.
+    """
+
+    def __init__(self, send, delay=0.3):
+        self._send = send
+        self.delay = delay
+        self._lock = threading.Lock()
+        self._pending = OrderedDict()
+        self._timer = None
+        self._sent_at = None
+        # instrumentation
+        self.files_requested = 0
+        self.files_dropped = 0
+        self.files_deduplicated = 0
+        self.batches = 0
+        self.files_sent = 0
+        self.typecheck_seconds = 0.0
+        self.last_typecheck_seconds = None
+
+    def request(self, files):
+        """Typecheck ``files`` soon, together with other requested files."""
+        with self._lock:
+            for file in files:
+                self.files_requested += 1
+                if not (file and (Util.is_scala(file) or Util.is_java(file))):
+                    self.files_dropped += 1
+                elif file in self._pending:
+                    self.files_deduplicated += 1
+                else:
+                    self._pending[file] = True
+            if self._pending:
+                self._schedule(self.delay)
+
+    def _schedule(self, delay):
+        if self._timer is None:
+            timer = threading.Timer(delay, lambda: self.flush(timer))
+            timer.daemon = True
+            self._timer = timer
+            timer.start()
+
+    def flush(self, timer=None):
+        """Send the pending files now, unless a typecheck is in flight.
+
+        Args:
+            timer (threading.Timer): The timer calling, if any, so that one
+                cancelled too late doesn't flush again.
+        """
+        with self._lock:
+            if timer is not None:
+                if timer is not self._timer:
+                    return
+            elif self._timer is not None:
+                self._timer.cancel()
+            self._timer = None
+            now = time.time()
+            if self._sent_at is not None and now - self._sent_at < STALE_AFTER:
+                if self._pending:
+                    # in case the completion event never comes
+                    self._schedule(self._sent_at + STALE_AFTER - now)
+                return
+            batch, self._pending = list(self._pending), OrderedDict()
+            if not batch:
+                return
+            self._sent_at = now
+            self.batches += 1
+            self.files_sent += len(batch)
+        self._send(batch)
+
+    def completed(self):
+        """The server finished typechecking, send what piled up meanwhile."""
+        with self._lock:
+            if self._sent_at is not None:
+                self.last_typecheck_seconds = time.time() - self._sent_at
+                self.typecheck_seconds += self.last_typecheck_seconds
+            self._sent_at = None
+        self.flush()
+
+    def disconnected(self):
+        """The typecheck in flight, if any, will never complete."""
+        with self._lock:
+            self._sent_at = None
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+
+    def in_flight(self):
+        with self._lock:
+            return self._sent_at is not None
+
+    def stats(self):
+        with self._lock:
+            return {"files_requested": self.files_requested,
+                    "files_dropped": self.files_dropped,
+                    "files_deduplicated": self.files_deduplicated,
+                    "files_sent": self.files_sent,
+                    "batches": self.batches,
+                    "requests_saved": self.files_requested - self.batches,
+                    "typecheck_seconds": self.typecheck_seconds,
+                    "last_typecheck_seconds": self.last_typecheck_seconds}
+
+    def cancel(self):
+        with self._lock:
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+            self._pending.clear()
@@ -0,0 +1,163 @@
+# coding: utf-8
+"""Latency and throughput of the client against the stand-in server.
+
+Drives a real ``EnsimeClient``, connected over a websocket to a
+`fake_server.FakeEnsimeServer` running in its own process, with
+pytest-benchmark. Both transport engines are measured. Not collected with the
+tests, run it with:
+
+    python -m pytest tests/benchmarks/bench_client.py
+
+Runs on Python 3.3 to 3.6, outside the editor, see `fakes`.
+"""
+import os
+import subprocess
+import sys
+
+import pytest
+
+import fakes
+
+fakes.install_sublime()
+
+from client import EnsimeClient  # noqa: E402
+from outgoing import (RpcRequest, ConnectionInfoRequest, CompletionsReq, TypeAtPointReq,  # noqa: E402
+                      SymbolAtPointReq, ImportSuggestionsReq, RenameRefactorDesc)
+
+PIPELINED = 200
+SOURCE = "object Foo {\n  val before = 1\n  before.\n}\n"
+
+
+class FakeProcess(object):
+    """What the client needs of `launcher.EnsimeProcess`."""
+
+    def __init__(self, port):
+        self.port = port
+
+    def http_port(self):
+        return self.port
+
+    def is_ready(self):
+        return True
+
+    def stop(self):
+        pass
+
+
+class FakeReq(RpcRequest):
+    """Controls the stand-in server, see `fake_server.FakeEnsimeServer`."""
+
+    def __init__(self, typehint, **fields):
+        super(FakeReq, self).__init__()
+        self.fields = dict(fields, typehint=typehint)
+
+    def json_repr(self):
+        return self.fields
+
+
+def control(env, typehint, **fields):
+    assert FakeReq(typehint, **fields).run_in(env, async=False) is not None
+
+
+def connect(port, settings=None):
+    env = fakes.FakeEnv(settings)
+    env.client = EnsimeClient(env, launcher=None)
+    env.client.ensime = FakeProcess(port)
+    env.client.connected = env.client.connect_ensime_server()
+    assert env.client.connected
+    return env
+
+
+@pytest.fixture
+def server():
+    """The port of a new stand-in server."""
+    process = subprocess.Popen([sys.executable, os.path.join(fakes.HERE, "fake_server.py")],
+                               stdout=subprocess.PIPE)
+    yield int(process.stdout.readline())
+    process.kill()
+    process.wait()
+
+
+@pytest.fixture(params=["threads", "shared"])
+def env(request, server):
+    env = connect(server, {"transport_engine": request.param})
+    yield env
+    env.client.teardown()
+
+
+def barrier(env):
+    """Wait until everything the server sent before is handled: messages
+    are handled in order, so the reply to a new call comes after them."""
+    assert ConnectionInfoRequest().run_in(env, async=False) is not None
+
+
+def source_file(env):
+    return os.path.join(env.cache_dir, "Foo.scala")
+
+
+REQUESTS = {
+    "ConnectionInfoReq": lambda env: ConnectionInfoRequest(),
+    "CompletionsReq": lambda env: CompletionsReq(36, source_file(env), SOURCE),
+    "TypeAtPointReq": lambda env: TypeAtPointReq(source_file(env), SOURCE, 20),
+    "SymbolAtPointReq": lambda env: SymbolAtPointReq(source_file(env), SOURCE, 20),
+    "ImportSuggestionsReq": lambda env: ImportSuggestionsReq(20, source_file(env), "List"),
+}
+
+
+@pytest.mark.parametrize("typehint", sorted(REQUESTS))
+def test_roundtrip(benchmark, env, typehint):
+    make = REQUESTS[typehint]
+    payload = benchmark(lambda: make(env).run_in(env, async=False))
+    assert payload is not None
+
+
+def test_refactor_roundtrip(benchmark, env):
+    def rename():
+        return RenameRefactorDesc("after", 17, 23, source_file(env)).run_in(env, async=False)
+    payload = benchmark(rename)
+    assert payload["typehint"] == "RefactorDiffEffect"
+
+
+@pytest.mark.parametrize("typehint", ["ConnectionInfoReq", "CompletionsReq", "ImportSuggestionsReq"])
+def test_pipelined_throughput(benchmark, env, typehint):
+    make = REQUESTS[typehint]
+
+    def pipeline():
+        for _ in range(PIPELINED):
+            make(env).run_in(env, async=True)
+        barrier(env)
+    benchmark.extra_info["requests"] = PIPELINED
+    benchmark(pipeline)
+
+
+@pytest.mark.parametrize("notes", [100, 2000])
+def test_notes_storm(benchmark, env, notes):
+    control(env, "FakeConfigReq", notes=notes)
+    benchmark.extra_info["notes"] = 10 * notes
+    # the reply comes once all events are sent, and is handled after them
+    benchmark(control, env, "FakeStormReq", notes_events=10, ready_events=1)
+    assert env.client.analyzer_ready
+
+
+def test_completions_during_storm(benchmark, env):
+    """Completions stay responsive while notes pour in."""
+    control(env, "FakeConfigReq", notes=2000)
+
+    def complete():
+        FakeReq("FakeStormReq", notes_events=5).run_in(env, async=True)
+        return REQUESTS["CompletionsReq"](env).run_in(env, async=False)
+    assert benchmark(complete) is not None
+
+
+@pytest.mark.parametrize("latency_ms", [5])
+def test_roundtrip_with_server_latency(benchmark, server, latency_ms):
+    env = connect(server)
+    control(env, "FakeConfigReq", latency=latency_ms / 1000.0)
+    try:
+        payload = benchmark(lambda: REQUESTS["TypeAtPointReq"](env).run_in(env, async=False))
+        assert payload is not None
+        if not benchmark.disabled:
+            # the caller is woken up as soon as the reply arrives
+            assert benchmark.stats.stats.median < latency_ms / 1000.0 * 3
+    finally:
+        env.client.teardown()
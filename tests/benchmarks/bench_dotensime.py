@@ -0,0 +1,90 @@
+# coding: utf-8
+"""Parsing time of ``.ensime`` files from 10KB to 50MB.
+
+Synthetic files shaped like those of sbt-ensime, their size coming from the
+classpaths of many modules, are parsed by `sexpconfig.loads` and by the
+generic `sexpdata` parser it replaces. Not collected with the tests, run it
+with:
+
+    python -m pytest tests/benchmarks/bench_dotensime.py
+
+Both parsers must give the same config, which is checked once per size.
+"""
+import pytest
+
+from config import ProjectConfig
+import sexpconfig
+
+KB = 1024
+MB = 1024 * KB
+SIZES = [10 * KB, 100 * KB, MB, 10 * MB, 50 * MB]
+
+PARSERS = {
+    "sexpconfig": sexpconfig.loads,
+    "sexpdata": ProjectConfig.parse_sexpdata,
+}
+
+_files = {}
+
+
+def module(index):
+    """A module of the ``:projects``, of about 30KB."""
+    jars = " ".join('"/home/user/.ivy2/cache/org.example{0}/lib{1}/jars/lib{1}-1.{0}.jar"'.format(
+        index, jar) for jar in range(160))
+    sources = " ".join('"/home/user/project/module{}/src/main/scala/pkg{}"'.format(index, root)
+                       for root in range(8))
+    return """(:id (:project "module{0}" :config "compile")
+     :depends ((:project "module{1}" :config "compile"))
+     :sources ({2})
+     :targets ("/home/user/project/module{0}/target/scala-2.12/classes")
+     :scalac-options ("-feature" "-deprecation" "-Xlint" "-Ywarn-unused-import")
+     :javac-options ()
+     :library-jars ({3})
+     :library-sources ({4})
+     :library-docs ())""".format(index, max(index - 1, 0), sources, jars,
+                                 jars.replace(".jar", "-sources.jar"))
+
+
+def synthetic_dotensime(size):
+    """An ``.ensime`` of about `size` bytes, with as many modules as fit."""
+    if size not in _files:
+        header = """;; generated by sbt-ensime, do not edit
+(:root-dir "/home/user/project"
+ :cache-dir "/home/user/project/.ensime_cache"
+ :scala-compiler-jars ("/home/user/.ivy2/cache/scala-compiler-2.12.8.jar")
+ :ensime-server-jars ("/home/user/.ivy2/cache/server_2.12-3.0.0.jar")
+ :name "project"
+ :java-home "/usr/lib/jvm/java-8-openjdk"
+ :java-flags ("-Xss2m" "-Xmx2g" "-XX:ReservedCodeCacheSize=256m" "-XX:+UseG1GC")
+ :java-sources ("/usr/lib/jvm/java-8-openjdk/src.zip")
+ :java-compiler-args ("-source" "1.8")
+ :scala-version "2.12.8"
+ :projects ("""
+        modules = []
+        length = len(header)
+        while length < size or not modules:
+            text = module(len(modules))
+            if modules and length + len(text) > size:
+                break
+            modules.append(text)
+            length += len(text) + 2
+        _files[size] = header + "\n    ".join(modules) + "))\n"
+    return _files[size]
+
+
+@pytest.fixture(params=SIZES, ids=lambda size: "{}KB".format(size // KB))
+def dotensime(request):
+    return synthetic_dotensime(request.param)
+
+
+def test_parsers_agree(dotensime):
+    assert sexpconfig.loads(dotensime) == ProjectConfig.parse_sexpdata(dotensime)
+
+
+@pytest.mark.parametrize("parser", sorted(PARSERS))
+def test_parse(benchmark, dotensime, parser):
+    # seconds per run for the largest files with sexpdata
+    rounds = 3 if len(dotensime) > 5 * MB else 10
+    benchmark.extra_info["bytes"] = len(dotensime)
+    config = benchmark.pedantic(PARSERS[parser], args=(dotensime,), rounds=rounds)
+    assert config["projects"]
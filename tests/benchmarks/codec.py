@@ -0,0 +1,67 @@
+# coding: utf-8
+"""Receive path throughput, decoding every frame in full like before or
+with `codec.JsonCodec`, which doesn't decode the payload of replies dropped
+unhandled, e.g. to superseded completion calls.
+
+Usage: python tests/benchmarks/codec.py [frames] [share of dropped frames]
+"""
+from __future__ import print_function
+
+import json
+import os
+import sys
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(HERE, os.pardir, os.pardir, "ensimesublime"))
+
+from codec import JsonCodec  # noqa: E402
+
+
+def completions_reply(call_id, count):
+    completions = [{"name": "member{}".format(i), "relevance": 90, "isInfix": False,
+                    "typeInfo": {"name": "Int", "fullName": "scala.Int", "typehint": "BasicTypeInfo",
+                                 "declAs": {"typehint": "Class"}, "typeArgs": [], "members": []}}
+                   for i in range(count)]
+    return json.dumps({"callId": call_id, "payload": {"typehint": "CompletionInfoList",
+                                                      "prefix": "", "completions": completions}})
+
+
+def stream(frames, dropped_share):
+    dropped_every = max(int(round(1 / dropped_share)), 1) if dropped_share else None
+    for i in range(frames):
+        yield completions_reply(i, 100), bool(dropped_every and i % dropped_every == 0)
+
+
+def eager(frames):
+    start = time.time()
+    for raw, _ in frames:
+        message = json.loads(raw)
+        message.get("callId")
+    return time.time() - start
+
+
+def lazy(frames):
+    codec = JsonCodec()
+    start = time.time()
+    for raw, dropped in frames:
+        frame = codec.decode(raw)
+        if not dropped:
+            frame.payload
+    return time.time() - start
+
+
+if __name__ == "__main__":
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    share = float(sys.argv[2]) if len(sys.argv) > 2 else 0.25
+    for title, dropped in (("no superseded replies", 0),
+                           ("{:.0%} superseded replies".format(share), share)):
+        frames = list(stream(count, dropped))
+        # alternated, the best of several runs
+        best = {}
+        for _ in range(10):
+            for name, run in (("eager", eager), ("lazy", lazy)):
+                best[name] = min(run(frames), best.get(name, float("inf")))
+        print(title)
+        for name in ("eager", "lazy"):
+            print("  {:<6} {:9.0f} frames/s".format(name, len(frames) / best[name]))
@@ -0,0 +1,294 @@
+# coding: utf-8
+"""A local stand-in for the ENSIME server, speaking jerky over a websocket.
+
+Only the framing of the bundled websocket client (``websocket._abnf``) is
+reused: its ``server.py`` needs gevent and Python 2. Responses are built per
+request typehint with configurable sizes, after a configurable latency, and
+`FakeEnsimeServer.storm` pushes bursts of events to the connected clients.
+
+Run as a script, the server listens on a free port that it prints, and
+clients configure it with the fake requests ``FakeConfigReq`` and
+``FakeStormReq``. Benchmarks should run it that way, in its own process, so
+that it doesn't compete with the client for the interpreter lock.
+
+Usage: python tests/benchmarks/fake_server.py [latency in ms]
+"""
+from __future__ import print_function
+
+import base64
+import hashlib
+import json
+import os
+import socket
+import tempfile
+import threading
+
+import fakes  # noqa: F401, puts the bundled dependencies on the path
+
+from websocket._abnf import ABNF, frame_buffer
+
+_GUID = "258EAFA5-E914-47DA-95CA-C5AB0DC85B11"
+
+
+class Connection(object):
+    """One client connected to the server."""
+
+    def __init__(self, server, sock):
+        self.server = server
+        self.sock = sock
+        self._send_lock = threading.Lock()
+        self.open = True
+
+    def handshake(self):
+        request = b""
+        while b"\r\n\r\n" not in request:
+            chunk = self.sock.recv(4096)
+            if not chunk:
+                return False
+            request += chunk
+        headers = {}
+        for line in request.decode("latin-1").split("\r\n")[1:]:
+            if ":" in line:
+                name, value = line.split(":", 1)
+                headers[name.strip().lower()] = value.strip()
+        accept = base64.b64encode(hashlib.sha1(
+            (headers["sec-websocket-key"] + _GUID).encode("ascii")).digest()).decode("ascii")
+        self.sock.sendall(("HTTP/1.1 101 Switching Protocols\r\n"
+                           "Upgrade: websocket\r\n"
+                           "Connection: Upgrade\r\n"
+                           "Sec-WebSocket-Accept: {}\r\n"
+                           "Sec-WebSocket-Protocol: jerky\r\n\r\n").format(accept).encode("ascii"))
+        return True
+
+    def serve(self):
+        try:
+            if not self.handshake():
+                return
+            frames = frame_buffer(self._recv, skip_utf8_validation=True)
+            while self.open:
+                frame = frames.recv_frame()
+                if frame.opcode == ABNF.OPCODE_TEXT:
+                    self.server.handle(self, json.loads(frame.data.decode("utf-8")))
+                elif frame.opcode == ABNF.OPCODE_PING:
+                    self._send(ABNF.OPCODE_PONG, frame.data)
+                elif frame.opcode == ABNF.OPCODE_CLOSE:
+                    self._send(ABNF.OPCODE_CLOSE, frame.data)
+                    break
+        except Exception:
+            # the client went away
+            pass
+        finally:
+            self.close()
+
+    def _recv(self, size):
+        data = self.sock.recv(size)
+        if not data:
+            raise socket.error("connection closed")
+        return data
+
+    def send(self, message):
+        self._send(ABNF.OPCODE_TEXT, json.dumps(message).encode("utf-8"))
+
+    def _send(self, opcode, data):
+        # frames from the server are not masked
+        frame = ABNF(fin=1, opcode=opcode, mask=0, data=data).format()
+        with self._send_lock:
+            if self.open:
+                self.sock.sendall(frame)
+
+    def close(self):
+        with self._send_lock:
+            self.open = False
+        try:
+            self.sock.close()
+        except socket.error:
+            pass
+        self.server.forget(self)
+
+
+class FakeEnsimeServer(object):
+    """Answers ENSIME requests on a local port.
+
+    Args:
+        latency (float): Seconds before answering a request.
+        completions (int): Completions per ``CompletionsReq``.
+        notes (int): Notes per ``NewScalaNotesEvent``.
+        note_files (int): Files the notes are spread over.
+    """
+
+    def __init__(self, latency=0.0, completions=50, notes=100, note_files=10):
+        self.latency = latency
+        self.completions = completions
+        self.notes = notes
+        self.note_files = note_files
+        self.requests = {}
+        self._connections = []
+        self._lock = threading.Lock()
+        self._listener = None
+        self.workdir = tempfile.mkdtemp()
+
+    def start(self):
+        """Listen on a free port, returned."""
+        self._listener = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self._listener.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self._listener.bind(("127.0.0.1", 0))
+        self._listener.listen(8)
+        thread = threading.Thread(name="fake-ensime", target=self._accept)
+        thread.daemon = True
+        thread.start()
+        return self.port
+
+    @property
+    def port(self):
+        return self._listener.getsockname()[1]
+
+    def stop(self):
+        if self._listener is not None:
+            self._listener.close()
+            self._listener = None
+        for connection in list(self._connections):
+            connection.close()
+
+    def _accept(self):
+        while self._listener is not None:
+            try:
+                sock, _ = self._listener.accept()
+            except (socket.error, AttributeError):
+                return
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            connection = Connection(self, sock)
+            with self._lock:
+                self._connections.append(connection)
+            thread = threading.Thread(name="fake-ensime-connection", target=connection.serve)
+            thread.daemon = True
+            thread.start()
+
+    def forget(self, connection):
+        with self._lock:
+            if connection in self._connections:
+                self._connections.remove(connection)
+
+    def broadcast(self, message):
+        with self._lock:
+            connections = list(self._connections)
+        for connection in connections:
+            connection.send(message)
+
+    # requests
+
+    def handle(self, connection, message):
+        call_id, request = message["callId"], message["req"]
+        typehint = request.get("typehint")
+        with self._lock:
+            self.requests[typehint] = self.requests.get(typehint, 0) + 1
+        builder = getattr(self, "reply_" + typehint, self.reply_default)
+
+        def answer():
+            connection.send({"callId": call_id, "payload": builder(request)})
+            if typehint == "TypecheckFilesReq":
+                self.typecheck_events(request.get("files", []))
+        if self.latency:
+            timer = threading.Timer(self.latency, answer)
+            timer.daemon = True
+            timer.start()
+        else:
+            answer()
+
+    def reply_default(self, request):
+        return {"typehint": "VoidResponse"}
+
+    def reply_FakeConfigReq(self, request):
+        """Change the settings of the server, e.g. ``latency``."""
+        for name in ("latency", "completions", "notes", "note_files"):
+            if name in request:
+                setattr(self, name, request[name])
+        return self.reply_default(request)
+
+    def reply_FakeStormReq(self, request):
+        """Push events, answering once they're all sent."""
+        self.storm(request.get("notes_events", 0), request.get("ready_events", 0))
+        return self.reply_default(request)
+
+    def reply_ConnectionInfoReq(self, request):
+        return {"typehint": "ConnectionInfo", "pid": os.getpid(),
+                "implementation": {"name": "ENSIME"}, "version": "fake"}
+
+    def reply_CompletionsReq(self, request):
+        return {"typehint": "CompletionInfoList", "prefix": "",
+                "completions": [completion("member{}".format(i)) for i in range(self.completions)]}
+
+    def reply_TypeAtPointReq(self, request):
+        return basic_type("scala.collection.immutable.List")
+
+    def reply_SymbolAtPointReq(self, request):
+        return {"typehint": "SymbolInfo", "name": "member", "localName": "member",
+                "declPos": {"typehint": "OffsetSourcePosition",
+                            "file": os.path.join(self.workdir, "Decl.scala"), "offset": 10},
+                "type": basic_type("scala.Int"), "isCallable": False}
+
+    def reply_DocUriAtPointReq(self, request):
+        return {"typehint": "StringResponse", "text": "docs/scala/Int.html"}
+
+    def reply_ImportSuggestionsReq(self, request):
+        return {"typehint": "ImportSuggestions",
+                "symLists": [[{"typehint": "TypeSearchResult", "name": "scala.collection.{}".format(name),
+                               "localName": name, "declAs": {"typehint": "Class"}}
+                              for name in request.get("names", [])]]}
+
+    def reply_RefactorReq(self, request):
+        """A rename diff of a file of the work dir, created for the occasion."""
+        source = os.path.join(self.workdir, "Refactored{}.scala".format(request.get("procId")))
+        with open(source, "w") as f:
+            f.write("object Foo {\n  val before = 1\n}\n")
+        diff = source + ".diff"
+        with open(diff, "w") as f:
+            f.write("--- {0}\n+++ {0}\n@@ -1,3 +1,3 @@\n object Foo {{\n-  val before = 1\n"
+                    "+  val after = 1\n }}\n".format(source))
+        return {"typehint": "RefactorDiffEffect", "procedureId": request.get("procId"),
+                "refactorType": {"typehint": "Rename"}, "diff": diff}
+
+    # events
+
+    def typecheck_events(self, files=()):
+        self.broadcast({"payload": {"typehint": "ClearAllScalaNotesEvent"}})
+        self.broadcast({"payload": {"typehint": "NewScalaNotesEvent", "isFull": False,
+                                    "notes": self.make_notes(files)}})
+        self.broadcast({"payload": {"typehint": "FullTypeCheckCompleteEvent"}})
+
+    def make_notes(self, files=()):
+        files = list(files) or [os.path.join(self.workdir, "File{}.scala".format(i))
+                                for i in range(self.note_files)]
+        return [{"typehint": "Note", "msg": "type mismatch;\n found: Int\n required: String",
+                 "file": files[i % len(files)], "severity": {"typehint": "NoteError"},
+                 "beg": i * 40, "end": i * 40 + 12, "line": i + 1, "col": 5}
+                for i in range(self.notes)]
+
+    def storm(self, notes_events=0, ready_events=0):
+        """Push ``notes_events`` notes events and ``ready_events`` pairs of
+        indexer and analyzer ready events to every client."""
+        for _ in range(ready_events):
+            self.broadcast({"payload": {"typehint": "IndexerReadyEvent"}})
+            self.broadcast({"payload": {"typehint": "AnalyzerReadyEvent"}})
+        for _ in range(notes_events):
+            self.broadcast({"payload": {"typehint": "NewScalaNotesEvent", "isFull": False,
+                                        "notes": self.make_notes()}})
+
+
+def basic_type(full_name):
+    return {"typehint": "BasicTypeInfo", "name": full_name.rsplit(".", 1)[-1],
+            "fullName": full_name, "declAs": {"typehint": "Class"}, "typeArgs": [], "members": []}
+
+
+def completion(name):
+    return {"typehint": "CompletionInfo", "name": name, "typeInfo": basic_type("scala.Int"),
+            "isCallable": False, "relevance": 90}
+
+
+if __name__ == "__main__":
+    import sys
+    import time
+    server = FakeEnsimeServer(latency=float(sys.argv[1]) / 1000 if len(sys.argv) > 1 else 0)
+    print(server.start())
+    sys.stdout.flush()
+    while True:
+        time.sleep(3600)
@@ -0,0 +1,145 @@
+# coding: utf-8
+"""Stand-ins for Sublime Text and the editor, to run the client outside of it.
+
+`install_sublime` must be called before importing the client modules. The
+client module uses ``async`` as a keyword argument, like the Python of
+Sublime Text 3, so code importing it runs on Python 3.3 to 3.6.
+"""
+from __future__ import print_function
+
+import logging
+import os
+import sys
+import tempfile
+import types
+from collections import Counter
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.join(HERE, os.pardir, os.pardir)
+sys.path[:0] = [os.path.join(ROOT, "dependencies"), os.path.join(ROOT, "ensimesublime")]
+
+
+class Region(object):
+    def __init__(self, a, b=None):
+        self.a = a
+        self.b = a if b is None else b
+
+    def begin(self):
+        return min(self.a, self.b)
+
+    def end(self):
+        return max(self.a, self.b)
+
+
+class FakeView(object):
+    def __init__(self, file_name=None):
+        self._file_name = file_name
+
+    def file_name(self):
+        return self._file_name
+
+    def is_loading(self):
+        return False
+
+    def is_auto_complete_visible(self):
+        return False
+
+    def text_point(self, row, col):
+        return 0
+
+    def __getattr__(self, name):
+        # show_at_center, show_popup, run_command...
+        return lambda *args, **kwargs: None
+
+
+class FakeWindow(object):
+    _ids = 0
+
+    def __init__(self, folders=()):
+        FakeWindow._ids += 1
+        self._id = FakeWindow._ids
+        self._folders = list(folders)
+        self._views = []
+
+    def id(self):
+        return self._id
+
+    def folders(self):
+        return list(self._folders)
+
+    def views(self):
+        return list(self._views)
+
+    def active_view(self):
+        return self._views[0] if self._views else FakeView()
+
+    def open_file(self, file_name, *args):
+        view = FakeView(file_name)
+        self._views.append(view)
+        return view
+
+    def __getattr__(self, name):
+        # show_quick_panel, run_command...
+        return lambda *args, **kwargs: None
+
+
+def install_sublime(window=None):
+    """Register a ``sublime`` module running callbacks right away."""
+    if "sublime" in sys.modules:
+        return sys.modules["sublime"]
+    sublime = types.ModuleType("sublime")
+    window = window or FakeWindow()
+
+    def set_timeout(callback, delay=0):
+        callback()
+
+    sublime.Region = Region
+    sublime.set_timeout = set_timeout
+    sublime.set_timeout_async = set_timeout
+    sublime.active_window = lambda: window
+    for name in ("error_message", "message_dialog", "status_message", "set_clipboard"):
+        setattr(sublime, name, lambda *args: None)
+    sys.modules["sublime"] = sublime
+    return sublime
+
+
+class FakeEditor(object):
+    """Counts the calls the handlers make to the editor."""
+
+    def __init__(self):
+        from completions import CompletionCache
+        self.current_prefix = None
+        self.suggestions = []
+        self.completion_cache = CompletionCache()
+        self.calls = Counter()
+
+    def __getattr__(self, name):
+        if name.startswith("__"):
+            raise AttributeError(name)
+
+        def call(*args, **kwargs):
+            self.calls[name] += 1
+        return call
+
+
+class FakeEnv(object):
+    """What the client needs of `env._EnsimeEnvironment`."""
+
+    def __init__(self, settings=None, cache_dir=None):
+        from notes import NotesStorage
+        self.logger = logging.getLogger("ensime-fake")
+        self.logger.addHandler(logging.NullHandler())
+        self.logger.propagate = False
+        self.settings = dict(settings or {})
+        self.cache_dir = cache_dir or tempfile.mkdtemp()
+        self.project_root = self.cache_dir
+        self.window = sys.modules["sublime"].active_window()
+        self.editor = FakeEditor()
+        self.notes_storage = NotesStorage()
+        self.client = None
+
+    def status_message(self, msg):
+        pass
+
+    def error_message(self, msg):
+        pass
@@ -0,0 +1,67 @@
+# coding: utf-8
+"""Replays a recorded session through the protocol handlers.
+
+Feeds the messages of a log written by ``recorder.SessionRecorder`` (see the
+``record_session`` setting) to the handlers of a real client, with a fake
+editor and neither Sublime Text nor a server. Reports the time spent decoding
+and handling messages per typehint. Messages are replayed in order and as
+fast as possible, so runs are comparable from one revision to the next.
+
+Usage: python tests/benchmarks/replay.py <session.log> [session] [repeat]
+"""
+from __future__ import print_function
+
+import json
+import sys
+
+import fakes
+
+fakes.install_sublime()
+
+from client import EnsimeClient  # noqa: E402
+from metrics import LatencyStats, DECODE, HANDLER  # noqa: E402
+from recorder import read_session, OUTGOING  # noqa: E402
+
+
+def replay(path, session=None, repeat=1):
+    """Replay the messages of ``session`` in ``path``, all sessions by default.
+
+    Returns:
+        tuple: The `metrics.LatencyStats` of the replay, and a Counter of the
+        calls made to the editor.
+    """
+    records = [record for record in read_session(path)
+               if session is None or record[0] == session]
+    stats = LatencyStats()
+    for _ in range(repeat):
+        env = fakes.FakeEnv()
+        client = env.client = EnsimeClient(env, launcher=None)
+        for _, _, direction, message in records:
+            if direction == OUTGOING:
+                request = json.loads(message)
+                client.call_options[request["callId"]] = {"async": True}
+                stats.issued(request["callId"], request["req"].get("typehint"))
+                continue
+            frame = client.codec.decode(message)
+            typehint = stats.typehint(frame.call_id) or frame.typehint
+            start = stats.now()
+            payload = frame.payload
+            decoded = stats.now()
+            client.handle_incoming_response(frame.call_id, payload)
+            stats.record(typehint, DECODE, decoded - start)
+            stats.record(typehint, HANDLER, stats.now() - decoded)
+            stats.finished(frame.call_id)
+        client.teardown()
+    return stats, env.editor.calls
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2:
+        sys.exit(__doc__)
+    session = int(sys.argv[2]) if len(sys.argv) > 2 else None
+    repeat = int(sys.argv[3]) if len(sys.argv) > 3 else 1
+    stats, calls = replay(sys.argv[1], session, repeat)
+    print(stats.report())
+    print()
+    print("Editor calls: {}".format(", ".join(
+        "{} {}".format(name, count) for name, count in sorted(calls.items()))))
@@ -0,0 +1,78 @@
+# coding: utf-8
+"""Round-trip latency of synchronous calls against a local stand-in server.
+
+Compares the former ``get_response`` strategy (polling a dict every 0.5s) to
+the ``PendingResponses`` registry, where the receiving thread wakes the caller
+as soon as the reply arrives.
+
+Usage: python tests/benchmarks/roundtrip.py [calls] [server latency in ms]
+"""
+from __future__ import print_function
+
+import os
+import sys
+import threading
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(HERE, os.pardir, os.pardir, "ensimesublime"))
+
+from pending import PendingResponses  # noqa: E402
+
+
+class StandInServer(object):
+    """Answers every call after ``latency`` seconds on its own thread."""
+
+    def __init__(self, latency, deliver):
+        self.latency = latency
+        self.deliver = deliver
+
+    def send(self, call_id):
+        reply = {'callId': call_id, 'payload': {'typehint': 'CompletionInfoList'}}
+        timer = threading.Timer(self.latency, self.deliver, args=(call_id, reply))
+        timer.daemon = True
+        timer.start()
+
+
+def polling_roundtrip(calls, latency):
+    responses = {}
+    server = StandInServer(latency, responses.__setitem__)
+    samples = []
+    for call_id in range(calls):
+        start = time.time()
+        server.send(call_id)
+        while call_id not in responses:
+            time.sleep(0.5)
+        del responses[call_id]
+        samples.append(time.time() - start)
+    return samples
+
+
+def registry_roundtrip(calls, latency):
+    responses = PendingResponses()
+    server = StandInServer(latency, responses.resolve)
+    samples = []
+    for call_id in range(calls):
+        start = time.time()
+        responses.register(call_id)
+        server.send(call_id)
+        responses.wait(call_id, timeout=5)
+        samples.append(time.time() - start)
+    return samples
+
+
+def percentile(samples, p):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(round(p / 100.0 * (len(ordered) - 1))))]
+
+
+def report(name, samples):
+    print("{:<10} p50 {:8.1f}ms  p99 {:8.1f}ms".format(
+        name, percentile(samples, 50) * 1000, percentile(samples, 99) * 1000))
+
+
+if __name__ == "__main__":
+    calls = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+    latency = (float(sys.argv[2]) if len(sys.argv) > 2 else 20) / 1000
+    report("polling", polling_roundtrip(calls, latency))
+    report("registry", registry_roundtrip(calls, latency))
@@ -0,0 +1,107 @@
+# coding: utf-8
+"""Soak test of the client's per-call state against a stub server.
+
+Sends a million requests through a real ``EnsimeClient`` wired to a stub
+server that answers in process. A share of the calls is never answered and
+some synchronous calls are answered only after their caller gave up, which are
+the cases that used to leave entries in ``call_options``, ``refactorings``
+and ``responses`` forever. Table sizes and traced memory are reported along
+the way, and must stay flat.
+
+Runs on Python 3.3 to 3.6, outside the editor, see `fakes`.
+
+Usage: python tests/benchmarks/soak.py [requests] [call lifetime in seconds]
+"""
+from __future__ import print_function
+
+import json
+import sys
+import time
+import tracemalloc
+
+import fakes
+
+fakes.install_sublime()
+
+from client import EnsimeClient  # noqa: E402
+from outgoing import RpcRequest, RefactorRequest  # noqa: E402
+from scheduler import INTERACTIVE  # noqa: E402
+
+
+class PingReq(RpcRequest):
+    priority = INTERACTIVE
+
+    def json_repr(self):
+        return {"typehint": "ConnectionInfoReq"}
+
+
+class RenameReq(RefactorRequest):
+    def json_repr(self):
+        return {"ref_type": "RefactorReq",
+                "ref_params": {"typehint": "RenameRefactorDesc", "file": "/tmp/A.scala"},
+                "ref_options": {"interactive": False}}
+
+
+class StubServer(object):
+    """Stands in for the websocket: answers requests right away, but drops
+    one in ``drop_every`` and delays one in ``late_every`` until the next
+    request was sent."""
+
+    def __init__(self, drop_every=50, late_every=200):
+        self.client = None
+        self.drop_every = drop_every
+        self.late_every = late_every
+        self.received = 0
+        self.late = []
+        self.connected = True
+
+    def send(self, text):
+        self.received += 1
+        message = json.loads(text)
+        reply = json.dumps({"callId": message["callId"],
+                            "payload": {"typehint": "ConnectionInfo", "version": "stub"}})
+        late, self.late = self.late, []
+        for frame in late:
+            self.client.dispatch(frame)
+        if self.received % self.drop_every == 0:
+            return
+        if self.received % self.late_every == 0:
+            self.late.append(reply)
+            return
+        self.client.dispatch(reply)
+
+
+def soak(requests, lifetime, report_every=100000):
+    env = fakes.FakeEnv({"call_lifetime": lifetime,
+                         # never hold requests back, only their state matters here
+                         "max_in_flight": {"interactive": 10 ** 9, "background": 10 ** 9,
+                                           "bulk": 10 ** 9}})
+    client = env.client = EnsimeClient(env, launcher=None)
+    server = StubServer()
+    server.client = client
+    client.ws = server
+
+    tracemalloc.start()
+    start = time.time()
+    for i in range(1, requests + 1):
+        if i % 10 == 0:
+            # answered late: the caller has given up by then
+            PingReq().send_request(PingReq().json_repr(), client, False)
+            client.get_response(client.call_id - 1, timeout=0)
+        elif i % 10 == 1:
+            RenameReq().run_in(env, async=True)
+        elif i % 10 == 2:
+            PingReq().submit(env)
+        else:
+            PingReq().run_in(env, async=True)
+        if i % report_every == 0:
+            current, peak = tracemalloc.get_traced_memory()
+            print("{:>9} requests {:6.1f}s  {}  traced {:6.1f}MB (peak {:.1f}MB)".format(
+                i, time.time() - start, client.table_sizes(), current / 2.0 ** 20, peak / 2.0 ** 20))
+    return client
+
+
+if __name__ == "__main__":
+    requests = int(sys.argv[1]) if len(sys.argv) > 1 else 1000000
+    lifetime = float(sys.argv[2]) if len(sys.argv) > 2 else 2
+    soak(requests, lifetime)
@@ -0,0 +1,53 @@
+# coding: utf-8
+
+import os
+
+from buffers import BufferTracker, contents_hash
+
+SOURCE = "/project/src/Foo.scala"
+
+
+def test_saved_buffers_are_referenced_by_file(tmpdir):
+    buffers = BufferTracker(tmpdir.strpath)
+    assert buffers.file_info(SOURCE, None) == {"file": SOURCE}
+    assert buffers.stats()["writes"] == 0
+
+
+def test_dirty_buffers_are_passed_through_a_file(tmpdir):
+    buffers = BufferTracker(tmpdir.join("buffers").strpath)
+    contents = u"object Foo { val x = λ }"
+    info = buffers.file_info(SOURCE, contents)
+
+    assert "contents" not in info
+    with open(info["contentsIn"], encoding="utf-8") as f:
+        assert f.read() == contents
+
+
+def test_unchanged_buffers_are_written_once(tmpdir):
+    buffers = BufferTracker(tmpdir.strpath)
+    contents = "object Foo" * 1000
+    first = buffers.file_info(SOURCE, contents)
+    second = buffers.file_info(SOURCE, contents, contents_hash(contents))
+    assert first == second
+    stats = buffers.stats()
+    assert stats["writes"] == 1
+    assert stats["writes_skipped"] == 1
+    assert stats["bytes_saved"] == 2 * (len(contents) - len(first["contentsIn"]))
+
+    changed = buffers.file_info(SOURCE, contents + "!")
+    assert changed["contentsIn"] == first["contentsIn"]
+    assert buffers.stats()["writes"] == 2
+
+
+def test_inline_mode_embeds_contents(tmpdir):
+    buffers = BufferTracker(tmpdir.strpath, inline=True)
+    assert buffers.file_info(SOURCE, "object Foo") == {"file": SOURCE, "contents": "object Foo"}
+    assert buffers.stats()["bytes_sent"] == len("object Foo")
+
+
+def test_forget_removes_the_buffer_file(tmpdir):
+    buffers = BufferTracker(tmpdir.strpath)
+    path = buffers.file_info(SOURCE, "object Foo")["contentsIn"]
+    buffers.forget(SOURCE)
+    assert not os.path.exists(path)
+    assert buffers.stats()["buffers"] == 0
@@ -0,0 +1,85 @@
+# coding: utf-8
+
+import json
+import os
+
+import pytest
+
+from cds import java_major_version, archive_path, cds_flags, record_startup, OFF, DUMP, USE
+
+
+@pytest.fixture
+def jdk(tmpdir):
+    home = tmpdir.mkdir("jdk")
+    home.join("release").write('IMPLEMENTOR="Eclipse Adoptium"\nJAVA_VERSION="17.0.8"\n')
+    return home.strpath
+
+
+@pytest.fixture
+def classpath(tmpdir):
+    jar = tmpdir.join("server.jar")
+    jar.write("classes")
+    return [jar.strpath, tmpdir.join("missing.jar").strpath]
+
+
+@pytest.mark.parametrize("release, major", [
+    ('JAVA_VERSION="1.8.0_202"', 8),
+    ('JAVA_VERSION="11.0.2"', 11),
+    ('JAVA_VERSION="17"', 17),
+    ('OS_NAME="Linux"', None),
+])
+def test_java_major_version(tmpdir, release, major):
+    tmpdir.join("release").write(release + "\n")
+    assert java_major_version(tmpdir.strpath) == major
+
+
+def test_no_release_file_means_unknown_version(tmpdir):
+    assert java_major_version(tmpdir.strpath) is None
+
+
+def test_archive_follows_the_jars(tmpdir, jdk, classpath):
+    before = archive_path(tmpdir.strpath, classpath, jdk, 17)
+    assert before == archive_path(tmpdir.strpath, classpath, jdk, 17)
+    assert before != archive_path(tmpdir.strpath, classpath[:1], jdk, 17)
+    assert before != archive_path(tmpdir.strpath, classpath, jdk, 18)
+    with open(classpath[0], "a") as f:
+        f.write("more classes")
+    assert before != archive_path(tmpdir.strpath, classpath, jdk, 17)
+
+
+def test_archive_is_written_then_used(tmpdir, jdk, classpath):
+    cache = tmpdir.mkdir("cache").strpath
+    stale = tmpdir.join("cache", "cds-0000.jsa")
+    stale.write("")
+    flags, mode, _ = cds_flags(cache, classpath, jdk)
+    archive = archive_path(cache, classpath, jdk, 17)
+    assert (flags, mode) == (["-XX:ArchiveClassesAtExit={}".format(archive)], DUMP)
+    assert not stale.exists()
+
+    # as written by the server on exit
+    with open(archive, "w"):
+        pass
+    flags, mode, _ = cds_flags(cache, classpath, jdk)
+    assert (flags, mode) == (["-XX:SharedArchiveFile={}".format(archive)], USE)
+
+
+def test_old_java_does_not_share(tmpdir, classpath):
+    tmpdir.join("release").write('JAVA_VERSION="1.8.0_202"\n')
+    flags, mode, note = cds_flags(tmpdir.strpath, classpath, tmpdir.strpath)
+    assert (flags, mode) == ([], OFF)
+    assert "found 8" in note
+
+
+def test_sharing_flags_of_the_user_win(tmpdir, jdk, classpath):
+    assert cds_flags(tmpdir.strpath, classpath, jdk, ["-Xshare:off"])[:2] == ([], OFF)
+
+
+def test_startup_times_are_compared(tmpdir):
+    cache = tmpdir.strpath
+    record_startup(cache, OFF, 20.0)
+    record_startup(cache, DUMP, 22.0)
+    summary = record_startup(cache, USE, 9.0)
+    assert summary == ("Server started in 9.0s (median with class data sharing 9.0s over 1 starts, "
+                       "without 22.0s over 2 starts)")
+    with open(os.path.join(cache, "startup-times.json")) as f:
+        assert json.load(f) == {"off": [20.0, 22.0], "use": [9.0]}
@@ -0,0 +1,138 @@
+# coding: utf-8
+
+import os
+import socket
+import sys
+
+import pytest
+from mock import patch
+
+# after the client modules, some names are taken by both
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "benchmarks"))
+
+import fakes  # noqa: E402
+
+fakes.install_sublime()
+
+from client import EnsimeClient  # noqa: E402
+from fake_server import FakeEnsimeServer  # noqa: E402
+from launcher import AttachedProcess  # noqa: E402
+from outgoing import ConnectionInfoRequest, TypeAtPointReq  # noqa: E402
+
+
+class FakeProcess(object):
+    """What the client needs of `launcher.EnsimeProcess`."""
+
+    launch_notes = []
+    cds_mode = None
+
+    def __init__(self, port, cache_dir=None):
+        self.port = port
+        self.cache_dir = cache_dir
+
+    def http_port(self):
+        return self.port
+
+    def is_running(self):
+        return True
+
+    def is_ready(self):
+        return True
+
+    def stop(self):
+        pass
+
+
+class FakeLauncher(object):
+    """What the client needs of `launcher.EnsimeLauncher`."""
+
+    def __init__(self, port, cache_dir):
+        self.port = port
+        self.cache_dir = cache_dir
+        self.launched = 0
+
+    def launch(self):
+        self.launched += 1
+        return FakeProcess(self.port, self.cache_dir)
+
+
+@pytest.fixture
+def server():
+    server = FakeEnsimeServer()
+    server.start()
+    yield server
+    server.stop()
+
+
+def connect(server, engine, **settings):
+    env = fakes.FakeEnv(dict(settings, transport_engine=engine))
+    env.client = EnsimeClient(env, launcher=None)
+    env.client.ensime = FakeProcess(server.port)
+    env.client.connected = env.client.connect_ensime_server()
+    assert env.client.connected
+    return env
+
+
+@pytest.fixture(params=["threads", "shared"])
+def env(request, server):
+    env = connect(server, request.param)
+    yield env
+    env.client.teardown()
+
+
+def test_synchronous_calls_get_their_reply(env):
+    # not the default timeout: with no one receiving, it would take minutes
+    request = ConnectionInfoRequest()
+    request.timeout = 5
+    assert request.run_in(env, async=False)["typehint"] == "ConnectionInfo"
+
+
+def test_submitted_calls_leave_no_state_behind(env):
+    pending = ConnectionInfoRequest().submit(env)
+    assert pending.wait(5)
+    assert pending.result().typehint == "ConnectionInfo"
+    assert env.client.table_sizes()["call_options"] == 0
+    assert env.client.table_sizes()["responses"] == 0
+    assert env.client.latency.typehint(pending.call_id) is None
+
+
+def test_superseded_queries_cancelled_before_sending_leave_no_state_behind(server):
+    env = connect(server, "threads", max_in_flight={"interactive": 1})
+    try:
+        server.latency = 0.5
+        source = os.path.join(env.cache_dir, "Foo.scala")
+        TypeAtPointReq(source, "object Foo", 1).run_in(env, async=True)
+        queued = TypeAtPointReq(source, "object Foo", 2)
+        queued_call = queued.send_request(queued.json_repr(), env.client, True)
+        TypeAtPointReq(source, "object Foo", 3).run_in(env, async=True)
+
+        assert env.client.call_options.get(queued_call) is None
+        assert env.client.latency.typehint(queued_call) is None
+        assert env.client.table_sizes()["queries"] == 2
+    finally:
+        env.client.teardown()
+
+
+def test_server_failing_the_handshake_is_left_running_and_replaced(server, tmpdir):
+    # something else took the port and the pid of a dead server
+    squatter = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    squatter.bind(("127.0.0.1", 0))
+    squatter.listen(1)
+    tmpdir.join("http").write(str(squatter.getsockname()[1]))
+    tmpdir.join("server.pid").write(str(os.getpid()))
+    env = fakes.FakeEnv({"transport_engine": "threads"}, cache_dir=tmpdir.strpath)
+    launcher = FakeLauncher(server.port, tmpdir.strpath)
+    env.client = EnsimeClient(env, launcher=launcher)
+    env.client.project_key = tmpdir.join(".ensime").strpath
+    env.client.ensime = AttachedProcess(tmpdir.strpath, os.getpid())
+    try:
+        with patch("launcher.is_ensime_server", return_value=True), patch("os.kill") as kill:
+            env.client.connect_attached(1, env.client.teardown)
+        assert not kill.called
+        assert env.client.connected
+        assert launcher.launched == 1
+        assert not tmpdir.join("http").exists()
+        assert not tmpdir.join("server.pid").exists()
+    finally:
+        env.client.teardown()
+        squatter.close()
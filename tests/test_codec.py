@@ -0,0 +1,45 @@
+# coding: utf-8
+
+import json
+
+import pytest
+
+from codec import JsonCodec, describe_error
+
+
+@pytest.fixture
+def codec():
+    return JsonCodec()
+
+
+def test_peeks_response_envelope_without_decoding(codec):
+    frame = codec.decode('{"callId":4,"payload":{"typehint":"CompletionInfoList","completions":[]}}')
+    assert (frame.call_id, frame.typehint) == (4, "CompletionInfoList")
+    assert not frame.is_decoded()
+    assert frame.payload == {"typehint": "CompletionInfoList", "completions": []}
+
+
+def test_decodes_events_right_away(codec):
+    event = codec.decode('{"payload":{"typehint":"NewScalaNotesEvent","notes":[{"callId":3}]}}')
+    assert (event.call_id, event.typehint) == (None, "NewScalaNotesEvent")
+    assert event.is_decoded()
+
+
+def test_decodes_other_layouts_right_away(codec):
+    frame = codec.decode(' {"payload": {"name": "x", "typehint": "SymbolInfo"}, "callId": 7}')
+    assert (frame.call_id, frame.typehint) == (7, "SymbolInfo")
+    assert frame.is_decoded()
+
+
+def test_truncated_payloads_fail_on_access(codec):
+    raw = '{"callId":1,"payload":{"typehint":"CompletionInfoList","completions":[{"name":'
+    frame = codec.decode(raw)
+    assert frame.call_id == 1
+    with pytest.raises(ValueError) as excinfo:
+        frame.payload
+    assert 'chars), near' in describe_error(excinfo.value, raw)
+
+
+def test_encode_round_trips(codec):
+    message = {"callId": 1, "req": {"typehint": "ConnectionInfoReq"}}
+    assert json.loads(codec.encode(message)) == message
@@ -0,0 +1,36 @@
+# coding: utf-8
+
+from completions import CompletionCache, is_subsequence
+
+KEY = ("Foo.scala", 120, "digest of the text before the anchor")
+COMPLETIONS = [("map", "map(f)"), ("mapValues", "mapValues(f)"),
+               ("flatMap", "flatMap(f)"), ("max", "max")]
+
+
+def test_narrows_cached_completions_by_prefix_then_fuzzy_match():
+    cache = CompletionCache()
+    cache.store(KEY, "", COMPLETIONS, complete=True)
+    assert cache.lookup(KEY, "map") == ["map(f)", "mapValues(f)", "flatMap(f)"]
+    assert cache.lookup(KEY, "mV") == ["mapValues(f)"]
+    assert cache.lookup(KEY, "") == [s for _, s in COMPLETIONS]
+
+
+def test_misses_when_the_anchor_or_text_before_it_changes():
+    cache = CompletionCache()
+    cache.store(KEY, "ma", COMPLETIONS, complete=True)
+    assert cache.lookup(("Foo.scala", 121, KEY[2]), "ma") is None
+    assert cache.lookup(("Foo.scala", 120, "edited"), "ma") is None
+    # results for "ma" can't answer a shorter prefix
+    assert cache.lookup(KEY, "m") is None
+
+
+def test_truncated_results_are_not_cached():
+    cache = CompletionCache()
+    cache.store(KEY, "", COMPLETIONS, complete=True)
+    cache.store(KEY, "", COMPLETIONS[:1], complete=False)
+    assert cache.lookup(KEY, "m") is None
+
+
+def test_is_subsequence():
+    assert is_subsequence("mv", "mapvalues")
+    assert not is_subsequence("vm", "mapvalues")
@@ -1,9 +1,12 @@
 # coding: utf-8
 
+import json
+
 from py import path
 from pytest import raises
 import sexpdata
 
+import config as config_module
 from config import ProjectConfig
 
 confpath = path.local(__file__).dirpath() / 'resources' / 'test.conf'
@@ -33,3 +36,54 @@ def test_fails_when_given_invalid_config():
     badconf = path.local(__file__).dirpath() / 'resources' / 'broken.conf'
     with raises(sexpdata.ExpectClosingBracket):
         ProjectConfig(badconf.strpath)
+
+
+def write_dotensime(tmpdir, name="cached"):
+    dotensime = tmpdir / ".ensime"
+    dotensime.write('(:name "{}" :cache-dir "{}" :source-mode nil :debug t :mode foo)'.format(
+        name, (tmpdir / ".ensime_cache").strpath))
+    return dotensime
+
+
+def test_caches_parsed_configs(tmpdir, monkeypatch):
+    dotensime = write_dotensime(tmpdir)
+    calls = []
+    parse_string = ProjectConfig.parse_string
+    monkeypatch.setattr(ProjectConfig, "parse_string",
+                        staticmethod(lambda text: calls.append(text) or parse_string(text)))
+    first = ProjectConfig(dotensime.strpath)
+    assert ProjectConfig(dotensime.strpath) == first
+    assert len(calls) == 1
+    assert (tmpdir / ".ensime_cache" / config_module.CACHE_FILE).check()
+
+    # a new session
+    config_module._parsed.clear()
+    second = ProjectConfig(dotensime.strpath)
+    assert len(calls) == 1
+    assert dict(second) == dict(first)
+    assert second["mode"] == sexpdata.Symbol("foo")
+    assert second["source-mode"] == [] and second["debug"] is True
+
+
+def test_parses_changed_configs_again(tmpdir):
+    dotensime = write_dotensime(tmpdir)
+    assert ProjectConfig(dotensime.strpath)["name"] == "cached"
+    mtime = dotensime.mtime()
+    write_dotensime(tmpdir, name="edited")
+    dotensime.setmtime(mtime)
+    # same modification time, other size
+    assert ProjectConfig(dotensime.strpath)["name"] == "edited"
+    write_dotensime(tmpdir, name="edit2d")
+    dotensime.setmtime(mtime + 10)
+    assert ProjectConfig(dotensime.strpath)["name"] == "edit2d"
+    config_module._parsed.clear()
+    assert ProjectConfig(dotensime.strpath)["name"] == "edit2d"
+
+
+def test_ignores_broken_caches(tmpdir):
+    dotensime = write_dotensime(tmpdir)
+    ProjectConfig(dotensime.strpath)
+    config_module._parsed.clear()
+    (tmpdir / ".ensime_cache" / config_module.CACHE_FILE).write('{"format": 1, "conf')
+    assert ProjectConfig(dotensime.strpath)["name"] == "cached"
+    assert "config" in json.loads((tmpdir / ".ensime_cache" / config_module.CACHE_FILE).read())
@@ -1,12 +1,15 @@
 # coding: utf-8
 
+import os
+import socket
+
 import pytest
 from mock import patch
 from py import path
 
 from config import ProjectConfig
 from errors import LaunchError
-from launcher import DotEnsimeLauncher
+from launcher import DotEnsimeLauncher, EnsimeLauncher, AttachedProcess, is_ensime_server
 
 CONFROOT = path.local(__file__).dirpath() / 'resources'
 
@@ -36,6 +39,34 @@ class TestDotEnsimeStrategy:
         classpath = args[0]
         assert classpath == strategy.classpath
 
+    def test_start_process_sizes_the_jvm(self, tmpdir):
+        conf = dict(config('test-server-jars.conf'))
+        conf['root-dir'] = conf['cache-dir'] = tmpdir.strpath
+        conf['java-flags'] = ['-Xss1m']
+        strategy = DotEnsimeLauncher(conf, {'jvm_sizing': [{'flags': ['-Xmx2g', '-Xss4m']}]})
+        with patch('os.path.exists', return_value=True), patch('os.access', return_value=True), \
+                patch('subprocess.Popen') as popen:
+            process = strategy._start_process(strategy.classpath)
+
+        args = popen.call_args[0][0]
+        assert args[3:6] == ['-Xmx2g', '-Xss1m', '-Densime.config={}'.format(tmpdir.join('.ensime'))]
+        assert 'overridden by java-flags' in process.launch_notes[0]
+        assert process.launch_notes[0] in tmpdir.join('server.log').read()
+
+    def test_start_process_shares_class_data(self, tmpdir):
+        conf = dict(config('test-server-jars.conf'))
+        conf['root-dir'] = conf['cache-dir'] = tmpdir.strpath
+        conf['java-home'] = tmpdir.strpath
+        tmpdir.join('release').write('JAVA_VERSION="17.0.8"\n')
+        strategy = DotEnsimeLauncher(conf, {'jvm_sizing': [], 'class_data_sharing': True})
+        with patch('os.access', return_value=True), patch('subprocess.Popen') as popen:
+            tmpdir.mkdir('bin').join('java').write('')
+            process = strategy._start_process(strategy.classpath)
+
+        args = popen.call_args[0][0]
+        assert args[3].startswith('-XX:ArchiveClassesAtExit={}'.format(tmpdir.join('cds-')))
+        assert process.cds_mode == 'dump'
+
     def test_launch_raises_when_not_installed(self, strategy):
         assert not strategy.isinstalled()
         with pytest.raises(LaunchError) as excinfo:
@@ -43,6 +74,100 @@ class TestDotEnsimeStrategy:
         assert 'Some jars reported by .ensime do not exist' in str(excinfo.value)
 
 
+class TestAttach:
+    @pytest.fixture
+    def launcher(self, tmpdir):
+        conf = dict(config('test-server-jars.conf'))
+        conf['root-dir'] = conf['cache-dir'] = tmpdir.strpath
+        return EnsimeLauncher(conf)
+
+    @pytest.fixture
+    def listener(self):
+        s = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        s.bind(("127.0.0.1", 0))
+        s.listen(1)
+        yield s.getsockname()[1]
+        s.close()
+
+    def test_nothing_to_attach_to_without_port_file(self, launcher):
+        assert launcher.attach() is None
+
+    def test_attaches_to_live_server(self, launcher, listener, tmpdir):
+        tmpdir.join("http").write(str(listener))
+        tmpdir.join("server.pid").write(str(os.getpid()))
+        with patch('launcher.is_ensime_server', return_value=True):
+            process = launcher.attach()
+        assert isinstance(process, AttachedProcess)
+        assert process.pid == os.getpid()
+        assert process.http_port() == listener
+        assert process.is_running()
+
+    def test_attaches_to_external_server_by_port_only(self, launcher, listener, tmpdir):
+        tmpdir.join("http").write(str(listener))
+        process = launcher.attach()
+        assert process.pid is None
+        # it's not ours to stop
+        with patch('os.kill') as kill:
+            process.stop()
+        assert not kill.called
+        assert tmpdir.join("http").exists()
+
+    def test_removes_leftovers_of_dead_server(self, launcher, listener, tmpdir):
+        tmpdir.join("http").write(str(listener))
+        tmpdir.join("server.pid").write("12345")
+        with patch('launcher.pid_alive', return_value=False):
+            assert launcher.attach() is None
+        assert not tmpdir.join("http").exists()
+        assert not tmpdir.join("server.pid").exists()
+
+    def test_removes_leftovers_when_pid_was_reused(self, launcher, listener, tmpdir):
+        tmpdir.join("http").write(str(listener))
+        # alive, but the test runner rather than a server
+        tmpdir.join("server.pid").write(str(os.getpid()))
+        with patch('launcher.is_ensime_server', return_value=False):
+            assert launcher.attach() is None
+        assert not tmpdir.join("http").exists()
+        assert not tmpdir.join("server.pid").exists()
+
+    def test_removes_leftovers_of_reused_pid_on_stop(self, tmpdir):
+        tmpdir.join("http").write("1234")
+        process = AttachedProcess(tmpdir.strpath, pid=12345)
+        with patch('launcher.is_ensime_server', return_value=False), patch('os.kill') as kill:
+            process.stop()
+        assert not kill.called
+        assert not tmpdir.join("http").exists()
+
+    def test_leaves_unverified_server_running_and_findable(self, tmpdir):
+        tmpdir.join("http").write("1234")
+        tmpdir.join("server.pid").write("12345")
+        process = AttachedProcess(tmpdir.strpath, pid=12345)
+        with patch('launcher.is_ensime_server', return_value=None), patch('os.kill') as kill:
+            process.stop()
+        assert not kill.called
+        assert tmpdir.join("http").exists()
+        assert tmpdir.join("server.pid").exists()
+
+    def test_stops_a_verified_server(self, tmpdir):
+        tmpdir.join("http").write("1234")
+        process = AttachedProcess(tmpdir.strpath, pid=12345)
+        with patch('launcher.is_ensime_server', return_value=True), patch('os.kill') as kill:
+            process.stop()
+        assert kill.called
+        assert not tmpdir.join("http").exists()
+
+    @pytest.mark.skipif(not os.path.isdir("/proc"), reason="needs /proc")
+    def test_tells_the_ensime_server_by_its_command_line(self):
+        assert is_ensime_server(os.getpid()) is False
+
+    def test_closed_port_is_not_attached_to(self, launcher, tmpdir):
+        s = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        s.bind(("127.0.0.1", 0))
+        port = s.getsockname()[1]
+        s.close()
+        tmpdir.join("http").write(str(port))
+        assert launcher.attach() is None
+
+
 # -----------------------------------------------------------------------
 # -                               Helpers                               -
 # -----------------------------------------------------------------------
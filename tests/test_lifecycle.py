@@ -0,0 +1,78 @@
+# coding: utf-8
+
+import pytest
+
+from lifecycle import ExpiringTable
+from pending import PendingResponses
+
+
+class Clock(object):
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_entries_live_until_popped():
+    table = ExpiringTable(lifetime=10, clock=Clock())
+    table[1] = {'async': True}
+    assert table[1] == {'async': True}
+    assert 1 in table
+    assert table.pop(1) == {'async': True}
+    assert 1 not in table
+    assert table.pop(1) is None
+    assert len(table) == 0
+
+
+def test_entries_expire_after_their_lifetime():
+    clock = Clock()
+    table = ExpiringTable(lifetime=10, clock=clock)
+    table[1] = 'first'
+    clock.now += 5
+    table[2] = 'second'
+    clock.now += 5
+    assert table.get(1) is None
+    with pytest.raises(KeyError):
+        table[1]
+    assert table.get(2) == 'second'
+    assert len(table) == 1
+    clock.now += 5
+    assert len(table) == 0
+    assert table.stats()['expired'] == 2
+
+
+def test_adding_purges_expired_entries():
+    clock = Clock()
+    table = ExpiringTable(lifetime=1, clock=clock)
+    for call_id in range(100):
+        table[call_id] = call_id
+        clock.now += 0.5
+    # only the entries of the last second are still there
+    assert len(table._entries) <= 3
+
+
+def test_oldest_entries_are_evicted_when_full():
+    table = ExpiringTable(lifetime=10, max_size=3, clock=Clock())
+    for call_id in range(5):
+        table[call_id] = call_id
+    assert len(table) == 3
+    assert 0 not in table and 1 not in table
+    assert table.stats()['evicted'] == 2
+
+
+def test_replacing_an_entry_renews_it():
+    clock = Clock()
+    table = ExpiringTable(lifetime=10, clock=clock)
+    table['a'] = 1
+    clock.now += 8
+    table['a'] = 2
+    clock.now += 8
+    assert table['a'] == 2
+
+
+def test_unwaited_responses_expire():
+    responses = PendingResponses(lifetime=0)
+    responses.register(1)
+    assert len(responses) == 0
+    assert not responses.resolve(1, 'nobody waits for this anymore')
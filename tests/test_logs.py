@@ -0,0 +1,73 @@
+# coding: utf-8
+
+import json
+import logging
+import threading
+
+from logs import redact, Redacted, LogPipeline, MAX_STRING
+
+FORMAT = '%(levelname)s %(message)s'
+
+
+class Traced(object):
+    """Records the threads formatting it."""
+    def __init__(self):
+        self.threads = []
+
+    def __repr__(self):
+        self.threads.append(threading.current_thread())
+        return "traced"
+
+
+def test_contents_are_replaced_by_their_size():
+    message = {"callId": 3, "req": {"typehint": "CompletionsReq",
+                                    "fileInfo": {"file": "/A.scala", "contents": "x" * 10000}}}
+    redacted = redact(message)
+    assert redacted["req"]["fileInfo"] == {"file": "/A.scala", "contents": "<10000 chars>"}
+    # the message itself is left alone
+    assert len(message["req"]["fileInfo"]["contents"]) == 10000
+
+
+def test_long_strings_are_truncated():
+    redacted = redact({"notes": [{"msg": "m" * (MAX_STRING + 5)}]})
+    assert redacted["notes"][0]["msg"] == "m" * MAX_STRING + "...<5 more chars>"
+
+
+def test_redacted_is_a_single_json_line():
+    line = str(Redacted({"callId": 1, "req": {"typehint": "TypeAtPointReq", "contents": "a\nb"}}))
+    assert "\n" not in line
+    assert json.loads(line)["req"]["contents"] == "<3 chars>"
+
+
+def test_records_are_written_by_the_pipeline(tmpdir):
+    log_file = str(tmpdir.join("ensime.log"))
+    logger = logging.getLogger("ensime-test-pipeline")
+    logger.setLevel(logging.INFO)
+    pipeline = LogPipeline(logger, log_file, FORMAT, FORMAT)
+    logger.info("send_request: %s", Redacted({"contents": "secret"}))
+    pipeline.stop()
+    with open(log_file) as f:
+        assert f.read() == 'INFO send_request: {"contents": "<6 chars>"}\n'
+    assert logger.handlers == []
+
+
+def test_wrapped_arguments_are_formatted_off_the_caller_thread(tmpdir):
+    logger = logging.getLogger("ensime-test-deferred")
+    logger.setLevel(logging.INFO)
+    pipeline = LogPipeline(logger, str(tmpdir.join("ensime.log")), FORMAT, FORMAT)
+    traced = Traced()
+    logger.debug("%s", Redacted(traced))
+    logger.info("%s", Redacted(traced))
+    pipeline.stop()
+    formatted_by = set(traced.threads)
+    assert len(formatted_by) == 1
+    assert threading.current_thread() not in formatted_by
+
+
+def test_previous_log_is_rotated(tmpdir):
+    log_file = tmpdir.join("ensime.log")
+    log_file.write("previous session\n")
+    logger = logging.getLogger("ensime-test-rotation")
+    LogPipeline(logger, str(log_file), FORMAT, FORMAT, backups=2).stop()
+    assert tmpdir.join("ensime.log.1").read() == "previous session\n"
+    assert not log_file.exists()
@@ -0,0 +1,74 @@
+# coding: utf-8
+
+import json
+
+from metrics import Histogram, LatencyStats, _bucket, _lowest, SEND, RECEIVED
+
+
+class Clock(object):
+    def __init__(self):
+        self.now = 100.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_buckets_cover_values_in_order():
+    previous = -1
+    for value in list(range(200)) + [10 ** 3, 10 ** 5, 10 ** 7, 10 ** 9]:
+        index = _bucket(value)
+        assert index >= previous
+        assert _lowest(index) <= value
+        # within the precision of the histogram
+        assert value - _lowest(index) <= max(value / 32.0, 0)
+        previous = index
+
+
+def test_percentiles_are_close_to_exact_ones():
+    histogram = Histogram()
+    for ms in range(1, 1001):
+        histogram.record(ms / 1000.0)
+    assert histogram.count == 1000
+    assert abs(histogram.percentile(50) - 500000) <= 500000 * 0.04
+    assert abs(histogram.percentile(99) - 990000) <= 990000 * 0.04
+    assert histogram.percentile(100) == histogram.max == 1000000
+    summary = histogram.to_dict()
+    assert summary["min"] == 1.0
+    assert sum(summary["buckets"].values()) == 1000
+
+
+def test_calls_are_recorded_by_phase():
+    clock = Clock()
+    stats = LatencyStats(clock=clock)
+    stats.issued(1, "CompletionsReq")
+    clock.now += 0.002
+    stats.sent(1)
+    clock.now += 0.030
+    stats.received(1, clock.now)
+    assert stats.typehint(1) == "CompletionsReq"
+    stats.finished(1)
+    assert stats.typehint(1) is None
+
+    snapshot = stats.snapshot()["CompletionsReq"]
+    assert snapshot[SEND]["count"] == 1
+    assert abs(snapshot[SEND]["max"] - 2) < 0.1
+    assert abs(snapshot[RECEIVED]["max"] - 30) < 1
+    assert "CompletionsReq" in stats.report()
+
+
+def test_unknown_calls_are_ignored():
+    stats = LatencyStats(clock=Clock())
+    stats.sent(42)
+    stats.received(42, 0)
+    assert stats.snapshot() == {}
+
+
+def test_dump(tmpdir):
+    stats = LatencyStats(clock=Clock())
+    stats.record("TypeAtPointReq", SEND, 0.001)
+    path = str(tmpdir.join("perf-stats.json"))
+    assert stats.dump(path, {"buffers": {"writes": 3}})
+    with open(path) as f:
+        dumped = json.load(f)
+    assert dumped["buffers"] == {"writes": 3}
+    assert dumped["latency"]["TypeAtPointReq"][SEND]["count"] == 1
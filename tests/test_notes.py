@@ -0,0 +1,109 @@
+# coding: utf-8
+
+import pytest
+
+from notes import Note, NotesStorage
+
+FILE = "/project/src/Foo.scala"
+
+
+def note(beg, end, line, severity="NoteError", file=FILE):
+    return Note({'msg': 'note at {}'.format(beg), 'file': file,
+                 'severity': {'typehint': severity},
+                 'beg': beg, 'end': end, 'line': line, 'col': 1})
+
+
+@pytest.fixture
+def storage():
+    storage = NotesStorage()
+    storage.append([note(50, 60, 3), note(10, 20, 1), note(30, 100, 2)])
+    storage.append([note(5, 6, 1, file="/project/src/Bar.scala")])
+    return storage
+
+
+def test_for_file_is_sorted_by_offset(storage):
+    assert [n.start for n in storage.for_file(FILE)] == [10, 30, 50]
+
+
+def test_notes_at_point(storage):
+    assert [n.start for n in storage.at_point(FILE, 55)] == [30, 50]
+    assert [n.start for n in storage.at_point(FILE, 20)] == [10]
+    assert storage.at_point(FILE, 25) == []
+
+
+def test_notes_in_region(storage):
+    assert [n.start for n in storage.in_region(FILE, 0, 29)] == [10]
+    assert [n.start for n in storage.in_region(FILE, 70, 200)] == [30]
+
+
+def test_notes_in_lines(storage):
+    assert [n.line for n in storage.in_lines(FILE, 2, 3)] == [2, 3]
+    assert storage.in_lines(FILE, 4, 10) == []
+
+
+def test_index_follows_appended_notes(storage):
+    storage.append([note(0, 1, 0)])
+    assert [n.start for n in storage.at_point(FILE, 0)] == [0]
+    assert len(storage.for_file(FILE)) == 4
+
+
+def test_notes_have_no_instance_dict():
+    assert not hasattr(note(0, 1, 0), '__dict__')
+
+
+def test_generation_changes_with_the_notes_of_a_file(storage):
+    bar = storage.generation("/project/src/Bar.scala")
+    foo = storage.generation(FILE)
+    storage.append([note(1, 2, 0)])
+    assert storage.generation(FILE) != foo
+    assert storage.generation("/project/src/Bar.scala") == bar
+    assert storage.generation("/project/src/Unknown.scala") == 0
+
+
+def test_typecheck_round_replaces_notes_file_by_file(storage):
+    bar = storage.generation("/project/src/Bar.scala")
+    storage.begin_round()
+    # old notes stay visible until replaced
+    assert len(storage.for_file(FILE)) == 3
+
+    storage.append([note(70, 80, 4)])
+    assert [n.start for n in storage.for_file(FILE)] == [70]
+    storage.append([note(90, 95, 5)])
+    assert len(storage.for_file(FILE)) == 2
+    assert storage.generation("/project/src/Bar.scala") == bar
+
+    # Bar.scala got no notes, it's clean now
+    assert storage.end_round() == set(["/project/src/Bar.scala"])
+    assert storage.for_file("/project/src/Bar.scala") == []
+    assert storage.generation("/project/src/Bar.scala") != bar
+    assert len(storage.for_file(FILE)) == 2
+
+
+def test_snapshot_restores_notes_of_unchanged_files_as_stale(tmpdir):
+    source = tmpdir.join("Foo.scala")
+    source.write("object Foo")
+    changed = tmpdir.join("Bar.scala")
+    changed.write("object Bar")
+    snapshot = tmpdir.join("notes.json").strpath
+
+    storage = NotesStorage()
+    storage.append([note(1, 2, 1, file=source.strpath), note(3, 4, 1, file=changed.strpath)])
+    assert storage.save_snapshot(snapshot)
+
+    changed.write("object Bar { }")
+    restored = NotesStorage()
+    assert restored.load_snapshot(snapshot)
+    assert [n.start for n in restored.for_file(source.strpath)] == [1]
+    assert restored.is_stale(source.strpath)
+    assert restored.for_file(changed.strpath) == []
+
+    # live notes replace stale ones
+    restored.append([note(5, 6, 2, file=source.strpath)])
+    assert [n.start for n in restored.for_file(source.strpath)] == [5]
+    assert not restored.is_stale(source.strpath)
+
+
+def test_missing_snapshot(tmpdir):
+    storage = NotesStorage()
+    assert not storage.load_snapshot(tmpdir.join("notes.json").strpath)
+    assert storage.for_file(FILE) == []
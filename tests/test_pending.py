@@ -0,0 +1,85 @@
+# coding: utf-8
+
+import threading
+import time
+
+from pending import PendingResponses
+
+
+def test_wait_returns_resolved_result():
+    responses = PendingResponses()
+    responses.register(1)
+    assert responses.resolve(1, {'payload': 'ok'})
+    assert responses.wait(1, timeout=1) == {'payload': 'ok'}
+    assert 1 not in responses
+
+
+def test_resolve_wakes_waiter_before_timeout():
+    responses = PendingResponses()
+    responses.register(7)
+    timer = threading.Timer(0.01, responses.resolve, args=(7, 'reply'))
+    timer.start()
+    start = time.time()
+    assert responses.wait(7, timeout=5) == 'reply'
+    assert time.time() - start < 1
+
+
+def test_wait_times_out_and_forgets_the_call():
+    responses = PendingResponses()
+    responses.register(3)
+    assert responses.wait(3, timeout=0.01) is None
+    assert len(responses) == 0
+    # a late reply is rejected instead of being kept around
+    assert not responses.resolve(3, 'late')
+
+
+def test_waited_calls_outlive_their_lifetime():
+    # shorter than the timeout of the waiter
+    responses = PendingResponses(lifetime=0.2)
+    responses.register(2)
+    timer = threading.Timer(0.4, responses.resolve, args=(2, 'reply'))
+    timer.start()
+    assert responses.wait(2, timeout=5) == 'reply'
+    assert len(responses) == 0
+
+
+def test_resolve_unknown_call():
+    responses = PendingResponses()
+    assert not responses.resolve(42, 'nobody waits for this')
+    assert responses.wait(42, timeout=0.01) is None
+
+
+def test_done_callbacks_run_on_resolve_or_immediately():
+    responses = PendingResponses()
+    pending = responses.register(5)
+    seen = []
+    pending.add_done_callback(lambda p: seen.append(p.result()))
+    responses.resolve(5, 'first')
+    pending.add_done_callback(lambda p: seen.append('already ' + p.result()))
+    assert seen == ['first', 'already first']
+
+
+class RacingEvent(threading.Event):
+    """Sets the result from another thread while it's being checked."""
+
+    def __init__(self, pending):
+        super(RacingEvent, self).__init__()
+        self.pending = pending
+        self.resolver = None
+
+    def is_set(self):
+        was_set = super(RacingEvent, self).is_set()
+        if self.resolver is None:
+            self.resolver = threading.Thread(target=self.pending.set_result, args=('reply',))
+            self.resolver.start()
+            self.resolver.join(0.05)
+        return was_set
+
+
+def test_done_callbacks_added_while_the_result_is_set_run():
+    pending = PendingResponses().register(1)
+    pending._event = RacingEvent(pending)
+    seen = []
+    pending.add_done_callback(seen.append)
+    pending._event.resolver.join()
+    assert seen == [pending]
@@ -0,0 +1,139 @@
+# coding: utf-8
+
+import socket
+import threading
+import time
+
+import pytest
+
+from launcher import EnsimeProcess
+from readiness import (wait_until_ready, watcher_for, Backoff, InotifyWatcher, PollingWatcher,
+                       LogTail, MAX_DELAY)
+
+
+class Process(EnsimeProcess):
+    def __init__(self, cache_dir):
+        super(Process, self).__init__(cache_dir, None, lambda: None)
+        self.running = True
+
+    def is_running(self):
+        return self.running
+
+
+@pytest.fixture
+def listener():
+    s = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    s.bind(("127.0.0.1", 0))
+    s.listen(1)
+    yield s
+    s.close()
+
+
+def later(seconds, action):
+    timer = threading.Timer(seconds, action)
+    timer.start()
+    return timer
+
+
+class Delays(Backoff):
+    """Waits for `delays`, then the last of them over and over."""
+
+    def __init__(self, *delays):
+        self.delays = list(delays)
+
+    def next(self):
+        return self.delays.pop(0) if len(self.delays) > 1 else self.delays[0]
+
+
+def test_backoff_doubles_up_to_its_maximum():
+    backoff = Backoff(0.1, 0.3)
+    assert [backoff.next() for _ in range(4)] == [0.1, 0.2, 0.3, 0.3]
+
+
+def test_ready_right_away(tmpdir, listener):
+    tmpdir.join("http").write(str(listener.getsockname()[1]))
+    assert wait_until_ready(Process(tmpdir.strpath), 1) == listener.getsockname()[1]
+
+
+@pytest.mark.parametrize("watcher", [watcher_for, PollingWatcher])
+def test_ready_as_soon_as_the_port_is_written(tmpdir, listener, watcher):
+    port = listener.getsockname()[1]
+    # long after the backoff reached its maximum
+    later(1.0, lambda: tmpdir.join("http").write(str(port)))
+    start = time.time()
+    assert wait_until_ready(Process(tmpdir.strpath), 5, watcher(tmpdir.strpath)) == port
+    waited = time.time() - start
+    if isinstance(watcher(tmpdir.strpath), InotifyWatcher):
+        assert waited < 1.0 + 0.1
+    else:
+        assert waited < 1.0 + MAX_DELAY + 0.1
+
+
+def test_started_marker_resets_the_backoff(tmpdir, listener):
+    port = listener.getsockname()[1]
+    # the port file is written before the server listens
+    tmpdir.join("http").write(str(port))
+    listener.close()
+    try:
+        watcher = InotifyWatcher(tmpdir.strpath)
+    except OSError:
+        pytest.skip("inotify is not available")
+    # found on the first check, the marker spares the second one
+    watcher.backoff = Delays(0.25, 10)
+    relisten = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    relisten.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+
+    def listen():
+        relisten.bind(("127.0.0.1", port))
+        relisten.listen(1)
+    later(0.2, lambda: tmpdir.join("server.log").write("INFO ENSIME HTTP on 127.0.0.1:{}\n".format(port)))
+    later(0.3, listen)
+    start = time.time()
+    try:
+        assert wait_until_ready(Process(tmpdir.strpath), 5, watcher) == port
+        assert time.time() - start < 1
+    finally:
+        relisten.close()
+
+
+def test_logging_does_not_wake_the_watcher(tmpdir):
+    try:
+        watcher = InotifyWatcher(tmpdir.strpath)
+    except OSError:
+        pytest.skip("inotify is not available")
+    watcher.backoff = Backoff(10, 10)
+    log = tmpdir.join("server.log")
+    for delay in (0.05, 0.1, 0.15):
+        later(delay, lambda: log.write("INFO loading\n", mode="a"))
+    later(0.3, lambda: tmpdir.join("http").write("1234"))
+    start = time.time()
+    try:
+        watcher.wait(5)
+        assert 0.3 <= time.time() - start < 1
+    finally:
+        watcher.close()
+
+
+def test_gives_up_when_the_server_stops(tmpdir):
+    process = Process(tmpdir.strpath)
+    later(0.2, lambda: setattr(process, "running", False))
+    start = time.time()
+    assert wait_until_ready(process, 5) is None
+    assert time.time() - start < 1
+
+
+def test_gives_up_after_timeout(tmpdir):
+    start = time.time()
+    assert wait_until_ready(Process(tmpdir.strpath), 0.3) is None
+    assert time.time() - start < 0.3 + 0.1
+
+
+def test_log_tail_returns_complete_new_lines(tmpdir):
+    log = tmpdir.join("server.log")
+    tail = LogTail(log.strpath)
+    assert tail.lines() == []
+    log.write("one\ntw")
+    assert tail.lines() == ["one"]
+    log.write("o\nthree\n", mode="a")
+    assert tail.lines() == ["two", "three"]
+    assert tail.lines() == []
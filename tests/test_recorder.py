@@ -0,0 +1,45 @@
+# coding: utf-8
+
+from recorder import SessionRecorder, read_session, OUTGOING, INCOMING
+
+
+class Clock(object):
+    def __init__(self):
+        self.now = 10.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_messages_are_read_back_in_order(tmpdir):
+    path = str(tmpdir.join("session.log"))
+    clock = Clock()
+    recorder = SessionRecorder(path, clock=clock)
+    recorder.outgoing('{"callId": 1, "req": {"typehint": "ConnectionInfoReq"}}\n')
+    clock.now += 0.25
+    recorder.incoming('{"callId": 1,\r\n "payload": {"typehint": "ConnectionInfo"}}')
+    recorder.close()
+
+    records = list(read_session(path))
+    assert [record[2] for record in records] == [OUTGOING, INCOMING]
+    assert records[0][3] == '{"callId": 1, "req": {"typehint": "ConnectionInfoReq"}}'
+    assert records[1][1] == 0.25
+    # line breaks are blanks to JSON
+    assert records[1][3] == '{"callId": 1,   "payload": {"typehint": "ConnectionInfo"}}'
+
+
+def test_sessions_are_appended(tmpdir):
+    path = str(tmpdir.join("session.log"))
+    for session in range(2):
+        recorder = SessionRecorder(path)
+        recorder.incoming('{"payload": {"typehint": "IndexerReadyEvent"}}')
+        recorder.close()
+    assert [record[0] for record in read_session(path)] == [0, 1]
+
+
+def test_nothing_is_written_once_closed(tmpdir):
+    path = str(tmpdir.join("session.log"))
+    recorder = SessionRecorder(path)
+    recorder.close()
+    recorder.incoming('{"payload": {"typehint": "IndexerReadyEvent"}}')
+    assert list(read_session(path)) == []
@@ -0,0 +1,195 @@
+# coding: utf-8
+
+import threading
+import time
+
+from registry import ServerRegistry, canonical_dotensime
+
+
+class Process(object):
+    def __init__(self):
+        self.stops = 0
+
+    def is_running(self):
+        return self.stops == 0
+
+    def stop(self):
+        self.stops += 1
+
+    def http_port(self):
+        return 4242
+
+
+def starter(started):
+    def start():
+        process = Process()
+        started.append(process)
+        return process
+    return start
+
+
+def test_clients_of_a_project_share_its_server():
+    registry, started = ServerRegistry(), []
+    first, shared = registry.acquire("/p/.ensime", "a", "window 1", starter(started))
+    assert not shared
+    second, shared = registry.acquire("/p/.ensime", "b", "window 2", starter(started))
+    assert shared
+    assert first is second
+    assert len(started) == 1
+    assert registry.servers()[0]["users"] == ["window 1", "window 2"]
+
+
+def test_projects_have_their_own_server():
+    registry, started = ServerRegistry(), []
+    registry.acquire("/p/.ensime", "a", "window 1", starter(started))
+    registry.acquire("/q/.ensime", "a", "window 1", starter(started))
+    assert len(started) == 2
+
+
+def test_server_stops_with_its_last_client():
+    registry, started = ServerRegistry(), []
+    process, _ = registry.acquire("/p/.ensime", "a", "window 1", starter(started))
+    registry.acquire("/p/.ensime", "b", "window 2", starter(started))
+    assert registry.release("/p/.ensime", "a") == 1
+    assert process.stops == 0
+    assert registry.release("/p/.ensime", "b") == 0
+    assert process.stops == 1
+    assert registry.servers() == []
+    # releasing twice is harmless
+    assert registry.release("/p/.ensime", "b") == 0
+
+
+def test_idle_server_is_stopped_after_timeout():
+    registry, started = ServerRegistry(), []
+    process, _ = registry.acquire("/p/.ensime", "a", "window 1", starter(started))
+    registry.release("/p/.ensime", "a", idle_timeout=0.1)
+    assert process.stops == 0
+    assert registry.servers()[0]["idle"] is not None
+    time.sleep(0.3)
+    assert process.stops == 1
+    assert registry.servers() == []
+
+
+def test_idle_server_is_reused_until_stopped():
+    registry, started = ServerRegistry(), []
+    process, _ = registry.acquire("/p/.ensime", "a", "window 1", starter(started))
+    registry.release("/p/.ensime", "a", idle_timeout=0.1)
+    again, shared = registry.acquire("/p/.ensime", "a", "window 1", starter(started))
+    time.sleep(0.3)
+    assert again is process and shared
+    assert process.stops == 0
+
+
+def test_dead_server_is_replaced():
+    registry, started = ServerRegistry(), []
+    process, _ = registry.acquire("/p/.ensime", "a", "window 1", starter(started))
+    process.stop()
+    replacement, shared = registry.acquire("/p/.ensime", "b", "window 2", starter(started))
+    assert replacement is not process and not shared
+    assert registry.servers()[0]["users"] == ["window 2"]
+
+
+def test_failed_start_is_not_registered():
+    registry = ServerRegistry()
+    assert registry.acquire("/p/.ensime", "a", "window 1", lambda: None) == (None, False)
+    assert registry.servers() == []
+
+
+def slow_starter(started, release, result=Process):
+    def start():
+        started.append(threading.current_thread())
+        release.wait(5)
+        return result()
+    return start
+
+
+def in_thread(action, *args):
+    results = []
+    thread = threading.Thread(target=lambda: results.append(action(*args)))
+    thread.daemon = True
+    thread.start()
+    return thread, results
+
+
+def test_slow_start_does_not_block_other_projects():
+    registry, started, release = ServerRegistry(), [], threading.Event()
+    slow, _ = in_thread(registry.acquire, "/slow/.ensime", "a", "window 1", slow_starter(started, release))
+    while not started:
+        time.sleep(0.01)
+    fast, _ = in_thread(registry.acquire, "/fast/.ensime", "b", "window 2", starter([]))
+    fast.join(1)
+    assert not fast.is_alive()
+    assert [server["key"] for server in registry.servers()] == ["/fast/.ensime"]
+    release.set()
+    slow.join(5)
+    assert len(registry.servers()) == 2
+
+
+def test_clients_wait_for_the_server_being_started():
+    registry, started, release = ServerRegistry(), [], threading.Event()
+    first, first_result = in_thread(registry.acquire, "/p/.ensime", "a", "window 1",
+                                    slow_starter(started, release))
+    while not started:
+        time.sleep(0.01)
+    second, second_result = in_thread(registry.acquire, "/p/.ensime", "b", "window 2",
+                                      slow_starter(started, release))
+    second.join(0.1)
+    assert second.is_alive()
+    release.set()
+    first.join(5)
+    second.join(5)
+    assert len(started) == 1
+    assert first_result[0][0] is second_result[0][0]
+    assert (first_result[0][1], second_result[0][1]) == (False, True)
+
+
+def test_clients_waiting_for_a_failed_start_try_their_own():
+    registry, started, release = ServerRegistry(), [], threading.Event()
+    first, first_result = in_thread(registry.acquire, "/p/.ensime", "a", "window 1",
+                                    slow_starter(started, release, result=lambda: None))
+    while not started:
+        time.sleep(0.01)
+    second, second_result = in_thread(registry.acquire, "/p/.ensime", "b", "window 2",
+                                      slow_starter(started, release))
+    release.set()
+    first.join(5)
+    second.join(5)
+    assert len(started) == 2
+    assert first_result == [(None, False)]
+    assert second_result[0][0] is not None
+    assert second_result[0][1] is False
+
+
+def test_discarded_server_is_stopped_for_everyone():
+    registry, started = ServerRegistry(), []
+    process, _ = registry.acquire("/p/.ensime", "a", "window 1", starter(started))
+    registry.acquire("/p/.ensime", "b", "window 2", starter(started))
+    registry.discard("/p/.ensime", process)
+    assert process.stops == 1
+    assert registry.servers() == []
+
+
+def test_discarded_server_can_be_left_running():
+    registry, started = ServerRegistry(), []
+    process, _ = registry.acquire("/p/.ensime", "a", "window 1", starter(started))
+    registry.discard("/p/.ensime", process, stop=False)
+    assert process.stops == 0
+    assert registry.servers() == []
+
+
+def test_report_shows_who_uses_which_server():
+    registry, started = ServerRegistry(), []
+    assert registry.report() == "No ENSIME server running."
+    registry.acquire("/p/.ensime", "a", "window 1 (/p)", starter(started))
+    registry.acquire("/p/.ensime", "b", "window 2 (/p/sub)", starter(started))
+    lines = registry.report().splitlines()
+    assert lines[0] == "/p/.ensime"
+    assert "port 4242" in lines[1]
+    assert lines[2:] == ["    used by window 1 (/p)", "    used by window 2 (/p/sub)"]
+
+
+def test_dotensime_paths_are_canonical(tmpdir):
+    tmpdir.join("project").ensure(".ensime")
+    tmpdir.join("link").mksymlinkto(tmpdir.join("project"))
+    assert (canonical_dotensime({"root-dir": tmpdir.join("link").strpath}) ==
+            canonical_dotensime({"root-dir": tmpdir.join("project").strpath}))
@@ -0,0 +1,126 @@
+# coding: utf-8
+
+from mock import patch
+
+from scheduler import (RequestScheduler, QueryTracker,
+                       INTERACTIVE, BACKGROUND, BULK, STALE_AFTER)
+
+
+def scheduler_with_log(**limits):
+    sent = []
+    return RequestScheduler(sent.append, limits), sent
+
+
+def test_sends_right_away_within_limits():
+    scheduler, sent = scheduler_with_log()
+    scheduler.submit(1, INTERACTIVE, 'completions')
+    scheduler.submit(2, BULK, 'typecheck')
+    assert sent == ['completions', 'typecheck']
+
+
+def test_bulk_requests_wait_for_a_free_slot():
+    scheduler, sent = scheduler_with_log(bulk=1)
+    scheduler.submit(1, BULK, 'typecheck a')
+    scheduler.submit(2, BULK, 'typecheck b')
+    assert sent == ['typecheck a']
+    assert scheduler.queued(BULK) == 1
+
+    scheduler.complete(1)
+    assert sent == ['typecheck a', 'typecheck b']
+    assert scheduler.in_flight(BULK) == 1
+
+
+def test_interactive_requests_go_first():
+    scheduler, sent = scheduler_with_log(interactive=1, background=1, bulk=1)
+    scheduler.submit(1, INTERACTIVE, 'type at point')
+    scheduler.submit(2, BULK, 'typecheck')
+    scheduler.submit(3, BACKGROUND, 'import suggestions')
+    scheduler.submit(4, BULK, 'another typecheck')
+    scheduler.submit(5, INTERACTIVE, 'completions')
+    assert sent == ['type at point', 'typecheck', 'import suggestions']
+
+    # queued bulk work doesn't hold back interactive requests
+    scheduler.complete(1)
+    assert sent[3:] == ['completions']
+    assert scheduler.queued(BULK) == 1
+
+
+def test_most_urgent_queued_request_is_sent_first():
+    scheduler, sent = scheduler_with_log(interactive=1, bulk=1)
+    with patch('time.time', return_value=1000):
+        scheduler.submit(1, INTERACTIVE, 'type at point')
+        scheduler.submit(2, BULK, 'typecheck')
+        scheduler.submit(3, BULK, 'another typecheck')
+        scheduler.submit(4, INTERACTIVE, 'completions')
+    # both slots free up at once
+    with patch('time.time', return_value=1000 + STALE_AFTER + 1):
+        scheduler.submit(5, BACKGROUND, 'import suggestions')
+    assert sent[2:] == ['completions', 'import suggestions', 'another typecheck']
+
+
+def test_unanswered_requests_eventually_free_their_slot():
+    scheduler, sent = scheduler_with_log(bulk=1)
+    with patch('time.time', return_value=1000):
+        scheduler.submit(1, BULK, 'lost')
+    with patch('time.time', return_value=1000 + STALE_AFTER + 1):
+        scheduler.submit(2, BULK, 'next')
+    assert sent == ['lost', 'next']
+
+
+def test_completing_unknown_calls_is_harmless():
+    scheduler, sent = scheduler_with_log()
+    scheduler.complete(99)
+    assert sent == []
+
+
+def test_cancel_drops_queued_requests_only():
+    scheduler, sent = scheduler_with_log(interactive=1)
+    scheduler.submit(1, INTERACTIVE, 'first click')
+    scheduler.submit(2, INTERACTIVE, 'second click')
+    assert not scheduler.cancel(1)
+    assert scheduler.cancel(2)
+    scheduler.complete(1)
+    assert sent == ['first click']
+
+
+def test_identical_queries_share_a_call():
+    queries = QueryTracker()
+    key = ('TypeAtPointReq', 'Foo.scala', 42, None)
+    assert queries.coalesce(key) is None
+    queries.start(1, key)
+    assert queries.coalesce(key) == 1
+
+    assert not queries.finish(1)
+    assert queries.coalesce(key) is None
+    assert len(queries) == 0
+
+
+def test_newer_queries_supersede_older_ones_of_their_slot():
+    queries = QueryTracker()
+    first = ('TypeAtPointReq', 'Foo.scala', 42, None)
+    second = ('TypeAtPointReq', 'Foo.scala', 50, None)
+    other_slot = ('SymbolAtPointReq', 'Foo.scala', 42, None)
+    assert queries.start(1, first) is None
+    assert queries.start(2, other_slot) is None
+    assert queries.start(3, second) == 1
+    # a superseded query can't be reused for an identical click
+    assert queries.coalesce(first) is None
+
+    assert queries.finish(1)
+    assert not queries.finish(2)
+    assert not queries.finish(3)
+    assert len(queries) == 0
+
+
+def test_unanswered_queries_expire():
+    now = [1000]
+    queries = QueryTracker(lifetime=10, clock=lambda: now[0])
+    first = ('TypeAtPointReq', 'Foo.scala', 42, None)
+    queries.start(1, first)
+    now[0] += 11
+    # the reply was lost: neither reused nor superseded
+    assert queries.coalesce(first) is None
+    assert queries.start(2, ('TypeAtPointReq', 'Foo.scala', 50, None)) is None
+    assert len(queries) == 1
+    now[0] += 11
+    assert len(queries) == 0
@@ -0,0 +1,69 @@
+# coding: utf-8
+
+from py import path
+from pytest import mark, raises
+import sexpdata
+
+import sexpconfig
+from config import ProjectConfig
+
+resources = path.local(__file__).dirpath() / 'resources'
+
+SAME_AS_SEXPDATA = [
+    '(:name "x")',
+    '()',
+    '(:a () :b nil :c t :d 1 :e -2.5 :f 1e3 :g foo :h "")',
+    '(:list ("a" "b" "c") :nested ("a" ("b" ("c"))) :numbers (1 2 3))',
+    '(:dict (:k "v" :other (:deep t)) :dicts ((:id 1) (:id 2) ()))',
+    '(:mixed ("a" :b) :symbols (foo bar) :odd (:k))',
+    '("string" "key" 12 "int key" 012 "leading zero" :dangling)',
+    '(:escaped "a \\"b\\" c\\\\d\\n\\t\\z" :line "one\\\ntwo")',
+    '(:unicode "ünïcödé" :semi a;b)',
+    '; a comment\n(:a 1 ; another\n :b "x;y")\n; trailing',
+    '  \n(:a\t1\x0c:b\x0b2)  \n\n',
+    '(:jars ( "a.jar"\n  "b.jar" ) :raw ("x" ("y" "z") ()) :empty ("") :semi ("a;b"))',
+    '(:escaped ("a" "b\\"c") :commented ("a" ; "b"\n "c"))',
+]
+
+
+@mark.parametrize("text", SAME_AS_SEXPDATA)
+def test_parses_like_sexpdata(text):
+    parsed = sexpconfig.loads(text)
+    expected = ProjectConfig.parse_sexpdata(text)
+    assert parsed == expected
+    # tells 1, 1.0 and True apart
+    assert repr(parsed) == repr(expected)
+
+
+def test_parses_dot_ensime_resources():
+    for conf in ('test.conf', 'test-server-jars.conf'):
+        text = (resources / conf).read()
+        assert sexpconfig.loads(text) == ProjectConfig.parse_sexpdata(text)
+
+
+@mark.parametrize("text", [
+    '(:a "b"',
+    '(:a "b"))',
+    '(:a "b" ; no closing bracket)',
+    '(:a "unterminated)',
+    '(:a [1 2])',
+    "(:a '(1 2))",
+    '(:a b\\ c)',
+    '(:a 1) (:b 2)',
+    '((:a 1))',
+    '(:a (nil 1))',
+    '(:a ((:b 1) "c"))',
+    '"not a list"',
+    '(:a "x"):',
+    '(:a (("x" "y")))',
+    '',
+])
+def test_leaves_the_rest_to_sexpdata(text):
+    with raises(sexpconfig.Unsupported):
+        sexpconfig.loads(text)
+
+
+def test_falls_back_to_sexpdata():
+    assert ProjectConfig.parse_string("(:a '(1 2))") == {"a": sexpdata.Quoted([1, 2])}
+    with raises(sexpdata.ExpectClosingBracket):
+        ProjectConfig.parse_string((resources / 'broken.conf').read())
@@ -0,0 +1,74 @@
+# coding: utf-8
+
+from sizing import measure, choose_tier, merge_flags, jvm_flags, ProjectSize, DEFAULT_TIERS
+
+MB = 1024 * 1024
+
+
+def project(tmpdir, modules=1, roots=2, jars=3, jar_bytes=100):
+    config = {"java-flags": [], "projects": []}
+    for m in range(modules):
+        paths = []
+        for j in range(jars):
+            jar = tmpdir.join("lib{}-{}.jar".format(m, j))
+            jar.write("x" * jar_bytes)
+            paths.append(jar.strpath)
+        config["projects"].append({
+            "sources": ["/src/{}/{}".format(m, r) for r in range(roots)],
+            "library-jars": paths + [tmpdir.join("classes").strpath]})
+    return config
+
+
+def test_measures_projects(tmpdir):
+    size = measure(project(tmpdir, modules=2, roots=3, jars=4, jar_bytes=10))
+    assert size == ProjectSize(2, 6, 8, 80)
+
+
+def test_measures_old_subprojects(tmpdir):
+    jar = tmpdir.join("dep.jar")
+    jar.write("x" * 5)
+    config = {"subprojects": [{"source-roots": ["/a", "/b"], "compile-deps": [jar.strpath]},
+                              {"source-roots": ["/b"], "test-deps": [jar.strpath, "/missing.jar"]}]}
+    assert measure(config) == ProjectSize(2, 2, 2, 5)
+
+
+def test_first_fitting_tier_applies():
+    tiers = [{"max_jars": 10, "flags": ["small"]},
+             {"max_jars": 100, "max_jar_mb": 50, "flags": ["medium"]},
+             {"flags": ["large"]}]
+    assert choose_tier(ProjectSize(1, 1, 10, 0), tiers)["flags"] == ["small"]
+    assert choose_tier(ProjectSize(1, 1, 11, 50 * MB), tiers)["flags"] == ["medium"]
+    assert choose_tier(ProjectSize(1, 1, 11, 51 * MB), tiers)["flags"] == ["large"]
+    assert choose_tier(ProjectSize(1, 1, 11, 0), tiers[:1]) is None
+
+
+def test_user_flags_take_precedence():
+    policy = ["-Xmx1g", "-Xss2m", "-XX:+UseParallelGC", "-XX:MaxMetaspaceSize=256m"]
+    user = ["-Xmx4g", "-XX:+UseG1GC", "-XX:MaxMetaspaceSize=1g", "-Dfoo=bar", ""]
+    assert merge_flags(policy, user) == ["-Xss2m", "-Xmx4g", "-XX:+UseG1GC",
+                                         "-XX:MaxMetaspaceSize=1g", "-Dfoo=bar"]
+
+
+def test_small_project_gets_a_small_heap(tmpdir):
+    flags, description = jvm_flags(project(tmpdir))
+    assert flags == DEFAULT_TIERS[0]["flags"]
+    assert "1 modules, 2 source roots, 3 jars" in description
+
+
+def test_large_project_gets_a_large_heap(tmpdir):
+    flags, _ = jvm_flags(project(tmpdir, modules=40, roots=10))
+    assert "-Xmx6g" in flags
+
+
+def test_decision_mentions_overridden_flags(tmpdir):
+    config = project(tmpdir)
+    config["java-flags"] = ["-Xmx2g"]
+    flags, description = jvm_flags(config)
+    assert flags == ["-Xss2m", "-XX:+UseParallelGC", "-Xmx2g"]
+    assert "(-Xmx1g overridden by java-flags)" in description
+
+
+def test_sizing_can_be_disabled(tmpdir):
+    config = project(tmpdir)
+    config["java-flags"] = ["-Xmx2g"]
+    assert jvm_flags(config, [])[0] == ["-Xmx2g"]
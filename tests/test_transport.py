@@ -0,0 +1,53 @@
+# coding: utf-8
+
+import socket
+import threading
+
+from transport import SharedLoop
+
+
+class FakeWebSocket(object):
+    """Just enough of ``websocket.WebSocket`` for the loop: a ``sock``."""
+
+    def __init__(self):
+        self.sock, self.peer = socket.socketpair()
+
+    def recv(self):
+        return self.sock.recv(4096).decode("utf-8")
+
+
+def test_shared_loop_receives_for_every_registered_socket():
+    loop = SharedLoop()
+    first, second = FakeWebSocket(), FakeWebSocket()
+    received = []
+    done = threading.Event()
+
+    def on_readable(ws):
+        received.append(ws.recv())
+        if len(received) == 2:
+            done.set()
+
+    loop.register(first, on_readable)
+    loop.register(second, on_readable)
+    first.peer.send(b"one")
+    second.peer.send(b"two")
+
+    assert done.wait(2)
+    assert sorted(received) == ["one", "two"]
+
+
+def test_unregistered_sockets_are_ignored():
+    loop = SharedLoop()
+    ws = FakeWebSocket()
+    calls = []
+    loop.register(ws, calls.append)
+    loop.unregister(ws)
+    assert len(loop) == 0
+
+    ws.peer.send(b"ignored")
+    registered = FakeWebSocket()
+    got_message = threading.Event()
+    loop.register(registered, lambda ws: got_message.set() or ws.recv())
+    registered.peer.send(b"seen")
+    assert got_message.wait(2)
+    assert calls == []
@@ -0,0 +1,106 @@
+# coding: utf-8
+
+import threading
+import time
+
+from mock import patch
+
+from typecheck import TypecheckDispatcher, STALE_AFTER
+
+
+def dispatcher_with_log(delay=60):
+    sent = []
+    return TypecheckDispatcher(sent.append, delay=delay), sent
+
+
+def test_batches_deduplicates_and_drops_non_jvm_files():
+    typechecks, sent = dispatcher_with_log()
+    typechecks.request(["A.scala", "B.java"])
+    typechecks.request(["A.scala", None, "build.sbt", "C.scala"])
+    typechecks.flush()
+    assert sent == [["A.scala", "B.java", "C.scala"]]
+
+    stats = typechecks.stats()
+    assert stats["files_dropped"] == 2
+    assert stats["files_deduplicated"] == 1
+    assert stats["batches"] == 1
+    typechecks.cancel()
+
+
+def test_sends_after_the_delay():
+    sent = threading.Event()
+    typechecks = TypecheckDispatcher(lambda files: sent.set(), delay=0.01)
+    typechecks.request(["A.scala"])
+    assert sent.wait(2)
+
+
+def test_one_typecheck_in_flight_at_a_time():
+    typechecks, sent = dispatcher_with_log()
+    typechecks.request(["A.scala"])
+    typechecks.flush()
+    typechecks.request(["B.scala"])
+    typechecks.request(["C.scala"])
+    typechecks.flush()
+    assert sent == [["A.scala"]]
+    assert typechecks.in_flight()
+
+    typechecks.completed()
+    assert sent == [["A.scala"], ["B.scala", "C.scala"]]
+    assert typechecks.stats()["last_typecheck_seconds"] is not None
+    typechecks.cancel()
+
+
+def test_flushing_early_cancels_the_debounce_timer():
+    sent_at = []
+    done = threading.Event()
+    typechecks = TypecheckDispatcher(lambda files: sent_at.append(time.time()) or done.set(), delay=0.3)
+    start = time.time()
+    typechecks.request(["A.scala"])
+    typechecks.flush()
+    typechecks.completed()
+    done.clear()
+    time.sleep(0.2)
+    # debounced on its own, not sent by the timer of A
+    typechecks.request(["B.scala"])
+    assert done.wait(2)
+    assert sent_at[1] - start >= 0.45
+    typechecks.cancel()
+
+
+def test_typechecks_without_completion_eventually_stop_blocking():
+    typechecks, sent = dispatcher_with_log()
+    with patch('time.time', return_value=1000):
+        typechecks.request(["A.scala"])
+        typechecks.flush()
+    with patch('time.time', return_value=1000 + STALE_AFTER + 1):
+        typechecks.request(["B.scala"])
+        typechecks.flush()
+    assert sent == [["A.scala"], ["B.scala"]]
+    typechecks.cancel()
+
+
+def test_files_waiting_on_a_lost_typecheck_are_sent_once_it_goes_stale(monkeypatch):
+    monkeypatch.setattr('typecheck.STALE_AFTER', 0.05)
+    sent = []
+    second = threading.Event()
+    typechecks = TypecheckDispatcher(lambda files: sent.append(files) or second.set(), delay=60)
+    typechecks.request(["A.scala"])
+    typechecks.flush()
+    second.clear()
+    typechecks.request(["B.scala"])
+    typechecks.flush()
+    assert second.wait(2)
+    assert sent == [["A.scala"], ["B.scala"]]
+    typechecks.cancel()
+
+
+def test_disconnecting_forgets_the_typecheck_in_flight():
+    typechecks, sent = dispatcher_with_log()
+    typechecks.request(["A.scala"])
+    typechecks.flush()
+    typechecks.disconnected()
+    assert not typechecks.in_flight()
+    typechecks.request(["B.scala"])
+    typechecks.flush()
+    assert sent == [["A.scala"], ["B.scala"]]
+    typechecks.cancel()